@@ -0,0 +1,121 @@
+"""Benchmark the size and load time of saved training runs.
+
+Fits the grid search of several models on a synthetic classification dataset
+and saves each run in the old layout (the whole search in one uncompressed
+file) and in the split layout of artifacts.save_run() with several model
+compression settings.  Prints the size of the model and search metadata
+files, the save time, the time to load the model as the Results app does
+(memory-mapped when uncompressed) and again from the model cache shared by
+its sessions, and the time to predict the test set with the loaded model.
+
+Usage:
+    python benchmarks/bench_artifacts.py --rows 20000 --features 20
+"""
+
+# %% Imports
+# Standard system imports
+import argparse
+from functools import partial
+from pathlib import Path
+import tempfile
+import time
+
+# Related third party imports
+import joblib
+from sklearn.datasets import make_classification
+from sklearn.model_selection import train_test_split
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.artifacts import load_model, save_run
+from bokeh_server.train.twe_learn.search import GridSearch
+from bokeh_server.train.twe_learn.train_model import build_pipeline
+from bokeh_server.train.twe_learn.worker_pool import shutdown_pool
+from utility.model_cache import model_cache
+
+
+# %% Globals
+MODELS = {'Random Forest CLF': {'model__n_estimators': [100, 200],
+                                'model__max_depth': [10, None]},
+          'Gradient Boosting CLF': {'model__n_estimators': [100]},
+          'K-Nearest Neighbors CLF': {'model__n_neighbors': [5, 10]},
+          'Logistic Regression': {'model__C': [0.1, 1, 10]}}
+COMPRESSIONS = ['none', 'zlib:1', 'zlib:3', 'lz4:1']
+
+
+# %% Benchmark
+def timed(function, *args, repeat=3):
+    """Return result and best wall time (s) of several calls."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def load_uncached(path):
+    """Return a saved model, deserializing it."""
+    model_cache.clear()
+    return load_model(path)
+
+
+def measure_load(path, X_test):
+    """Return load, cached load, and predict times (s) of a saved model."""
+    _, load_time = timed(load_uncached, path)
+    model, cached_time = timed(load_model, path)
+    _, predict_time = timed(model.predict, X_test)
+    return load_time, cached_time, predict_time
+
+
+def measure_legacy(search, directory, X_test):
+    """Return sizes (MB), save, load, and predict times of the old layout."""
+    path = directory / 'model'
+    _, save_time = timed(joblib.dump, search, path, repeat=1)
+    return (path.stat().st_size / 1e6, 0, save_time,
+            *measure_load(path, X_test))
+
+
+def measure_split(search, directory, X_test, compression):
+    """Return sizes (MB), save, load, and predict times of a split layout."""
+    _, save_time = timed(partial(save_run, model_compression=compression),
+                         search, {}, directory, repeat=1)
+    return ((directory / 'model').stat().st_size / 1e6,
+            (directory / 'search').stat().st_size / 1e6, save_time,
+            *measure_load(directory / 'model', X_test))
+
+
+def main():
+    """Print artifact sizes and load times of every model and layout."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--features', type=int, default=20)
+    args = parser.parse_args()
+    X, y = make_classification(args.rows, args.features, n_informative=10,
+                               n_classes=3, random_state=214)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, train_size=0.8, random_state=214)
+    print(f"{'model':<24} {'layout':<14} {'model MB':>9} {'search MB':>10} "
+          f"{'save s':>7} {'load s':>7} {'cached s':>9} {'predict s':>10}")
+    try:
+        for model_name, param_grid in MODELS.items():
+            search = GridSearch(build_pipeline({'model': model_name}),
+                                param_grid).fit(X_train, y_train)
+            with tempfile.TemporaryDirectory() as tmp:
+                layouts = [('old', measure_legacy(search, Path(tmp),
+                                                  X_test))]
+                for compression in COMPRESSIONS:
+                    directory = Path(tmp) / compression.replace(':', '_')
+                    layouts.append((f'split {compression}', measure_split(
+                        search, directory, X_test, compression)))
+            for layout, (model_mb, search_mb, save_time, load_time,
+                         cached_time, predict_time) in layouts:
+                print(f'{model_name:<24} {layout:<14} {model_mb:>9.2f} '
+                      f'{search_mb:>10.3f} {save_time:>7.2f} '
+                      f'{load_time:>7.3f} {cached_time:>9.5f} '
+                      f'{predict_time:>10.3f}')
+    finally:
+        shutdown_pool()
+
+
+if __name__ == '__main__':
+    main()
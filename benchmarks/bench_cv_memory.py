@@ -0,0 +1,113 @@
+"""Benchmark peak memory of cross-validated grid search against core count.
+
+Compares scikit-learn's GridSearchCV (the search used before the worker pool)
+with the pool-based GridSearch, whose workers share one memory-mapped copy of
+the feature matrix and receive CV folds by number.
+
+Memory is the peak proportional set size (PSS) summed over the main process
+and its worker processes, so pages shared through the memory map are counted
+once.  Requires psutil and Linux.
+
+Usage:
+    python benchmarks/bench_cv_memory.py --rows 200000 --features 20
+"""
+
+# %% Imports
+# Standard system imports
+import argparse
+import os
+import threading
+import time
+
+# Related third party imports
+import numpy as np
+import psutil
+from sklearn.linear_model import Ridge
+from sklearn.model_selection import GridSearchCV, train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn import worker_pool
+from bokeh_server.train.twe_learn.search import GridSearch
+
+
+# %% Memory sampling
+class PeakMemory(threading.Thread):
+    """Sample total PSS of this process and its children until stopped."""
+
+    def __init__(self, interval=0.05):
+        """Store sampling interval and start with a peak of zero."""
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """Record the largest total PSS seen while running."""
+        main = psutil.Process(os.getpid())
+        while not self._stop_event.is_set():
+            total = 0
+            for proc in [main] + main.children(recursive=True):
+                try:
+                    total += proc.memory_full_info().pss
+                except psutil.Error:
+                    pass  # Process exited between listing and sampling
+            self.peak = max(self.peak, total)
+            time.sleep(self.interval)
+
+    def stop(self):
+        """Stop sampling and return the peak in MiB."""
+        self._stop_event.set()
+        self.join()
+        return self.peak / 2**20
+
+
+# %% Benchmark
+def measure(search, X, y, fit_kwargs):
+    """Return peak memory (MiB) and wall time (s) of one search."""
+    sampler = PeakMemory()
+    sampler.start()
+    start = time.perf_counter()
+    search.fit(X, y, **fit_kwargs)
+    elapsed = time.perf_counter() - start
+    return sampler.stop(), elapsed
+
+
+def main():
+    """Print peak memory of both searches for increasing core counts."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--features', type=int, default=20)
+    parser.add_argument('--cores', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+    rng = np.random.default_rng(214)
+    X = rng.normal(size=(args.rows, args.features))
+    y = X @ rng.normal(size=args.features) + rng.normal(size=args.rows)
+    rows = np.arange(args.rows)
+    train_rows, _ = train_test_split(rows, train_size=0.8, random_state=214)
+    columns = np.arange(args.features)
+    pipe = Pipeline([('scale', StandardScaler()), ('model', Ridge())])
+    param_grid = {'model__alpha': list(np.arange(0.1, 100.2, 10))}
+    print(f'{args.rows} rows x {args.features} features, '
+          f'{X.nbytes / 2**20:.0f} MiB matrix')
+    print(f"{'cores':>5} {'GridSearchCV MiB':>17} {'GridSearch MiB':>15} "
+          f"{'GridSearchCV s':>15} {'GridSearch s':>13}")
+    for cores in args.cores:
+        before = measure(GridSearchCV(pipe, param_grid, n_jobs=cores),
+                         X[train_rows], y[train_rows], {})
+        worker_pool.shutdown_pool()
+        worker_pool.N_WORKERS = cores
+        worker_pool.get_pool()
+        measure(GridSearch(pipe, param_grid), X, y,  # Publish data once
+                {'rows': train_rows, 'columns': columns})
+        after = measure(GridSearch(pipe, param_grid), X, y,
+                        {'rows': train_rows, 'columns': columns})
+        print(f'{cores:>5} {before[0]:>17.0f} {after[0]:>15.0f} '
+              f'{before[1]:>15.2f} {after[1]:>13.2f}')
+    worker_pool.shutdown_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark compiled NumPy inference against sklearn's Pipeline.predict.
+
+Fits the pipelines of the Train app on a synthetic dataset, compiles them
+with compiled.compile_pipeline(), checks that the compiled predictions equal
+sklearn's, and prints the median latency of both for batch sizes from 1 row
+up to --max-batch rows.  The forests use max_depth=10, the top of the Train
+app's max_depth slider.
+
+Usage:
+    python benchmarks/bench_inference.py --max-batch 1000000
+"""
+
+# %% Imports
+# Standard system imports
+import argparse
+import time
+
+# Related third party imports
+import numpy as np
+from sklearn.datasets import make_classification, make_regression
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.compiled import compile_pipeline, verify
+from bokeh_server.train.twe_learn.train_model import build_pipeline
+
+
+# %% Globals
+MODELS = {'Logistic Regression': {},
+          'Ridge Regression': {},
+          'SVC (approx. rbf kernel)': {},
+          'Random Forest CLF': {'n_estimators': 100, 'max_depth': 10},
+          'Random Forest REG': {'n_estimators': 100, 'max_depth': 10},
+          'Gradient Boosting CLF': {'n_estimators': 100},
+          'Gradient Boosting REG': {'n_estimators': 100}}
+
+
+# %% Benchmark
+def latency(predict, X, min_time=0.2):
+    """Return median seconds per call of predict(X)."""
+    times = []
+    start = time.perf_counter()
+    while not times or (time.perf_counter() - start < min_time
+                        and len(times) < 1000):
+        call_start = time.perf_counter()
+        predict(X)
+        times.append(time.perf_counter() - call_start)
+    return float(np.median(times))
+
+
+def main():
+    """Print latency of sklearn and compiled predict for every batch size."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20_000,
+                        help='training rows')
+    parser.add_argument('--features', type=int, default=20)
+    parser.add_argument('--max-batch', type=int, default=1_000_000)
+    args = parser.parse_args()
+    rng = np.random.default_rng(214)
+    X_clf, y_clf = make_classification(args.rows, args.features,
+                                       n_informative=10, n_classes=3,
+                                       random_state=214)
+    X_reg, y_reg = make_regression(args.rows, args.features,
+                                   n_informative=10, noise=10,
+                                   random_state=214)
+    batch_sizes = [10**x for x in range(len(str(args.max_batch)))
+                   if 10**x <= args.max_batch]
+    print(f"{'model':<26} {'batch':>8} {'sklearn ms':>11} "
+          f"{'compiled ms':>12} {'speedup':>8} {'equal':>6}")
+    for model_name, params in MODELS.items():
+        X, y = (X_reg, y_reg) if 'REG' in model_name or 'Ridge' in \
+            model_name else (X_clf, y_clf)
+        pipe = build_pipeline({'model': model_name})
+        pipe.set_params(**{f'model__{key}': value
+                           for key, value in params.items()})
+        pipe.fit(X, y)
+        compiled = compile_pipeline(pipe)
+        for batch_size in batch_sizes:
+            X_batch = X[rng.integers(0, len(X), batch_size)]
+            equal = verify(compiled, pipe, X_batch)
+            sklearn_time = latency(pipe.predict, X_batch)
+            compiled_time = latency(compiled.predict, X_batch)
+            print(f'{model_name:<26} {batch_size:>8} '
+                  f'{1000 * sklearn_time:>11.3f} '
+                  f'{1000 * compiled_time:>12.3f} '
+                  f'{sklearn_time / compiled_time:>8.1f} {str(equal):>6}',
+                  flush=True)
+
+
+if __name__ == '__main__':
+    main()
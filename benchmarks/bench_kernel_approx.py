@@ -0,0 +1,122 @@
+"""Benchmark approximate-kernel SVMs against exact SVC and SVR.
+
+Fits the exact RBF SVM and the approximate-kernel pipelines of the Train app
+(a Nystroem or RBFSampler feature map followed by a linear SVM) on the bundled
+datasets and on synthetic datasets of increasing size, and prints the fit
+time and test score (accuracy or R²) of each.  Exact SVMs are skipped above
+--exact-max rows, where they take minutes to hours.
+
+Run from the repository root so the bundled datasets are found.
+
+Usage:
+    python benchmarks/bench_kernel_approx.py --rows 10000 50000 200000
+"""
+
+# %% Imports
+# Standard system imports
+import argparse
+from pathlib import Path
+import time
+
+# Related third party imports
+import pandas as pd
+from sklearn.datasets import make_classification, make_regression
+from sklearn.kernel_approximation import RBFSampler
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC, SVR
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.train_model import build_pipeline
+
+
+# %% Datasets
+DATASETS_PATH = Path('src/app/static/datasets')
+
+
+def bundled_datasets():
+    """Yield (name, X, y, type) of the datasets shipped with the app."""
+    iris = pd.read_csv(DATASETS_PATH / 'iris/data/bezdekIris.txt',
+                       header=None)
+    yield 'iris', iris.iloc[:, :-1], iris.iloc[:, -1], 'classification'
+    wine = pd.read_csv(DATASETS_PATH / 'wine/data/winequality-white.txt',
+                       sep=';', header=None)
+    yield 'wine', wine.iloc[:, :-1], wine.iloc[:, -1], 'classification'
+    boston = pd.read_csv(DATASETS_PATH / 'boston/data/boston.txt',
+                         header=None)  # Target is CRIM, the first column
+    yield 'boston', boston.iloc[:, 1:], boston.iloc[:, 0], 'regression'
+    autompg = pd.read_csv(DATASETS_PATH / 'autompg/data/auto-mpg.txt',
+                          sep=r'\s+', header=None, na_values='?').dropna()
+    yield 'autompg', autompg.iloc[:, 1:8], autompg.iloc[:, 0], 'regression'
+
+
+def synthetic_datasets(sizes, n_features):
+    """Yield (name, X, y, type) of synthetic datasets of the given sizes."""
+    for n_rows in sizes:
+        X, y = make_classification(n_rows, n_features, n_informative=10,
+                                   n_classes=3, random_state=214)
+        yield f'synthetic clf {n_rows}', X, y, 'classification'
+        X, y = make_regression(n_rows, n_features, n_informative=10,
+                               noise=10, random_state=214)
+        # Nonlinear target so the kernel matters, standardized so SVR's
+        # default epsilon and C suit it
+        y = y + 0.01 * y**2
+        yield f'synthetic reg {n_rows}', X, (y - y.mean()) / y.std(), \
+            'regression'
+
+
+# %% Benchmark
+def pipelines(ml_type, n_features, n_components, exact):
+    """Return (name, pipeline) pairs to compare on one dataset."""
+    svm = 'SVC' if ml_type == 'classification' else 'SVR'
+    settings = {'model': f'{svm} (approx. rbf kernel)',
+                'n_components': n_components}
+    nystroem = build_pipeline(settings)
+    # Same gamma as the Nystroem map and as the exact SVM's gamma='scale'
+    sampler = build_pipeline(settings)
+    sampler.steps[1] = ('kernel', RBFSampler(gamma=1 / n_features,
+                                             n_components=n_components,
+                                             random_state=214))
+    pairs = [('Nystroem', nystroem), ('RBFSampler', sampler)]
+    if exact:
+        model = SVC() if ml_type == 'classification' else SVR()
+        pairs.insert(0, (f'exact {svm}', Pipeline(
+            [('scale', StandardScaler()), ('model', model)])))
+    return pairs
+
+
+def measure(pipe, X_train, X_test, y_train, y_test):
+    """Return fit time (s) and test score of a pipeline."""
+    start = time.perf_counter()
+    pipe.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+    return fit_time, pipe.score(X_test, y_test)
+
+
+def main():
+    """Print fit time and test score of every pipeline on every dataset."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+',
+                        default=[10_000, 50_000, 200_000])
+    parser.add_argument('--features', type=int, default=20)
+    parser.add_argument('--components', type=int, default=300)
+    parser.add_argument('--exact-max', type=int, default=50_000)
+    args = parser.parse_args()
+    print(f"{'dataset':<22} {'model':<11} {'rows':>7} {'fit s':>8} "
+          f"{'score':>7}")
+    datasets = list(bundled_datasets()) + \
+        list(synthetic_datasets(args.rows, args.features))
+    for name, X, y, ml_type in datasets:
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, train_size=0.8, random_state=214)
+        exact = len(X_train) <= args.exact_max
+        for model_name, pipe in pipelines(ml_type, X.shape[1],
+                                          args.components, exact):
+            fit_time, score = measure(pipe, X_train, X_test, y_train, y_test)
+            print(f'{name:<22} {model_name:<11} {len(X_train):>7} '
+                  f'{fit_time:>8.2f} {score:>7.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Benchmark throughput and latency of the webapp's /predict route.
+
+Trains a model on a synthetic dataset, saves it as the Train app does in a
+temporary directory, and serves the webapp with waitress on a local port
+with login disabled.  Concurrent clients then send JSON batches of rows over
+keep-alive connections.  Prints the requests and rows scored per second and
+the median and 99th percentile latency for several client counts, request
+sizes, and micro-batching waits.
+
+The webapp reads its secret keys and database name from the environment;
+temporary keys are created if they are not set.  No MySQL server is needed.
+
+Usage:
+    python benchmarks/bench_predict.py --model "Random Forest CLF"
+"""
+
+# %% Imports
+# Standard system imports
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+import os
+from pathlib import Path
+import tempfile
+import threading
+import time
+
+# Related third party imports
+import numpy as np
+import pandas as pd
+from sklearn.datasets import make_classification, make_regression
+from waitress import create_server
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.artifacts import save_run
+from bokeh_server.train.twe_learn.search import GridSearch
+from bokeh_server.train.twe_learn.train_model import build_pipeline
+from bokeh_server.train.twe_learn.worker_pool import shutdown_pool
+
+
+# %% Globals
+CLIENTS = [1, 4, 16]
+REQUEST_ROWS = [1, 100, 1000]
+BATCH_WAITS_MS = [0, 2]
+
+
+# %% Setup
+def save_model(model_name, rows, n_features, directory):
+    """Fit a model on synthetic data, save it, and return the features."""
+    make_data = make_regression if 'REG' in model_name else \
+        make_classification
+    X, y = make_data(rows, n_features, n_informative=min(10, n_features // 2),
+                     random_state=214)
+    features = [f'x{i}' for i in range(n_features)]
+    X = pd.DataFrame(X, columns=features)
+    search = GridSearch(build_pipeline({'model': model_name}), {},
+                        cv=3).fit(X, y)
+    save_run(search, {'features': features, 'target': 'y',
+                      'training_settings': {'features': features}},
+             directory)
+    return X
+
+
+def serve(directory, threads):
+    """Start the webapp with waitress and return the server and its port."""
+    for key in ('FLASK_SECRET_KEY_FILE', 'BOKEH_SECRET_KEY_FILE'):
+        if key not in os.environ:
+            secret_path = directory / key.lower()
+            secret_path.write_text('benchmark')
+            os.environ[key] = str(secret_path)
+    os.environ.setdefault('MYSQL_DATABASE', 'ml_data')
+    from app import create_app
+    from app.main import views
+    from app.main.batch_predictor import BatchPredictor
+    app = create_app()
+    app.config['LOGIN_DISABLED'] = True
+    views.predictor = BatchPredictor(directory / 'model',
+                                     directory / 'train_data')
+    server = create_server(app, host='127.0.0.1', port=0, threads=threads)
+    threading.Thread(target=server.run, daemon=True).start()
+    return server, server.effective_port, views
+
+
+# %% Benchmark
+def client(port, bodies):
+    """Send request bodies over one connection and return the latencies."""
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    latencies = []
+    for body in bodies:
+        start = time.perf_counter()
+        connection.request('POST', '/predict', body,
+                           {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            raise RuntimeError(f'HTTP {response.status}')
+    connection.close()
+    return latencies
+
+
+def run(port, X, n_clients, request_rows, n_requests):
+    """Return requests/s, rows/s, and median and p99 latency (ms)."""
+    rng = np.random.default_rng(214)
+    bodies = [X.iloc[rng.integers(0, len(X), request_rows)]
+              .to_json(orient='records') for _ in range(n_requests)]
+    with ThreadPoolExecutor(n_clients) as executor:
+        start = time.perf_counter()
+        latencies = np.concatenate(list(executor.map(
+            lambda i: client(port, bodies[i::n_clients]),
+            range(n_clients))))
+        elapsed = time.perf_counter() - start
+    return (n_requests / elapsed, n_requests * request_rows / elapsed,
+            1000 * np.median(latencies), 1000 * np.percentile(latencies, 99))
+
+
+def main():
+    """Print /predict throughput and latency for every load setting."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default='Random Forest CLF')
+    parser.add_argument('--rows', type=int, default=20_000,
+                        help='training rows')
+    parser.add_argument('--features', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=400,
+                        help='requests per setting')
+    parser.add_argument('--threads', type=int, default=16,
+                        help='waitress threads')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            X = save_model(args.model, args.rows, args.features, Path(tmp))
+        finally:
+            shutdown_pool()
+        server, port, views = serve(Path(tmp), args.threads)
+        print(f'{args.model}, {args.threads} waitress threads')
+        print(f"{'wait ms':>7} {'clients':>7} {'rows':>6} {'req/s':>8} "
+              f"{'rows/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+        try:
+            for batch_wait in BATCH_WAITS_MS:
+                views.predictor.batch_wait = batch_wait / 1000
+                for request_rows in REQUEST_ROWS:
+                    for n_clients in CLIENTS:
+                        result = run(port, X, n_clients, request_rows,
+                                     args.requests)
+                        print(f'{batch_wait:>7} {n_clients:>7} '
+                              f'{request_rows:>6} {result[0]:>8.0f} '
+                              f'{result[1]:>10.0f} {result[2]:>8.2f} '
+                              f'{result[3]:>8.2f}', flush=True)
+        finally:
+            server.close()
+
+
+if __name__ == '__main__':
+    main()
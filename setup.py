@@ -3,5 +3,11 @@ from setuptools import setup, find_packages
 setup(
     name="enchilada",
     packages=find_packages(where="src"),
-    package_dir={'': 'src'}
+    package_dir={'': 'src'},
+    entry_points={
+        'console_scripts': [
+            'twe-train=bokeh_server.train.twe_learn.batch:main',
+            'twe-score=bokeh_server.train.twe_learn.scoring:main'
+        ]
+    }
 )
@@ -0,0 +1,182 @@
+"""Score rows sent to the webapp with the trained model.
+
+The model saved by the Train app is loaded once per process through the
+model cache shared with the rest of the package, and compiled to NumPy
+inference code where possible (see compiled.py).  A model saved by a new
+training run is picked up on the next request.
+
+Requests are parsed and validated against the model's stored feature list
+in the request threads, then queued.  A single scoring thread takes every
+queued request, up to TWE_PREDICT_MAX_BATCH_ROWS rows, and scores them with
+one vectorized predict call, so requests arriving while a batch is scored
+share the fixed cost of the next predict call instead of each paying it.
+TWE_PREDICT_BATCH_WAIT_MS (0 by default) makes the thread wait that long
+for more requests, trading the latency of lone requests for larger batches.
+
+Classes:
+    -   BatchPredictor: Micro-batching predictor of the trained model.
+
+Functions:
+    -   parse_rows: Return the feature matrix of JSON or CSV rows.
+"""
+
+# %% Imports
+# Standard system imports
+from concurrent.futures import Future
+import io
+import json
+import os
+from pathlib import Path
+import queue
+import threading
+import time
+
+# Related third party imports
+import numpy as np
+import pandas as pd
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.artifacts import load_model, TrainingData
+from bokeh_server.train.twe_learn.compiled import predict_rows, predictor
+
+
+# %% Globals
+MODEL_PATH = Path('src/bokeh_server/data/model')
+TRAIN_DATA_PATH = Path('src/bokeh_server/data/train_data')
+MAX_REQUEST_ROWS = int(os.environ.get('TWE_PREDICT_MAX_REQUEST_ROWS',
+                                      100_000))
+MAX_BATCH_ROWS = int(os.environ.get('TWE_PREDICT_MAX_BATCH_ROWS', 10_000))
+BATCH_WAIT = float(os.environ.get('TWE_PREDICT_BATCH_WAIT_MS', 0)) / 1000
+
+
+# %% Parsing
+def parse_rows(body, mimetype, features, max_rows=MAX_REQUEST_ROWS):
+    """Return the float64 feature matrix of JSON or CSV rows.
+
+    JSON bodies are a list of objects (one per row) or an object of column
+    lists; CSV bodies have a header row.  Columns are matched to features by
+    name and other columns are ignored.  Raises ValueError if the body
+    cannot be parsed, lacks a feature, or holds non-numeric or missing
+    values.
+    """
+    try:
+        if mimetype == 'application/json':
+            rows = pd.DataFrame(json.loads(body))
+        elif mimetype == 'text/csv':
+            rows = pd.read_csv(io.StringIO(body))
+        else:
+            raise ValueError('Send rows as application/json or text/csv.')
+    except (json.JSONDecodeError, pd.errors.ParserError) as err:
+        raise ValueError(f'Cannot parse {mimetype} body: {err}') from err
+    if len(rows) == 0:
+        raise ValueError('No rows to score.')
+    if len(rows) > max_rows:
+        raise ValueError(f'At most {max_rows} rows can be scored per '
+                         'request.')
+    missing = [x for x in features if x not in rows.columns]
+    if missing:
+        raise ValueError(f'Missing features: {", ".join(missing)}.')
+    try:
+        X = rows[features].to_numpy(dtype=np.float64)
+    except (TypeError, ValueError) as err:
+        raise ValueError(f'Features must be numeric: {err}') from err
+    missing_rows = np.flatnonzero(np.isnan(X).any(axis=1))
+    if len(missing_rows):
+        raise ValueError('Missing feature values in rows '
+                         f'{missing_rows[:10].tolist()}.')
+    return X
+
+
+# %% Batch predictor
+class BatchPredictor:
+    """Micro-batching predictor of the trained model."""
+
+    def __init__(self, model_path=MODEL_PATH, data_path=TRAIN_DATA_PATH,
+                 max_batch_rows=MAX_BATCH_ROWS, batch_wait=BATCH_WAIT):
+        """Store the artifact paths and batching limits."""
+        self.model_path = Path(model_path)
+        self.data_path = Path(data_path)
+        self.max_batch_rows = max_batch_rows
+        self.batch_wait = batch_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._model = None      # Model object the predictor was built from
+        self._predictor = None
+        self.features = None
+
+    def current(self):
+        """Return the compiled (or fitted) model and its feature list.
+
+        Raises FileNotFoundError if no model has been trained.  Published
+        runs are resolved once, so the features come from the model's run.
+        """
+        model_path = self.model_path.resolve()
+        data_path = model_path.parent / self.data_path.name \
+            if self.model_path.is_symlink() else self.data_path
+        model = load_model(model_path)
+        with self._lock:
+            if model is not self._model:
+                self.features = list(TrainingData(data_path).features)
+                self._predictor = predictor(model)
+                self._model = model
+            return self._predictor, self.features
+
+    def parse(self, body, mimetype):
+        """Return the feature matrix of a request body and its features."""
+        _, features = self.current()
+        return parse_rows(body, mimetype, features), features
+
+    def predict(self, X, features):
+        """Return predictions of rows validated against features.
+
+        The rows are scored in a batch with the other queued requests.
+        """
+        future = Future()
+        self._queue.put((X, features, future))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                daemon=True)
+                self._thread.start()
+        return future.result()
+
+    def _next_batch(self):
+        """Return the queued requests of the next batch, waiting for one."""
+        batch = [self._queue.get()]
+        n_rows = len(batch[0][0])
+        deadline = time.monotonic() + self.batch_wait
+        while n_rows < self.max_batch_rows:
+            try:
+                request = self._queue.get(
+                    timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            batch.append(request)
+            n_rows += len(request[0])
+        return batch
+
+    def _run(self):
+        """Score queued requests in batches until the process exits."""
+        while True:
+            batch = self._next_batch()
+            try:
+                model, features = self.current()
+                stale = [x for x in batch if x[1] != features]
+                batch = [x for x in batch if x[1] == features]
+                for _, _, future in stale:
+                    future.set_exception(ValueError(
+                        'The model was retrained while scoring; send the '
+                        'rows again.'))
+                if not batch:
+                    continue
+                predictions = predict_rows(
+                    model, np.concatenate([x[0] for x in batch]), features)
+            except Exception as err:
+                for _, _, future in batch:
+                    future.set_exception(err)
+                continue
+            ends = np.cumsum([len(x[0]) for x in batch])
+            for (_, _, future), part in zip(
+                    batch, np.split(predictions, ends[:-1])):
+                future.set_result(part)
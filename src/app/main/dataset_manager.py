@@ -12,6 +12,7 @@ import pickle
 # Related third party imports
 
 # Local application/library specific imports
+from bokeh_server.train.twe_learn.artifacts import dump_eda_metadata
 from .. import db
 
 
@@ -24,6 +25,7 @@ class DatasetManager:
         self.session = session
         self.datasets_path = Path('src/app/static/datasets')
         self.data_path = Path('src/bokeh_server/data/eda_data')
+        self.metadata_path = Path('src/bokeh_server/data/eda_metadata')
         self.train_data_path = Path('src/bokeh_server/data/train_data')
         self.metadata = {
             'iris': {
@@ -93,6 +95,8 @@ class DatasetManager:
         pickle_data = {'data': data, 'metadata': metadata}
         with open(self.data_path, 'wb') as data_file:
             pickle.dump(pickle_data, data_file)
+        # Lets the Train app start without loading the dataset
+        dump_eda_metadata(pickle_data, self.metadata_path)
 
     def build_datasets_table(self):
         """Return data needed to build table used by load_datasets() route."""
@@ -2,6 +2,8 @@
 
 Routes/view functions:
     -   index(): Main page of webapp.  Landing page after user logs in.
+
+    -   predict(): Score JSON or CSV rows with the trained model.
 """
 
 # %% Imports
@@ -11,11 +13,13 @@ from pathlib import Path
 # Related third party imports
 from bokeh.embed import server_session
 from bokeh.util.token import generate_session_id
-from flask import session, render_template, redirect, url_for, current_app
+from flask import session, render_template, redirect, url_for, \
+    current_app, request, jsonify
 from flask_login import login_required
 
 # Local application/library specific imports
 from . import main
+from .batch_predictor import BatchPredictor
 from .dataset_manager import DatasetManager
 from ..testing import run_pytest, report_date_time
 from .. import db
@@ -23,6 +27,7 @@ from .. import db
 
 # %% Globals
 mgr = DatasetManager(session)
+predictor = BatchPredictor()  # Scores requests of every thread in batches
 
 
 # %% Routes and view functions
@@ -149,6 +154,27 @@ def results():
     return render_template('results.html', script=script)
 
 
+# %% Predict Section
+@main.route('/predict', methods=["POST"])
+@login_required
+def predict():
+    """Return predictions of the trained model for JSON or CSV rows.
+
+    Rows are sent as a JSON list of objects (or object of column lists) or
+    as CSV with a header row, and must hold every feature the model was
+    trained on.  Predictions are returned in the order of the rows.
+    """
+    try:
+        X, features = predictor.parse(request.get_data(as_text=True),
+                                      request.mimetype)
+        predictions = predictor.predict(X, features)
+    except FileNotFoundError:
+        return jsonify(error='No model has been trained.'), 404
+    except ValueError as err:
+        return jsonify(error=str(err)), 400
+    return jsonify(predictions=predictions.tolist(), rows=len(predictions))
+
+
 # %% Tests Section
 @main.route('/tests/', methods=["GET", "POST"])
 @login_required
@@ -7,12 +7,12 @@ classification problem.
 # %% Imports
 # Standard system imports
 from pathlib import Path
-import pickle
 
 # Related third party imports
 from bokeh.io import curdoc
 
 # Local application/library specific imports
+from bokeh_server.train.twe_learn.artifacts import eda_metadata
 from bokeh_server.results.plots.regression_results import regression_results
 from bokeh_server.results.plots.classification_results \
     import classification_results
@@ -22,9 +22,7 @@ from bokeh_server.results.plots.classification_results \
 # Setup
 # -----------------------------------------------------------------------------
 data_path = Path('src/bokeh_server/data/eda_data')
-with open(data_path, 'rb') as data_file:
-    pickled_data = pickle.load(data_file)
-metadata = pickled_data['metadata']
+metadata, _, _ = eda_metadata(data_path)
 ml_type = metadata['type']
 
 
@@ -8,6 +8,14 @@ Results:
     -   Training CM: Confusion matrix on training data
 
     -   Test CM: Confusion matrix on test data
+
+    -   Curves: ROC and precision-recall curves of each class on test data
+
+    -   Importance: Permutation importance of the features on test data
+
+    -   Tuning: Validation curves and heatmaps of the grid search
+
+    -   Learning curve: Train and CV scores against training-set size
 """
 
 # %% Imports
@@ -17,13 +25,21 @@ from pathlib import Path
 # Related third party imports
 from bokeh.layouts import column, row
 from bokeh.models import ColumnDataSource, Div
-import joblib
 import pandas as pd
-from sklearn.metrics import classification_report
 
 # Local application/library specific imports
 from bokeh_server.results.plots.confusion_matrix import create_confusion_matrix
+from bokeh_server.results.plots.curves_plot import create_curves_plot
+from bokeh_server.results.plots.importance_plot import create_importance_plot
+from bokeh_server.results.plots.learning_curve_plot import \
+    create_learning_curve_plot
 from bokeh_server.results.plots.report_table import create_report_table
+from bokeh_server.results.plots.tuning_plot import create_tuning_panel
+from bokeh_server.train.twe_learn.artifacts import run_directory, \
+    TrainingData
+from bokeh_server.train.twe_learn.evaluation import load_results
+from bokeh_server.train.twe_learn.learning_curve import learning_curve_job
+from bokeh_server.train.twe_learn.tuning import load_search, search_grid
 
 
 # %% Define classification results
@@ -32,30 +48,20 @@ def classification_results():
     # -------------------------------------------------------------------------
     # Setup
     # -------------------------------------------------------------------------
-    # Load data and model from volume
-    model_filename = Path('src/bokeh_server/data/model')
-    data_filename = Path('src/bokeh_server/data/train_data')
-    model = joblib.load(model_filename)
-    data = joblib.load(data_filename)
-    X_train = data['X_train']
-    X_test = data['X_test']
-    y_train = data['y_train']
-    y_test = data['y_test']
-    training_settings = data['training_settings']
+    # Load settings and results precomputed at training time from volume
+    # Every artifact is read from the same run, even if a new one is published
+    data_path = run_directory(Path('src/bokeh_server/data'))
+    training_settings = TrainingData(data_path / 'train_data') \
+        .training_settings
+    results = load_results(data_path)
     dataset = training_settings['dataset']
     # Classification report on training data
-    y_pred_train = model.predict(X_train)
-    train_report = classification_report(y_train, y_pred_train,
-                                         output_dict=True, zero_division=0)
-    train_df = pd.DataFrame(train_report).transpose()
+    train_df = pd.DataFrame(results['train']['report']).transpose()
     train_df.reset_index(inplace=True)  # Add index as a column to dataframe
     train_df = train_df.round(2)  # Round values to two decimal places
     train_source = ColumnDataSource(train_df)
     # Classification report on test data
-    y_pred_test = model.predict(X_test)
-    test_report = classification_report(y_test, y_pred_test, output_dict=True,
-                                        zero_division=0)
-    test_df = pd.DataFrame(test_report).transpose()
+    test_df = pd.DataFrame(results['test']['report']).transpose()
     test_df.reset_index(inplace=True)  # Add index as a column to dataframe
     test_df = test_df.round(2)  # Round values to two decimal places
     test_source = ColumnDataSource(test_df)
@@ -74,14 +80,42 @@ def classification_results():
     # -------------------------------------------------------------------------
     # Confusion Matrices
     # -------------------------------------------------------------------------
-    train_cm = create_confusion_matrix(y_train, y_pred_train,
+    train_cm = create_confusion_matrix(results['train']['confusion'],
+                                       results['train']['labels'],
                                        "Training Data Confusion Matrix",
                                        COL_WIDTH)
 
-    test_cm = create_confusion_matrix(y_test, y_pred_test,
+    test_cm = create_confusion_matrix(results['test']['confusion'],
+                                      results['test']['labels'],
                                       "Test Data Confusion Matrix",
                                       COL_WIDTH)
 
+    # -------------------------------------------------------------------------
+    # ROC and Precision-Recall Curves
+    # -------------------------------------------------------------------------
+    curves_plot = create_curves_plot(results['test'].get('curves'),
+                                     2*COL_WIDTH)
+
+    # -------------------------------------------------------------------------
+    # Permutation Importance
+    # -------------------------------------------------------------------------
+    importance_plot = create_importance_plot(results.get('importance'),
+                                             2*COL_WIDTH)
+
+    # -------------------------------------------------------------------------
+    # Tuning Diagnostics
+    # -------------------------------------------------------------------------
+    cv_results = load_search(data_path).get('cv_results_')
+    tuning_panel = create_tuning_panel(
+        None if cv_results is None else search_grid(cv_results), 2*COL_WIDTH)
+
+    # -------------------------------------------------------------------------
+    # Learning Curve
+    # -------------------------------------------------------------------------
+    # Computed in the background; points are added as their fits complete
+    learning_curve_plot = create_learning_curve_plot(
+        learning_curve_job(data_path), 2*COL_WIDTH)
+
     # -------------------------------------------------------------------------
     # Div Containing Settings
     # -------------------------------------------------------------------------
@@ -104,7 +138,7 @@ def classification_results():
     for key, value in training_settings.items():
         settings_div.text += f"<b>{key}:</b> {value}<br>"
     settings_div.text += f"""
-    <br><b>Chosen Params:</b> {model.best_estimator_}</div>"""
+    <br><b>Chosen Params:</b> {results['estimator']}</div>"""
 
     # -------------------------------------------------------------------------
     # Layout
@@ -113,6 +147,10 @@ def classification_results():
         row(column(train_report, test_report),
             column(train_cm, margin=(0, MARGIN, 0, MARGIN), width=COL_WIDTH),
             column(test_cm)),
+        curves_plot,
+        importance_plot,
+        tuning_panel,
+        learning_curve_plot,
         settings_div)
 
     return results_layout
@@ -9,21 +9,25 @@ from bokeh.palettes import Inferno256
 from bokeh.plotting import figure
 from bokeh.models import ColorBar, LinearColorMapper, Select
 import numpy as np
-from sklearn.metrics import confusion_matrix
 
 # Local application/library specific imports
 
 
 # %% Define Confusion Matrix
-def create_confusion_matrix(y_true, y_pred, title, col_width):
-    """Return plot of confusion matrix."""
+def create_confusion_matrix(counts, labels, title, col_width):
+    """Return plot of a confusion matrix precomputed at training time.
+
+    counts holds the number of rows of each true (row) and predicted (column)
+    class label in labels.
+    """
     # -------------------------------------------------------------------------
     # Setup
     # -------------------------------------------------------------------------
-    train_cm = confusion_matrix(y_true, y_pred)
-    train_cm_norm = confusion_matrix(y_true, y_pred, normalize='true')
-    # Sklearn confusion matrix sorts class labels
-    factors = sorted(list(np.unique(y_true)))
+    train_cm = np.asarray(counts)
+    # Normalize over true labels, as confusion_matrix(normalize='true')
+    totals = train_cm.sum(axis=1, keepdims=True)
+    train_cm_norm = train_cm / np.where(totals == 0, 1, totals)
+    factors = [str(x) for x in labels]
     # Build rows (y) and columns (x) of confusion matrix
     x = factors*len(factors)  # Columns of labels repeated every row
     y = [factor for factor in factors for f in factors]  # Rows of labels
@@ -0,0 +1,93 @@
+"""Return ROC and precision-recall curves of each class of the classifier."""
+
+# %% Imports
+# Standard system imports
+
+# Related third party imports
+from bokeh.layouts import row
+from bokeh.models import ColumnDataSource, Div, HoverTool
+from bokeh.palettes import Category10, Category20
+from bokeh.plotting import figure
+
+# Local application/library specific imports
+
+
+# %% Define curves plot
+def _colors(n_classes):
+    """Return a color for each of n_classes curves."""
+    if n_classes <= 10:
+        return Category10[10][:n_classes]
+    return [Category20[20][x % 20] for x in range(n_classes)]
+
+
+def _curve_plot(title, x_label, y_label, width):
+    """Return an empty plot of curves over the unit square."""
+    plot = figure(toolbar_location=None, width=width, height=width,
+                  x_range=(-0.02, 1.02), y_range=(-0.02, 1.02),
+                  background_fill_color="#DDDDDD",
+                  outline_line_color="white", title=title)
+    plot.grid.grid_line_dash = [6, 4]
+    plot.grid.grid_line_color = "white"
+    plot.axis.major_label_text_font_size = "1em"
+    plot.axis.major_label_text_font_style = "bold"
+    plot.axis.axis_label_text_font_size = "1em"
+    plot.axis.axis_label_text_font_style = "bold"
+    plot.xaxis.axis_label = x_label
+    plot.yaxis.axis_label = y_label
+    return plot
+
+
+def create_curves_plot(curves, width):
+    """Return ROC and precision-recall curves computed at training time.
+
+    curves holds one entry per class, as returned by curves.py's
+    classifier_curves(); each curve is already reduced to a few hundred
+    vertices.  Runs saved before the curves were computed get a note.
+    """
+    if curves is None:
+        return Div(text="<b>ROC and precision-recall curves were not "
+                   "computed for this model; train it again to see them."
+                   "</b>", width=width)
+    if not curves:
+        return Div(text="<b>No class has both positive and negative rows in "
+                   "the test data, so no curve can be plotted.</b>",
+                   width=width)
+    # -------------------------------------------------------------------------
+    # Plots
+    # -------------------------------------------------------------------------
+    plot_width = width // 2
+    roc_plot = _curve_plot("ROC Curves (Test Data)", "False Positive Rate",
+                           "True Positive Rate", plot_width)
+    pr_plot = _curve_plot("Precision-Recall Curves (Test Data)", "Recall",
+                          "Precision", plot_width)
+    # Chance levels: the diagonal and the prevalence of a single class
+    roc_plot.line(x=[0, 1], y=[0, 1], line_color="gray", line_dash="dashed")
+    roc_renderers, pr_renderers = [], []
+    for curve, color in zip(curves, _colors(len(curves))):
+        label = str(curve['label'])
+        roc_source = ColumnDataSource({'x': curve['fpr'], 'y': curve['tpr'],
+                                       'threshold': curve['roc_thresholds'],
+                                       'label': [label] * len(curve['fpr'])})
+        pr_source = ColumnDataSource({'x': curve['recall'],
+                                      'y': curve['precision'],
+                                      'threshold': curve['pr_thresholds'],
+                                      'label': [label] * len(curve['recall'])})
+        roc_renderers.append(roc_plot.line(
+            x='x', y='y', source=roc_source, color=color, line_width=2,
+            legend_label=f"{label} (AUC {curve['roc_auc']:.3f})"))
+        pr_renderers.append(pr_plot.line(
+            x='x', y='y', source=pr_source, color=color, line_width=2,
+            legend_label=f"{label} (AP {curve['average_precision']:.3f})"))
+        if len(curves) <= 2:
+            pr_plot.line(x=[0, 1], y=[curve['prevalence']] * 2,
+                         line_color=color, line_dash="dashed")
+    for plot, renderers, x_name, y_name in (
+            (roc_plot, roc_renderers, 'FPR', 'TPR'),
+            (pr_plot, pr_renderers, 'Recall', 'Precision')):
+        plot.add_tools(HoverTool(renderers=renderers, tooltips=[
+            ('Class', '@label'), (x_name, '@x{0.000}'),
+            (y_name, '@y{0.000}'), ('Threshold', '@threshold{0.000}')]))
+        plot.legend.label_text_font_size = "0.8em"
+    roc_plot.legend.location = "bottom_right"
+    pr_plot.legend.location = "bottom_left"
+    return row(roc_plot, pr_plot)
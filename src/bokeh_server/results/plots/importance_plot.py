@@ -0,0 +1,70 @@
+"""Return bar chart of permutation importances of the model's features."""
+
+# %% Imports
+# Standard system imports
+
+# Related third party imports
+from bokeh.models import ColumnDataSource, Div, HoverTool
+from bokeh.palettes import Category10
+from bokeh.plotting import figure
+import numpy as np
+
+# Local application/library specific imports
+
+
+# %% Define globals
+COLOR = Category10[3][0]
+BAR_HEIGHT = 30     # Pixels per feature
+
+
+# %% Define importance plot
+def create_importance_plot(importance, width):
+    """Return bar chart of permutation importances computed at training time.
+
+    Bars show the mean drop of the test score when a feature is permuted,
+    and whiskers one standard deviation over the repeats.  Runs saved before
+    importances were computed get a note instead.
+    """
+    if importance is None:
+        return Div(text="<b>Permutation importance was not computed for "
+                   "this model; train it again to see it.</b>", width=width)
+    # -------------------------------------------------------------------------
+    # Setup
+    # -------------------------------------------------------------------------
+    mean = np.asarray(importance['mean'])
+    std = np.asarray(importance['std'])
+    order = np.argsort(mean)    # Most important feature on top
+    features = [str(importance['features'][x]) for x in order]
+    source = ColumnDataSource({'feature': features,
+                               'mean': mean[order],
+                               'std': std[order],
+                               'lower': (mean - std)[order],
+                               'upper': (mean + std)[order]})
+    metric = importance['metric']
+
+    # -------------------------------------------------------------------------
+    # Plot
+    # -------------------------------------------------------------------------
+    plot = figure(y_range=features, toolbar_location=None,
+                  background_fill_color="#DDDDDD",
+                  outline_line_color="white", width=width,
+                  height=BAR_HEIGHT * len(features) + 100,
+                  title=f"Permutation Importance ({importance['n_repeats']} "
+                  f"repeats, {importance['n_rows']} test rows)")
+    bars = plot.hbar(y='feature', right='mean', height=0.7, source=source,
+                     fill_color=COLOR, line_color="white", alpha=0.8)
+    plot.segment(x0='lower', y0='feature', x1='upper', y1='feature',
+                 source=source, line_color="black", line_width=2)
+    plot.add_tools(HoverTool(renderers=[bars], tooltips=[
+        ('Feature', '@feature'),
+        (f'{metric} drop', '@mean{0.0000} ± @std{0.0000}')]))
+    # Style plot
+    plot.grid.grid_line_dash = [6, 4]
+    plot.grid.grid_line_color = "white"
+    plot.axis.major_label_text_font_size = "1em"
+    plot.axis.major_label_text_font_style = "bold"
+    plot.axis.axis_label_text_font_size = "1em"
+    plot.axis.axis_label_text_font_style = "bold"
+    plot.xaxis.axis_label = f"Decrease in Test {metric} " \
+        f"(baseline {importance['baseline']:.3f})"
+    return plot
@@ -0,0 +1,129 @@
+"""Return learning curve of the model, filled in as its fits complete.
+
+The curve is computed by a background job on the worker pool (see
+learning_curve.py).  The job calls back after every completed fit and the
+plot's data is replaced on the Bokeh server's event loop, so the page is
+shown at once and the points appear as they arrive.
+"""
+
+# %% Imports
+# Standard system imports
+from functools import partial
+
+# Related third party imports
+from bokeh.io import curdoc
+from bokeh.layouts import column
+from bokeh.models import ColumnDataSource, Div, HoverTool
+from bokeh.palettes import Category10
+from bokeh.plotting import figure
+import numpy as np
+
+# Local application/library specific imports
+
+
+# %% Define globals
+COLORS = {'train': Category10[3][0], 'test': Category10[3][1]}
+
+
+# %% Define learning curve plot
+def _curve_data(snapshot):
+    """Return plot data of the completed points of a learning curve."""
+    data = {key: [] for key in ('size', 'train', 'train_lower',
+                                'train_upper', 'test', 'test_lower',
+                                'test_upper', 'fit_time', 'folds')}
+    if snapshot is None:
+        return data
+    for size, train, test, fit_time in zip(
+            snapshot['train_sizes'], snapshot['train_scores'],
+            snapshot['test_scores'], snapshot['fit_times']):
+        folds = np.isfinite(test)
+        if not folds.any():     # No fold of this size has completed
+            continue
+        data['size'].append(int(size))
+        data['fit_time'].append(np.nanmean(fit_time))
+        data['folds'].append(f'{folds.sum()}/{len(folds)}')
+        for name, scores in (('train', train), ('test', test)):
+            mean, std = np.nanmean(scores), np.nanstd(scores)
+            data[name].append(mean)
+            data[f'{name}_lower'].append(mean - std)
+            data[f'{name}_upper'].append(mean + std)
+    return data
+
+
+def _status(job, snapshot):
+    """Return text of the progress of a learning curve job."""
+    if job.error:
+        return f"<b>Learning curve failed:</b> {job.error}"
+    if snapshot is None:
+        return "<b>Computing learning curve...</b>"
+    n_fits = snapshot['test_scores'].size
+    if snapshot['done']:
+        return f"Learning curve of {n_fits} fits " \
+            f"({snapshot['seconds']:.1f} s)"
+    return f"<b>Computing learning curve:</b> {snapshot['n_done']} of " \
+        f"{n_fits} fits done"
+
+
+def create_learning_curve_plot(job, width):
+    """Return learning curve plot of a LearningCurveJob and its status.
+
+    Lines show the mean train and CV scores at each training size and bands
+    one standard deviation over the folds completed so far.
+    """
+    # -------------------------------------------------------------------------
+    # Setup
+    # -------------------------------------------------------------------------
+    doc = curdoc()
+    status_div = Div(width=width)
+    source = ColumnDataSource(_curve_data(None))
+
+    # -------------------------------------------------------------------------
+    # Plot
+    # -------------------------------------------------------------------------
+    plot = figure(toolbar_location=None, width=width, height=350,
+                  background_fill_color="#DDDDDD",
+                  outline_line_color="white", title="Learning Curve")
+    renderers = []
+    for name, label in (('train', 'Training score'), ('test', 'CV score')):
+        plot.varea(x='size', y1=f'{name}_lower', y2=f'{name}_upper',
+                   source=source, color=COLORS[name], alpha=0.2)
+        plot.line(x='size', y=name, source=source, color=COLORS[name],
+                  line_width=2, legend_label=label)
+        renderers.append(plot.circle(x='size', y=name, source=source,
+                                     color=COLORS[name], size=8))
+    plot.add_tools(HoverTool(renderers=renderers, tooltips=[
+        ('Training rows', '@size'),
+        ('Training score', '@train{0.0000}'),
+        ('CV score', '@test{0.0000}'),
+        ('Mean fit time', '@fit_time{0.000} s'),
+        ('Folds done', '@folds')]))
+    # Style plot
+    plot.legend.location = "bottom_right"
+    plot.grid.grid_line_dash = [6, 4]
+    plot.grid.grid_line_color = "white"
+    plot.axis.major_label_text_font_size = "1em"
+    plot.axis.major_label_text_font_style = "bold"
+    plot.axis.axis_label_text_font_size = "1em"
+    plot.axis.axis_label_text_font_style = "bold"
+    plot.xaxis.axis_label = "Training Rows"
+    plot.yaxis.axis_label = "Score"
+
+    # -------------------------------------------------------------------------
+    # Callbacks
+    # -------------------------------------------------------------------------
+    def update(snapshot):
+        """Plot the points of the curve completed so far."""
+        source.data = _curve_data(snapshot)
+        status_div.text = _status(job, snapshot)
+
+    def job_update(snapshot):
+        """Schedule update; called from the job's thread."""
+        doc.add_next_tick_callback(partial(update, snapshot))
+
+    def session_destroyed(session_context):
+        """Stop receiving updates once the page is closed."""
+        job.unsubscribe(job_update)
+
+    update(job.subscribe(job_update))
+    doc.on_session_destroyed(session_destroyed)
+    return column(status_div, plot)
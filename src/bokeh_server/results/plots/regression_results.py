@@ -6,12 +6,20 @@ Results:
     -   resid_hist: Histogram of regression residuals
 
     -   resid_vs_pred_plot: Return plot containing residuals versus predictions
+
+    -   density_plot: 2D histogram and largest residuals of large data sets
+
+    -   importance_plot: Permutation importance of the features on test data
+
+    -   tuning_panel: Validation curves and heatmaps of the grid search
+
+    -   learning_curve_plot: Train and CV scores against training-set size
 """
 
 # %% Imports
 # Standard system imports
+import os
 from pathlib import Path
-import pickle
 
 # Related third party imports
 from bokeh.io import show
@@ -19,22 +27,34 @@ from bokeh.layouts import column, row
 from bokeh.models.sources import ColumnDataSource
 from bokeh.palettes import Category10
 from bokeh.plotting import figure
-from bokeh.models import DataTable, Div, Select, TableColumn
-import joblib
+from bokeh.models import CDSView, DataTable, Div, HoverTool, \
+    LogColorMapper, Select, TableColumn
+from bokeh.palettes import Blues256
 import numpy as np
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 
 
 # Local application/library specific imports
+from bokeh_server.results.plots.importance_plot import create_importance_plot
+from bokeh_server.results.plots.learning_curve_plot import \
+    create_learning_curve_plot
+from bokeh_server.results.plots.tuning_plot import create_tuning_panel
+from bokeh_server.train.twe_learn.artifacts import eda_metadata, \
+    run_directory, TrainingData
+from bokeh_server.train.twe_learn.evaluation import load_results, \
+    residual_density
+from bokeh_server.train.twe_learn.learning_curve import learning_curve_job
+from bokeh_server.train.twe_learn.tuning import load_search, search_grid
 
 
 # %% Define globals
 MAX_PLOT_SIZE = 400
 COLOR = Category10[3][0]
+# Sets with more rows are plotted as 2D histograms instead of scatter plots
+SCATTER_MAX_ROWS = int(os.environ.get('TWE_SCATTER_MAX_ROWS', 5000))
 
 
 # %% Define plots
-def actual_vs_pred(y_true, y_pred, target):
+def actual_vs_pred(source, target):
     """Return scatterplot of actual vs. predicted values."""
     # -------------------------------------------------------------------------
     # Setup
@@ -42,8 +62,6 @@ def actual_vs_pred(y_true, y_pred, target):
     # Define constants
     MARKER = 'circle'
     DEFAULT_MARKER_SIZE = 9
-    # Define source
-    source = ColumnDataSource({'y_pred': y_pred, 'y_true': y_true})
 
     # -------------------------------------------------------------------------
     # Plots
@@ -84,22 +102,19 @@ def actual_vs_pred(y_true, y_pred, target):
     return scatter_plot
 
 
-def resid_hist(y_true, y_pred, target):
+def resid_hist(source, target):
     """Create a histogram plot of error residuals."""
     # -------------------------------------------------------------------------
     # Setup
     # -------------------------------------------------------------------------
-    residuals = y_true - y_pred
-
     hist_plot = figure(max_width=MAX_PLOT_SIZE, output_backend="webgl",
                        toolbar_location=None,
                        background_fill_color="#DDDDDD",
                        outline_line_color="white",
                        width=MAX_PLOT_SIZE, sizing_mode="scale_width",
                        height=MAX_PLOT_SIZE)
-    hist, edges = np.histogram(residuals, density=True, bins='auto')
-    hist_plot.quad(top=hist, bottom=0, left=edges[:-1],
-                   right=edges[1:], fill_color=COLOR,
+    hist_plot.quad(top='top', bottom=0, left='left', right='right',
+                   source=source, fill_color=COLOR,
                    line_color="white", alpha=0.5, legend_label=target)
     hist_plot.y_range.start = 0
     # Style histogram
@@ -134,7 +149,7 @@ def resid_hist(y_true, y_pred, target):
     return hist_plot
 
 
-def resid_vs_pred_plot(y_true, y_pred, target):
+def resid_vs_pred_plot(source, target):
     """Return plot containing residuals versus predictions."""
     # -------------------------------------------------------------------------
     # Setup
@@ -142,9 +157,6 @@ def resid_vs_pred_plot(y_true, y_pred, target):
     # Define constants
     MARKER = 'circle'
     DEFAULT_MARKER_SIZE = 9
-    # Define source
-    residuals = y_true - y_pred
-    source = ColumnDataSource({'y_pred': y_pred, 'residuals': residuals})
 
     # -------------------------------------------------------------------------
     # Plots
@@ -186,48 +198,126 @@ def resid_vs_pred_plot(y_true, y_pred, target):
     return scatter_plot
 
 
+def density_plot(bins_source, outlier_source, target, y_col, title,
+                 y_label):
+    """Return 2D histogram of y_col vs. predictions with largest residuals.
+
+    Bins are shaded by their number of rows and the rows with the largest
+    residuals are drawn over them as points.
+    """
+    # -------------------------------------------------------------------------
+    # Setup
+    # -------------------------------------------------------------------------
+    # Define constants
+    MARKER = 'circle'
+    DEFAULT_MARKER_SIZE = 6
+    mapper = LogColorMapper(palette=Blues256[::-1][64:])
+
+    # -------------------------------------------------------------------------
+    # Plots
+    # -------------------------------------------------------------------------
+    density = figure(max_width=MAX_PLOT_SIZE, output_backend="webgl",
+                     background_fill_color="#DDDDDD",
+                     outline_line_color="white", toolbar_location='right',
+                     width=MAX_PLOT_SIZE, sizing_mode="scale_width",
+                     height=MAX_PLOT_SIZE)
+    bins = density.rect(x='x', y='y', width='width', height='height',
+                        source=bins_source, line_color=None,
+                        fill_color={'field': 'count', 'transform': mapper})
+    density.scatter(x='y_pred', y=y_col, color=Category10[3][1],
+                    source=outlier_source, fill_alpha=0.6, marker=MARKER,
+                    size=DEFAULT_MARKER_SIZE,
+                    legend_label=f'{target}: largest residuals')
+    density.add_tools(HoverTool(renderers=[bins], tooltips=[
+        ('Predicted', '@x{0.00}'), (y_label, '@y{0.00}'),
+        ('Rows', '@count')]))
+    # Style density plot
+    density.grid.grid_line_dash = [6, 4]
+    density.grid.grid_line_color = "white"
+    density.axis.major_label_text_font_size = "1em"
+    density.axis.major_label_text_font_style = "bold"
+    density.axis.axis_label_text_font_size = "1em"
+    density.axis.axis_label_text_font_style = "bold"
+    # Add title and axis labels
+    density.title = f'{target}: {title}'
+    density.xaxis.axis_label = 'Predicted'
+    density.yaxis.axis_label = y_label
+    # Style legend
+    density.legend.background_fill_color = "#DDDDDD"
+    density.legend.label_text_font_style = "bold"
+    density.legend.border_line_width = 2
+    density.legend.border_line_color = "black"
+    density.legend.padding = 5
+    density.legend.margin = 30
+    density.legend.location = "top_left"
+    return density
+
+
+def _bins_source(counts, x_edges, y_edges):
+    """Return data source of the non-empty bins of a 2D histogram."""
+    x_index, y_index = np.nonzero(counts)
+    return ColumnDataSource({
+        'x': (x_edges[x_index] + x_edges[x_index + 1]) / 2,
+        'y': (y_edges[y_index] + y_edges[y_index + 1]) / 2,
+        'width': np.diff(x_edges)[x_index],
+        'height': np.diff(y_edges)[y_index],
+        'count': counts[x_index, y_index]})
+
+
 def regression_results():
     """Return table and plots of regression results using different metrics."""
     # -------------------------------------------------------------------------
     # Setup
     # -------------------------------------------------------------------------
-    # Load EDA data and metadata
-    data_path = Path('src/bokeh_server/data/eda_data')
-    with open(data_path, 'rb') as data_file:
-        pickled_data = pickle.load(data_file)
-    metadata = pickled_data['metadata']
-    dataset = metadata['dataset']
-    target = metadata['target']
-    # Load model and training data
-    model_filename = Path('src/bokeh_server/data/model')
-    data_filename = Path('src/bokeh_server/data/train_data')
-    model = joblib.load(model_filename)
-    data = joblib.load(data_filename)
-    training_settings = data['training_settings']
-    X_train = data['X_train']
-    X_test = data['X_test']
-    y_train = data['y_train']
-    y_test = data['y_test']
-    y_pred_train = model.predict(X_train)
-    y_pred_test = model.predict(X_test)
-    # Calculate error
-    mse_train = mean_squared_error(y_train, y_pred_train)
-    mse_test = mean_squared_error(y_test, y_pred_test)
-    rmse_train = mean_squared_error(y_train, y_pred_train, squared=False)
-    rmse_test = mean_squared_error(y_test, y_pred_test, squared=False)
-    mae_train = mean_absolute_error(y_train, y_pred_train)
-    mae_test = mean_absolute_error(y_test, y_pred_test)
-    r2_train = r2_score(y_train, y_pred_train)
-    r2_test = r2_score(y_test, y_pred_test)
-    # Create source
+    # Load settings and results precomputed at training time from volume
+    # Every artifact is read from the same run, even if a new one is published
+    data_path = run_directory(Path('src/bokeh_server/data'))
+    training_data = TrainingData(data_path / 'train_data')
+    training_settings = training_data.training_settings
+    dataset = training_settings['dataset']
+    # Runs saved before their target was stored used that of the eda_data
+    target = training_data.target or eda_metadata()[0]['target']
+    results = load_results(data_path)
+    # Metrics table
+    metrics = list(results['test']['metrics'])
     results_dict = {
-        'Metrics': ['MSE', 'RMSE', 'MAE', 'R\u00b2'],
-        'Training Data': [round(mse_train, 2), round(rmse_train, 2),
-                          round(mae_train, 2), round(r2_train, 2)],
-        'Test Data': [round(mse_test, 2), round(rmse_test, 2),
-                      round(mae_test, 2), round(r2_test, 2)]
+        'Metrics': metrics,
+        'Training Data': [round(results['train']['metrics'][x], 2)
+                          for x in metrics],
+        'Test Data': [round(results['test']['metrics'][x], 2)
+                      for x in metrics]
     }
     source = ColumnDataSource(results_dict)
+    # Plot sources of the training and test data, swapped by select_data.
+    # Large sets send their 2D histograms and largest residuals instead of
+    # every row.
+    aggregate = max(len(results[key]['y_true']) for key in ('train', 'test')) \
+        > SCATTER_MAX_ROWS
+    avp_sources, rvp_sources, hist_sources = {}, {}, {}
+    for name, key in (('Training', 'train'), ('Test', 'test')):
+        y_true = results[key]['y_true']
+        y_pred = results[key]['y_pred']
+        if aggregate:
+            # Runs saved before the histograms were precomputed
+            density = results[key].get('density') or \
+                residual_density(y_true, y_pred)
+            rows = density['outliers']
+            outlier_source = ColumnDataSource(
+                {'y_pred': y_pred[rows], 'y_true': y_true[rows],
+                 'residuals': y_true[rows] - y_pred[rows]})
+            avp_sources[name] = (_bins_source(*density['actual']),
+                                 outlier_source)
+            rvp_sources[name] = (_bins_source(*density['residuals']),
+                                 outlier_source)
+        else:
+            scatter_source = ColumnDataSource(
+                {'y_pred': y_pred, 'y_true': y_true,
+                 'residuals': y_true - y_pred})
+            avp_sources[name] = rvp_sources[name] = (scatter_source,)
+        edges = results[key]['edges']
+        hist_sources[name] = ColumnDataSource(
+            {'top': results[key]['hist'], 'left': edges[:-1],
+             'right': edges[1:]})
     # Layout parameters
     col_width = 300  # Results table width
     settings_width = 500  # Training settings div width
@@ -261,9 +351,23 @@ def regression_results():
     # -------------------------------------------------------------------------
     # Plots
     # -------------------------------------------------------------------------
-    avp = actual_vs_pred(y_test, y_pred_test, target)
-    hist_plot = resid_hist(y_test, y_pred_test, target)
-    rvp = resid_vs_pred_plot(y_test, y_pred_test, target)
+    if aggregate:
+        avp = density_plot(*avp_sources['Test'], target, 'y_true',
+                           'True vs. Predicted Values', 'True')
+        rvp = density_plot(*rvp_sources['Test'], target, 'residuals',
+                           'Residuals vs. Predictions', 'Residuals')
+    else:
+        avp = actual_vs_pred(*avp_sources['Test'], target)
+        rvp = resid_vs_pred_plot(*rvp_sources['Test'], target)
+    hist_plot = resid_hist(hist_sources['Test'], target)
+    importance_plot = create_importance_plot(results.get('importance'),
+                                             settings_width)
+    cv_results = load_search(data_path).get('cv_results_')
+    tuning_panel = create_tuning_panel(
+        None if cv_results is None else search_grid(cv_results),
+        settings_width)
+    learning_curve_plot = create_learning_curve_plot(
+        learning_curve_job(data_path), settings_width)
 
     # -------------------------------------------------------------------------
     # Widgets
@@ -276,21 +380,15 @@ def regression_results():
     # -------------------------------------------------------------------------
     def select_data_change(attrname, old, new):
         """Toggle test/train data for select_data dropdown menu."""
-        if new == 'Training':
-            avp = actual_vs_pred(y_train, y_pred_train, target)
-            hist_plot = resid_hist(y_train, y_pred_train, target)
-            rvp = resid_vs_pred_plot(y_train, y_pred_train, target)
-        elif new == 'Test':
-            avp = actual_vs_pred(y_test, y_pred_test, target)
-            hist_plot = resid_hist(y_test, y_pred_test, target)
-            rvp = resid_vs_pred_plot(y_test, y_pred_test, target)
-        update(avp, hist_plot, rvp)
-
-    def update(avp, hist_plot, rvp):
-        """Update layout with new plots."""
-        results_layout.children[0].children[1] = avp
-        results_layout.children[1].children[0] = hist_plot
-        results_layout.children[1].children[1] = rvp
+        update(avp, *avp_sources[new])
+        update(rvp, *rvp_sources[new])
+        update(hist_plot, hist_sources[new])
+
+    def update(plot, *sources):
+        """Point the plot's glyphs at prebuilt data sources, in order."""
+        for renderer, source in zip(plot.renderers, sources):
+            renderer.data_source = source
+            renderer.view = CDSView(source=source)
 
     select_data.on_change('value', select_data_change)
 
@@ -316,7 +414,7 @@ def regression_results():
     for key, value in training_settings.items():
         settings_div.text += f"<b>{key}:</b> {value}<br>"
     settings_div.text += f"""
-    <br><b>Chosen Params:</b> {model.best_estimator_}</div>"""
+    <br><b>Chosen Params:</b> {results['estimator']}</div>"""
 
     # -------------------------------------------------------------------------
     # Layout
@@ -327,7 +425,9 @@ def regression_results():
             row(select_data, margin=(50, 0, 0, 300)), height=MAX_PLOT_SIZE),
             avp, margin=(0, 30, 0, 0)),
         column(hist_plot, rvp),
-        column(settings_div, width=settings_width, margin=(0, 0, 0, 30))
+        column(settings_div, importance_plot, tuning_panel,
+               learning_curve_plot, width=settings_width,
+               margin=(0, 0, 0, 30))
     )
 
     return results_layout
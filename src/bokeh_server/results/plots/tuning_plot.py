@@ -0,0 +1,178 @@
+"""Return validation curves and heatmaps of the grid search of the model.
+
+The plots are slices of the saved cv_results_ (see tuning.py), so switching
+hyperparameters only swaps the data of the plots and no model is fitted.
+"""
+
+# %% Imports
+# Standard system imports
+
+# Related third party imports
+from bokeh.layouts import column, row
+from bokeh.models import ColumnDataSource, ColorBar, Div, HoverTool, \
+    LinearColorMapper, Select
+from bokeh.palettes import Category10, Viridis256
+from bokeh.plotting import figure
+import numpy as np
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.tuning import heatmap, validation_curve
+
+
+# %% Define globals
+COLOR = Category10[3][0]
+METRICS = {'Mean CV score': 'mean_score', 'Mean fit time (s)': 'fit_time'}
+
+
+# %% Define plots
+def _style(plot):
+    """Apply the style of the results plots."""
+    plot.grid.grid_line_dash = [6, 4]
+    plot.grid.grid_line_color = "white"
+    plot.axis.major_label_text_font_size = "1em"
+    plot.axis.major_label_text_font_style = "bold"
+    plot.axis.axis_label_text_font_size = "1em"
+    plot.axis.axis_label_text_font_style = "bold"
+
+
+def _curve_data(grid, name):
+    """Return plot data of the validation curve of a parameter."""
+    values, mean, std, fit_time = validation_curve(grid, name)
+    return {'value': [str(x) for x in values], 'mean': mean, 'std': std,
+            'lower': mean - std, 'upper': mean + std, 'fit_time': fit_time}
+
+
+def _heatmap_data(grid, x_name, y_name, metric):
+    """Return plot data and x and y factors of a heatmap of two parameters."""
+    x_values = [str(x) for x in grid['values'][grid['names'].index(x_name)]]
+    y_values = [str(x) for x in grid['values'][grid['names'].index(y_name)]]
+    values = heatmap(grid, x_name, y_name, METRICS[metric])
+    data = {'x': x_values * len(y_values),
+            'y': [y for y in y_values for _ in x_values],
+            'value': values.ravel(),
+            'text': ['' if np.isnan(x) else f'{x:.3g}'
+                     for x in values.ravel()]}
+    return data, x_values, y_values
+
+
+def create_tuning_panel(grid, width):
+    """Return validation curves and heatmaps of a grid search.
+
+    grid is returned by tuning.search_grid(); runs without a searched
+    hyperparameter get a note instead.
+    """
+    if grid is None:
+        return Div(text="<b>No hyperparameters were searched for this "
+                   "model.</b>", width=width)
+    # -------------------------------------------------------------------------
+    # Setup
+    # -------------------------------------------------------------------------
+    names = grid['names']
+    best = ', '.join(f'{name}={grid["values"][axis][grid["best"][axis]]}'
+                     for axis, name in enumerate(names))
+    curve_source = ColumnDataSource(_curve_data(grid, names[0]))
+    plot_width = width // 2
+
+    # -------------------------------------------------------------------------
+    # Validation Curves
+    # -------------------------------------------------------------------------
+    score_plot = figure(x_range=curve_source.data['value'],
+                        toolbar_location=None, width=plot_width, height=300,
+                        background_fill_color="#DDDDDD",
+                        outline_line_color="white",
+                        title="Validation Curve")
+    score_plot.segment(x0='value', y0='lower', x1='value', y1='upper',
+                       source=curve_source, line_color="black", line_width=2)
+    score_plot.line(x='value', y='mean', source=curve_source, color=COLOR,
+                    line_width=2)
+    points = score_plot.circle(x='value', y='mean', source=curve_source,
+                               color=COLOR, size=9)
+    score_plot.add_tools(HoverTool(renderers=[points], tooltips=[
+        ('Value', '@value'),
+        ('Mean CV score', '@mean{0.0000} ± @std{0.0000}'),
+        ('Mean fit time', '@fit_time{0.000} s')]))
+    score_plot.yaxis.axis_label = 'Mean CV Score'
+    time_plot = figure(x_range=score_plot.x_range, toolbar_location=None,
+                       width=plot_width, height=300,
+                       background_fill_color="#DDDDDD",
+                       outline_line_color="white", title="Fit Time")
+    time_plot.line(x='value', y='fit_time', source=curve_source, color=COLOR,
+                   line_width=2)
+    time_plot.circle(x='value', y='fit_time', source=curve_source,
+                     color=COLOR, size=9)
+    time_plot.yaxis.axis_label = 'Mean Fit Time (s)'
+    for plot in (score_plot, time_plot):
+        _style(plot)
+        plot.xaxis.axis_label = names[0]
+
+    # -------------------------------------------------------------------------
+    # Widgets
+    # -------------------------------------------------------------------------
+    select_curve = Select(title="Parameter:", value=names[0], options=names,
+                          width=200)
+    best_div = Div(text=f"<b>Best candidate:</b> {best}<br>Other parameters "
+                   "are held at their best values; unexplored candidates "
+                   "are blank.", width=width)
+
+    # -------------------------------------------------------------------------
+    # Callbacks
+    # -------------------------------------------------------------------------
+    def select_curve_change(attrname, old, new):
+        """Plot the validation curve of the selected parameter."""
+        data = _curve_data(grid, new)
+        score_plot.x_range.factors = data['value']
+        curve_source.data = data
+        for plot in (score_plot, time_plot):
+            plot.xaxis.axis_label = new
+
+    select_curve.on_change('value', select_curve_change)
+    curves = column(row(select_curve, best_div),
+                    row(score_plot, time_plot))
+    if len(names) < 2:
+        return curves
+
+    # -------------------------------------------------------------------------
+    # Heatmap
+    # -------------------------------------------------------------------------
+    metric = list(METRICS)[0]
+    data, x_values, y_values = _heatmap_data(grid, names[0], names[1],
+                                             metric)
+    heatmap_source = ColumnDataSource(data)
+    mapper = LinearColorMapper(palette=Viridis256, nan_color="#DDDDDD")
+    heatmap_plot = figure(x_range=x_values, y_range=y_values,
+                          toolbar_location=None, width=width, height=400,
+                          title=f"{metric} Heatmap")
+    heatmap_plot.rect(x='x', y='y', width=1, height=1, source=heatmap_source,
+                      fill_color={'field': 'value', 'transform': mapper},
+                      line_color="white")
+    heatmap_plot.text(x='x', y='y', text='text', source=heatmap_source,
+                      text_align="center", text_baseline="middle",
+                      text_color="white", text_font_size="0.9em")
+    heatmap_plot.add_layout(ColorBar(color_mapper=mapper), 'right')
+    _style(heatmap_plot)
+    heatmap_plot.xaxis.axis_label = names[0]
+    heatmap_plot.yaxis.axis_label = names[1]
+    select_x = Select(title="X Parameter:", value=names[0], options=names,
+                      width=200)
+    select_y = Select(title="Y Parameter:", value=names[1], options=names,
+                      width=200)
+    select_metric = Select(title="Metric:", value=metric,
+                           options=list(METRICS), width=200)
+
+    def update_heatmap(attrname, old, new):
+        """Plot the heatmap of the selected parameters and metric."""
+        if select_x.value == select_y.value:
+            return
+        data, x_values, y_values = _heatmap_data(
+            grid, select_x.value, select_y.value, select_metric.value)
+        heatmap_plot.x_range.factors = x_values
+        heatmap_plot.y_range.factors = y_values
+        heatmap_source.data = data
+        heatmap_plot.xaxis.axis_label = select_x.value
+        heatmap_plot.yaxis.axis_label = select_y.value
+        heatmap_plot.title.text = f"{select_metric.value} Heatmap"
+
+    for select in (select_x, select_y, select_metric):
+        select.on_change('value', update_heatmap)
+    return column(curves, row(select_x, select_y, select_metric),
+                  heatmap_plot)
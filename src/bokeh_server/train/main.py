@@ -1,30 +1,49 @@
 """Return interface for selection of training options.
 
 Columns:
-    -   Features: Checkbox group of features to be used during training
+    -   Features: Checkbox group of features to be used during training, and
+        a search for the subset of features that gives the best CV score
 
-    -   Model: Select machine learning model and training data split
+    -   Model: Select training mode, machine learning model (or models to
+        compare on a leaderboard), and training data split
 
     -   Hyperparameters: Set range of hyperparameters for grid search
 
-    -   Train: Button to begin training and status update text.
+    -   Train: Estimated cost of the grid search, button to begin training,
+        and status update text.
+
+Leaderboard:
+    -   Live table of CV and test scores and search times of the models
+        trained concurrently in the "train all" mode.
 """
 
 # %% Imports
 # Standard system imports
+from functools import lru_cache, partial
+import os
 from pathlib import Path
 import pickle
+import threading
 
 # Related third party imports
 from bokeh.io import curdoc
 from bokeh.layouts import column, row
-from bokeh.models import Button, CheckboxGroup, Div, RangeSlider, Select, \
-    Slider
+from bokeh.models import Button, CheckboxGroup, ColumnDataSource, \
+    DataTable, Div, MultiSelect, NumberFormatter, RangeSlider, Select, \
+    Slider, TableColumn
 import numpy as np
-import pandas as pd
 
 # Local application/library specific imports
-from bokeh_server.train.twe_learn.train_model import train_model
+from bokeh_server.train.twe_learn.artifacts import eda_frames, \
+    eda_metadata
+from bokeh_server.train.twe_learn.cost_model import estimate_cost
+from bokeh_server.train.twe_learn.feature_search import METHODS, \
+    search_features
+from bokeh_server.train.twe_learn.incremental import INCREMENTAL_MODELS, \
+    train_incremental
+from bokeh_server.train.twe_learn.leaderboard import train_all
+from bokeh_server.train.twe_learn.train_model import APPROX_KERNEL_MODELS, \
+    N_COMPONENTS, train_model
 
 
 # -----------------------------------------------------------------------------
@@ -32,25 +51,29 @@ from bokeh_server.train.twe_learn.train_model import train_model
 # -----------------------------------------------------------------------------
 doc = curdoc()  # Must have reference to current document for multithreading
 
-# Local data
+# Local data; only its metadata is read until a model is trained in memory.
+# Numeric columns but the target and index column are the candidate features
 data_path = Path('src/bokeh_server/data/eda_data')
-with open(data_path, 'rb') as data_file:
-    pickled_data = pickle.load(data_file)
-data = pickled_data['data']
-metadata = pickled_data['metadata']
+metadata, numeric_cols, n_table_rows = eda_metadata(data_path)
 # Extract metadata
 dataset = metadata['dataset']
 ml_type = metadata['type']
 target = metadata['target']
-# Delete index column from data table and create lists of valid columns
 id_col = dataset + '_id'
-del data[id_col]
-data_cols = list(data.keys())
-numeric_cols = [x for x in data_cols if type(data[x][0]) in (float, int)
-                and x != target]
-data_df = pd.DataFrame.from_dict(data)
-X = data_df[numeric_cols]
-y = data_df[target]
+
+
+@lru_cache(maxsize=1)
+def load_frames():
+    """Return X and y of the dataset, loaded on first use.
+
+    Incremental training streams the table from MySQL and never loads it.
+    """
+    with open(data_path, 'rb') as data_file:
+        return eda_frames(pickle.load(data_file))
+
+
+# Tables with more rows than this default to histogram gradient boosting
+LARGE_TABLE_ROWS = int(os.environ.get('TWE_LARGE_TABLE_ROWS', 10000))
 
 # Set heights, widths, and margin of columns
 FEATURES_WIDTH = 200
@@ -81,7 +104,12 @@ features_title = Div(  # Title for features columns
 LABELS = numeric_cols
 features_checkbox_group = CheckboxGroup(labels=LABELS,
                                         active=list(range(len(LABELS))))
+# Search selects the best subset of the checked features for the model
+feature_search_select = Select(title="Feature Search:", value=METHODS[0],
+                               options=METHODS)
+feature_search_button = Button(label="Search Features")
 features = column(features_title, features_checkbox_group,
+                  feature_search_select, feature_search_button,
                   width=FEATURES_WIDTH, height=COL_HEIGHT,
                   background="#e8e8e8")
 
@@ -99,21 +127,38 @@ model_title = Div(  # Title for model column
     </div>""", height=50)
 if ml_type == 'classification':
     default_model = 'Logistic Regression'
-    MODELS = ['Gradient Boosting CLF', 'K-Nearest Neighbors CLF',
-              'Logistic Regression', 'Naive Bayes', 'Random Forest CLF',
-              'SVC (linear kernel)', 'SVC (rbf kernel)']
+    large_table_model = 'Hist Gradient Boosting CLF'
+    MODELS = ['Gradient Boosting CLF', 'Hist Gradient Boosting CLF',
+              'K-Nearest Neighbors CLF', 'Logistic Regression', 'Naive Bayes',
+              'Passive Aggressive CLF', 'Random Forest CLF', 'SGD Classifier',
+              'SVC (linear kernel)', 'SVC (rbf kernel)',
+              'SVC (approx. rbf kernel)']
 elif ml_type == 'regression':
     default_model = 'Linear Regression'
-    MODELS = ['Gradient Boosting REG', 'K-Nearest Neighbors REG',
-              'Linear Regression', 'Lasso Regression', 'Ridge Regression',
-              'Random Forest REG', 'SVR (linear kernel)',
-              'SVR (rbf kernel)']
-
+    large_table_model = 'Hist Gradient Boosting REG'
+    MODELS = ['Gradient Boosting REG', 'Hist Gradient Boosting REG',
+              'K-Nearest Neighbors REG', 'Linear Regression',
+              'Lasso Regression', 'Passive Aggressive REG',
+              'Ridge Regression', 'Random Forest REG', 'SGD Regressor',
+              'SVR (linear kernel)', 'SVR (rbf kernel)',
+              'SVR (approx. rbf kernel)']
+if n_table_rows > LARGE_TABLE_ROWS:
+    default_model = large_table_model
+# Models that support partial_fit can be trained out of core from MySQL;
+# train all runs the searches of several models concurrently
+TRAINING_MODES = ['Grid search (in memory)', 'Incremental (stream from MySQL)',
+                  'Train all (leaderboard)']
+
+mode_select = Select(title="Training Mode:", value=TRAINING_MODES[0],
+                     options=TRAINING_MODES)
 model_select = Select(title="Model Type:", value=default_model,
                       options=MODELS)
+models_multiselect = MultiSelect(title="Models:", value=MODELS,
+                                 options=MODELS, height=200, visible=False)
 train_split_slider = Slider(start=0.05, end=0.95, value=0.80,
                             step=.05, title="Train Split", bar_color="#3FB8AF")
-models = column(model_title, model_select, train_split_slider,
+models = column(model_title, mode_select, model_select, models_multiselect,
+                train_split_slider,
                 width=MODEL_WIDTH, height=COL_HEIGHT, margin=(0, 0, 0, MARGIN),
                 background="#e8e8e8")
 
@@ -145,6 +190,16 @@ c_range_slider = RangeSlider(
     start=0.1, end=100.1, value=(0.1, 100.1), step=10, title="C",
     disabled=clf_default, bar_color='#3FB8AF', visible=not clf_default,
     name='C')
+# SGD's alpha and Passive Aggressive's C span decades, so their sliders select
+# powers of ten (see grid_values)
+sgd_alpha_range_slider = RangeSlider(
+    start=-6, end=-1, value=(-6, -1), step=1, title="alpha (SGD), log10",
+    disabled=True, bar_color='#3FB8AF', visible=False, name='alpha',
+    tags=['log10'])
+pa_c_range_slider = RangeSlider(
+    start=-3, end=1, value=(-3, 1), step=1,
+    title="C (Passive Aggressive), log10", disabled=True, bar_color='#3FB8AF',
+    visible=False, name='C', tags=['log10'])
 learning_rate_range_slider = RangeSlider(
     start=0.1, end=1, value=(0.1, 1), step=0.1, title="learning_rate",
     disabled=True, visible=False, name='learning_rate')
@@ -157,11 +212,17 @@ n_estimators_range_slider = RangeSlider(
 n_neighbors_range_slider = RangeSlider(
     start=3, end=10, value=(3, 10), step=1, title="n_neighbors",
     disabled=True, visible=False, name='n_neighbors')
+# Size of the kernel feature map is a setting rather than a grid parameter
+n_components_slider = Slider(
+    start=50, end=1000, value=N_COMPONENTS, step=50,
+    title="n_components (kernel map)", bar_color='#3FB8AF', disabled=True,
+    visible=False)
 # Add hyperparameter title and range sliders to column
-hp_sliders = (alpha_range_slider, c_range_slider, learning_rate_range_slider,
+hp_sliders = (alpha_range_slider, c_range_slider, sgd_alpha_range_slider,
+              pa_c_range_slider, learning_rate_range_slider,
               max_depth_range_slider, n_estimators_range_slider,
               n_neighbors_range_slider)
-hyperparams = column(hp_title, *hp_sliders,
+hyperparams = column(hp_title, *hp_sliders, n_components_slider,
                      width=HYPERPARAMS_WIDTH, height=COL_HEIGHT,
                      background="#e8e8e8",
                      margin=(0, MARGIN, 0, MARGIN))
@@ -173,6 +234,10 @@ enabled_hp_sliders = {
     'Gradient Boosting REG': [learning_rate_range_slider,
                               n_estimators_range_slider,
                               max_depth_range_slider],
+    'Hist Gradient Boosting CLF': [learning_rate_range_slider,
+                                   max_depth_range_slider],
+    'Hist Gradient Boosting REG': [learning_rate_range_slider,
+                                   max_depth_range_slider],
     'K-Nearest Neighbors CLF': [n_neighbors_range_slider],
     'K-Nearest Neighbors REG': [n_neighbors_range_slider],
     'Logistic Regression': [c_range_slider],
@@ -180,12 +245,18 @@ enabled_hp_sliders = {
     'Lasso Regression': [alpha_range_slider],
     'Ridge Regression': [alpha_range_slider],
     'Naive Bayes': [],
+    'Passive Aggressive CLF': [pa_c_range_slider],
+    'Passive Aggressive REG': [pa_c_range_slider],
     'Random Forest CLF': [n_estimators_range_slider, max_depth_range_slider],
     'Random Forest REG': [n_estimators_range_slider, max_depth_range_slider],
+    'SGD Classifier': [sgd_alpha_range_slider],
+    'SGD Regressor': [sgd_alpha_range_slider],
     'SVC (linear kernel)': [c_range_slider],
     'SVR (linear kernel)': [c_range_slider],
     'SVC (rbf kernel)': [c_range_slider],
-    'SVR (rbf kernel)': [c_range_slider]
+    'SVR (rbf kernel)': [c_range_slider],
+    'SVC (approx. rbf kernel)': [c_range_slider],
+    'SVR (approx. rbf kernel)': [c_range_slider]
 }
 
 
@@ -202,16 +273,100 @@ train_title = Div(  # Title for train column
     </div>""", height=50)
 # Define div to contain status information
 status_div = Div(text="""<b>Ready to train...</b>""",
-                 height=375)
+                 height=285)
+# Predicted cost of the grid search, updated as the settings change
+estimate_div = Div(text="", height=40)
+# Grid search stops starting new candidates once the budget is spent
+time_budget_slider = Slider(start=0, end=120, value=0, step=5,
+                            title="Time Budget (minutes, 0 = no limit)",
+                            bar_color="#3FB8AF")
 # Define train button and add to column with title and status divs
 train_button = Button(label="Train", button_type="primary")
-train = column(train_title, status_div, train_button, width=TRAIN_WIDTH,
-               height=COL_HEIGHT, background="#e8e8e8")
+train = column(train_title, status_div, estimate_div, time_budget_slider,
+               train_button, width=TRAIN_WIDTH, height=COL_HEIGHT,
+               background="#e8e8e8")
+
+
+# -----------------------------------------------------------------------------
+# Leaderboard
+# -----------------------------------------------------------------------------
+leaderboard_title = Div(text="<h1 class='bokeh_header'>Leaderboard</h1>",
+                        height=50)
+leaderboard_source = ColumnDataSource(data={
+    'model': [], 'cv_score': [], 'train_score': [], 'test_score': [],
+    'search_time': [], 'explored': [], 'params': []})
+score_format = NumberFormatter(format='0.000')
+leaderboard_table = DataTable(
+    source=leaderboard_source, width=1200, height=300, index_position=None,
+    columns=[TableColumn(field='model', title='Model'),
+             TableColumn(field='cv_score', title='CV Score',
+                         formatter=score_format),
+             TableColumn(field='train_score', title='Train Score',
+                         formatter=score_format),
+             TableColumn(field='test_score', title='Test Score',
+                         formatter=score_format),
+             TableColumn(field='search_time', title='Search Time (s)',
+                         formatter=NumberFormatter(format='0.0')),
+             TableColumn(field='explored', title='Grid Explored',
+                         formatter=NumberFormatter(format='0%')),
+             TableColumn(field='params', title='Best Parameters',
+                         width=400)])
+leaderboard = column(leaderboard_title, leaderboard_table, visible=False,
+                     margin=(MARGIN, 0, 0, 0))
 
 
 # -----------------------------------------------------------------------------
 # Callbacks
 # -----------------------------------------------------------------------------
+def selected_models():
+    """Return models to train: the selected model, or all in train all."""
+    if mode_select.value == TRAINING_MODES[2]:
+        return list(models_multiselect.value)
+    return [model_select.value]
+
+
+def grid_values(slider):
+    """Return the grid values of a range slider, as powers of ten if log10."""
+    values = np.arange(slider.value[0], slider.value[1]+slider.step,
+                       slider.step)
+    if 'log10' in slider.tags:  # Integer exponents give exact decades
+        return [10.0 ** int(round(x)) for x in values]
+    return list(values)
+
+
+def grid_params(model):
+    """Return (name, values) pairs of the hyperparameter grid of a model."""
+    return [(x.name, grid_values(x)) for x in enabled_hp_sliders[model]]
+
+
+def update_estimate():
+    """Show predicted number of fits and wall time of the grid search."""
+    if mode_select.value == TRAINING_MODES[1]:
+        estimate_div.text = "<b>Estimate:</b> not available for " \
+            "incremental training"
+        return
+    n_rows = round(n_table_rows * train_split_slider.value)
+    # Concurrent searches share the workers, so their times add up
+    estimates = [estimate_cost(model, n_rows,
+                               len(features_checkbox_group.active),
+                               grid_params(model))
+                 for model in selected_models()]
+    candidates = sum(x['candidates'] for x in estimates)
+    fits = sum(x['fits'] for x in estimates)
+    total = sum(x['seconds'] for x in estimates)
+    minutes, seconds = divmod(max(round(total), 1), 60)
+    duration = f"{minutes} min {seconds} s" if minutes else f"{seconds} s"
+    source = "calibrated from past runs" \
+        if all(x['calibrated'] for x in estimates) else "uncalibrated"
+    estimate_div.text = f"<b>Estimate:</b> {candidates} " \
+        f"candidates, {fits} fits, ~{duration} ({source})"
+
+
+def estimate_change(attrname, old, new):
+    """Callback for any setting that changes the cost of the grid search."""
+    update_estimate()
+
+
 def features_change(attrname, old, new):
     """Callback for features checkbox group."""
     if new == []:
@@ -220,19 +375,41 @@ def features_change(attrname, old, new):
         train_button.disabled = False
 
 
-def set_sliders(model):
-    """Enable or disable hyperparameter sliders based on selected model."""
+def set_sliders(models):
+    """Enable or disable hyperparameter sliders based on selected models."""
     for slider in hp_sliders:
         slider.disabled = True
         slider.visible = False
-    for slider in enabled_hp_sliders[model]:
-        slider.disabled = False
-        slider.visible = True
+    for model in models:
+        for slider in enabled_hp_sliders[model]:
+            slider.disabled = False
+            slider.visible = True
+    approx = any(model in APPROX_KERNEL_MODELS for model in models)
+    n_components_slider.disabled = not approx
+    n_components_slider.visible = approx
 
 
 def model_change(attrname, old, new):
     """Callback for model dropdown menu to change model type."""
-    set_sliders(new)
+    set_sliders(selected_models())
+
+
+def mode_change(attrname, old, new):
+    """Callback for training mode dropdown menu.
+
+    Incremental training is limited to models that support partial_fit.
+    """
+    if new == TRAINING_MODES[1]:
+        model_select.options = [x for x in MODELS if x in INCREMENTAL_MODELS]
+    else:
+        model_select.options = MODELS
+    if model_select.value not in model_select.options:
+        model_select.value = model_select.options[0]
+    train_all_mode = new == TRAINING_MODES[2]
+    model_select.visible = not train_all_mode
+    models_multiselect.visible = train_all_mode
+    leaderboard.visible = train_all_mode
+    set_sliders(selected_models())
 
 
 def train_button_press(event):
@@ -243,40 +420,155 @@ def train_button_press(event):
 
     Per documentation must schedule document updates via a next tick callback.
     """
+    if not selected_models():
+        status_div.text = "<b>Select at least one model to train.</b>"
+        return
     status_div.text = "<b>Beginning training...</b><br><br>"
-    doc.add_next_tick_callback(run_training)
+    if mode_select.value == TRAINING_MODES[2]:
+        # Train in a thread so leaderboard rows appear as models finish
+        leaderboard_source.data = {key: [] for key in leaderboard_source.data}
+        train_button.disabled = True
+        settings_list = [current_settings(x) for x in selected_models()]
+        threading.Thread(target=run_leaderboard, args=(settings_list,),
+                         daemon=True).start()
+    else:
+        doc.add_next_tick_callback(run_training)
 
 
-def run_training():
-    """Fit machine learning pipeline based on selected parameters."""
+def current_settings(model):
+    """Return training settings of a model from the current widget values."""
     training_settings = {
         'dataset': dataset,
+        'mode': mode_select.value,
         'features': [LABELS[x] for x in features_checkbox_group.active],
-        'model': model_select.value,
+        'model': model,
         'train_split': train_split_slider.value,
-        'params': [(x.name, list(np.arange(x.value[0], x.value[1]+x.step,
-                                           x.step)))
-                   for x in enabled_hp_sliders[model_select.value]]
+        'params': grid_params(model)
     }
-    (params, train_score, test_score) = train_model(
-        X[training_settings['features']], y, training_settings)
+    if model in APPROX_KERNEL_MODELS:
+        training_settings['n_components'] = n_components_slider.value
+    if mode_select.value != TRAINING_MODES[1]:
+        training_settings['time_budget'] = \
+            60 * time_budget_slider.value if time_budget_slider.value else None
+    return training_settings
+
+
+def add_leaderboard_row(row):
+    """Add a finished model to the leaderboard, keeping it sorted."""
+    data = dict(leaderboard_source.data)
+    for key in data:
+        data[key] = list(data[key]) + [row[key]]
+    order = np.argsort(-np.nan_to_num(np.array(data['cv_score'], dtype=float),
+                                      nan=-np.inf), kind='stable')
+    leaderboard_source.data = {key: [values[x] for x in order]
+                               for key, values in data.items()}
+    if row['error']:
+        status_div.text += f"<b>{row['model']} failed:</b> {row['error']}<br>"
+    else:
+        status_div.text += f"{row['model']} finished.<br>"
+
+
+def finish_leaderboard(rows):
+    """Report the winner once every model of the leaderboard is trained."""
+    if rows and not rows[0]['error']:
+        status_div.text += f"<br><b>Best model:</b> {rows[0]['model']} " \
+            f"(CV score {rows[0]['cv_score']:.2f}), shown in Results<br>"
+    status_div.text += "<br><b>Training complete!</b>"
+    train_button.disabled = False
+    update_estimate()  # Estimates are now calibrated with these runs
+
+
+def run_leaderboard(settings_list):
+    """Train the selected models concurrently; runs in a separate thread.
+
+    Document updates are scheduled with next tick callbacks because they
+    must happen on the Bokeh server's event loop.
+    """
+    X, y = load_frames()
+    rows = train_all(X, y, settings_list, on_result=lambda row:
+                     doc.add_next_tick_callback(
+                         partial(add_leaderboard_row, row)))
+    doc.add_next_tick_callback(partial(finish_leaderboard, rows))
+
+
+def feature_search_press(event):
+    """Callback for when the Search Features button is pressed.
+
+    The search runs in a thread so the document stays responsive.
+    """
+    if not features_checkbox_group.active:
+        return
+    feature_search_button.disabled = True
+    train_button.disabled = True
+    status_div.text = f"<b>Searching features ({feature_search_select.value}"\
+        f", {model_select.value})...</b><br><br>"
+    threading.Thread(target=run_feature_search,
+                     args=(current_settings(model_select.value),
+                           feature_search_select.value),
+                     daemon=True).start()
+
+
+def finish_feature_search(names, score, path, search_time):
+    """Check the chosen features and report the search path."""
+    features_checkbox_group.active = [LABELS.index(x) for x in names]
+    text = "<b>Search path:</b><br>"
+    for subset, subset_score in path:
+        text += f"{subset_score:.3f}: {', '.join(subset)}<br>"
+    status_div.text += text + f"<br><b>Selected {len(names)} features</b> " \
+        f"(CV score {score:.3f}) in {search_time:.1f} s"
+    feature_search_button.disabled = False
+    train_button.disabled = False
+
+
+def run_feature_search(training_settings, method):
+    """Search for the best subset of features; runs in a separate thread."""
+    X, y = load_frames()
+    result = search_features(X, y, training_settings, method)
+    doc.add_next_tick_callback(partial(finish_feature_search, *result))
+
+
+def run_training():
+    """Fit machine learning pipeline based on selected parameters."""
+    training_settings = current_settings(model_select.value)
+    if mode_select.value == TRAINING_MODES[1]:
+        (params, train_score, test_score, summary) = train_incremental(
+            training_settings, id_col, target)
+    else:
+        (params, train_score, test_score, summary) = train_model(
+            *load_frames(), training_settings)
     text = '<b>Settings:</b><br>'
     for key, val in training_settings.items():
         text += f"{key}: {val}<br>"
     text += "<br><b>Results:</b><br>" + \
         str(params) + '<br>' + \
         f'<b>Train Score:</b> {train_score:.2f}' + '<br>' + \
-        f'<b>Test Score:</b> {test_score:.2f}' + '<br>'
+        f'<b>Test Score:</b> {test_score:.2f}' + '<br>' + \
+        f"<b>Explored:</b> {summary['explored']} of " \
+        f"{summary['candidates']} candidates " \
+        f"({summary['explored'] / summary['candidates']:.0%})<br>"
+    if summary['truncated']:
+        text += "<b>Search cut short by time budget; best so far shown." \
+            "</b><br>"
     status_div.text += text + "<br><b>Training complete!</b>"
+    update_estimate()  # Estimate is now calibrated with this run
 
 
 features_checkbox_group.on_change('active', features_change)
 model_select.on_change('value', model_change)
+models_multiselect.on_change('value', model_change)
+mode_select.on_change('value', mode_change)
 train_button.on_click(train_button_press)
+feature_search_button.on_click(feature_search_press)
+for widget in (model_select, models_multiselect, mode_select,
+               train_split_slider) + hp_sliders:
+    widget.on_change('value', estimate_change)
+features_checkbox_group.on_change('active', estimate_change)
+set_sliders(selected_models())  # Default model depends on the table size
+update_estimate()
 
 
 # -----------------------------------------------------------------------------
 # Layout
 # -----------------------------------------------------------------------------
-train_layout = row(features, models, hyperparams, train)
+train_layout = column(row(features, models, hyperparams, train), leaderboard)
 doc.add_root(train_layout)
@@ -0,0 +1,25 @@
+"""Bokeh server lifecycle hooks for the train app.
+
+The worker pool used for grid search is started when the Bokeh server loads
+the app, so that the first training run does not wait for worker processes to
+spawn, and it is stopped when the server shuts down.
+"""
+
+# %% Imports
+# Standard system imports
+
+# Related third party imports
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.worker_pool import get_pool, shutdown_pool
+
+
+# %% Lifecycle hooks
+def on_server_loaded(server_context):
+    """Start the persistent worker pool when the Bokeh server starts."""
+    get_pool()
+
+
+def on_server_unloaded(server_context):
+    """Stop the worker pool when the Bokeh server shuts down."""
+    shutdown_pool()
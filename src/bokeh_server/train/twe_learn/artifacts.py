@@ -0,0 +1,417 @@
+"""Save and reload the model and training data of a training run.
+
+A run is saved as four joblib files:
+
+    -   model: The best estimator only.  It is stored uncompressed by default
+        so that its large NumPy arrays (e.g. the node arrays of a forest's
+        trees) are memory-mapped when loaded instead of read and copied.
+
+    -   search: Search metadata (best parameters and score, cv_results_ and
+        a summary of the search), compressed.
+
+    -   train_data: Training data entries and settings, compressed.
+
+    -   results: Predictions, metrics, plot data, and permutation importances
+        shown by the Results app (see evaluation.py), compressed.
+
+The Results app adds a learning_curve file once the learning curve of the
+model has been computed (see learning_curve.py).
+
+Each run is written to a fresh directory under runs/ and then published by
+atomically switching the current symlink to it.  The artifact names in the
+directory itself are symlinks through current, so readers always open the
+files of a single, complete run, and files of a replaced run are never
+modified while sessions still hold them memory-mapped.  Readers loading
+several artifacts resolve the run once with run_directory().  The last
+KEEP_RUNS runs are kept.  Older runs are only deleted once RUN_GRACE_HOURS
+have passed since a reader last resolved them, so sessions and learning
+curve jobs still reading a replaced run keep their files.
+
+Compression is configured with TWE_MODEL_COMPRESSION and
+TWE_ARTIFACT_COMPRESSION as "none", "zlib:<level>" or "lz4:<level>"; lz4
+falls back to zlib if the lz4 package is not installed.  A compressed model
+is smaller on disk but can no longer be memory-mapped.
+
+The train_data artifact does not hold copies of the training and test sets.
+It stores the feature list, the target, the row indices of the train/test
+split, and a fingerprint of the dataset they index.  The Results app rebuilds
+the frames on first use from the eda_data pickle, which already holds the
+dataset column by column, after checking that the pickle still holds the
+dataset the model was trained on.  Runs trained from another file (e.g. a
+CSV file given to twe-train) also store its path and are rebuilt from it.
+
+The webapp also writes the metadata, feature names, and row count of the
+pickle to eda_metadata, so the Train app starts without loading the dataset.
+
+Incremental runs read the table from MySQL instead of the pickle, so their
+artifact keeps the bounded reservoir samples of the training and test
+streams.
+
+Classes:
+    -   TrainingData: Training and test sets of a saved model, loaded lazily.
+
+Functions:
+    -   compression: Return joblib compress argument of a setting string.
+
+    -   dump_artifact: Write an object with joblib using a compression setting.
+
+    -   new_run_directory: Return a fresh directory for a run's artifacts.
+
+    -   publish_run: Make a run directory the current run atomically.
+
+    -   run_directory: Return the directory of the current run.
+
+    -   save_run: Save model, search metadata, data, and results of a run.
+
+    -   load_model: Return the best estimator saved with a run.
+
+    -   eda_frames: Return X and y of the dataset held in an eda_data pickle.
+
+    -   dump_eda_metadata: Write the metadata of an eda_data pickle apart.
+
+    -   eda_metadata: Return metadata, features, and rows of eda_data.
+
+    -   load_source: Return X, y, and name of a CSV file or eda_data pickle.
+
+    -   dataset_fingerprint: Return fingerprint of a dataset's X and y.
+
+    -   split_data: Return training data entries of an in-memory split.
+
+    -   sample_data: Return training data entries holding data samples.
+"""
+
+# %% Imports
+# Standard system imports
+from functools import cached_property
+import importlib.util
+import os
+from pathlib import Path
+import pickle
+import shutil
+import threading
+import time
+import warnings
+
+# Related third party imports
+import joblib
+import numpy as np
+import pandas as pd
+
+# Local application/library specific imports
+from utility.model_cache import cached_load
+
+
+# %% Globals
+EDA_PATH = Path('src/bokeh_server/data/eda_data')   # Dataset of the webapp
+EDA_METADATA_PATH = EDA_PATH.with_name('eda_metadata')  # Without the data
+# Uncompressed models are memory-mapped when loaded
+MODEL_COMPRESSION = os.environ.get('TWE_MODEL_COMPRESSION', 'none')
+ARTIFACT_COMPRESSION = os.environ.get('TWE_ARTIFACT_COMPRESSION', 'zlib:3')
+# Attributes of a fitted search saved as its metadata, where present
+SEARCH_ATTRIBUTES = ('best_params_', 'best_score_', 'best_index_',
+                     'cv_results_', 'n_splits_', 'explored_', 'refit_time_',
+                     'val_scores_')
+# Artifact names linked to the current run
+RUN_ARTIFACTS = ('model', 'search', 'train_data', 'results', 'learning_curve')
+KEEP_RUNS = 3       # Published runs kept on disk, including the current one
+# Older runs are kept until unused for this long
+RUN_GRACE_HOURS = float(os.environ.get('TWE_RUN_GRACE_HOURS', 24))
+
+
+# %% Artifact files
+def compression(setting):
+    """Return joblib compress argument of "none", "zlib:3", "lz4:1", etc."""
+    method, _, level = setting.lower().partition(':')
+    if method in ('', 'none', '0'):
+        return 0
+    if method not in ('zlib', 'lz4'):
+        raise ValueError(f'Unknown compression: {setting}')
+    level = int(level or 3)
+    if method == 'lz4' and importlib.util.find_spec('lz4') is None:
+        warnings.warn('lz4 is not installed; compressing with zlib instead.')
+        method = 'zlib'
+    return (method, level)
+
+
+def _tmp_path(path):
+    """Return a temporary path next to path, unique to the thread."""
+    return path.with_name(
+        f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+
+
+def dump_artifact(obj, path, setting):
+    """Write an object with joblib using a compression setting string.
+
+    The object is written to a temporary file that then replaces path, so
+    readers never see a partial file, and processes that memory-mapped the
+    previous file keep reading its unchanged contents.
+    """
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, 'wb') as artifact_file:
+        joblib.dump(obj, artifact_file, compress=compression(setting))
+    os.replace(tmp_path, path)
+
+
+def _replace_symlink(path, target):
+    """Point the symlink path at target, replacing any file atomically."""
+    tmp_path = _tmp_path(path)
+    tmp_path.symlink_to(target)
+    os.replace(tmp_path, path)
+
+
+def new_run_directory(directory):
+    """Return a new, empty directory for the artifacts of a run."""
+    name = f'{time.time_ns()}_{os.getpid()}_{threading.get_ident()}'
+    run = directory / 'runs' / name
+    run.mkdir(parents=True)
+    return run
+
+
+def publish_run(run, directory):
+    """Make run, a directory from new_run_directory(), the current run.
+
+    The current symlink is switched in a single rename.  Artifact files of
+    directories saved before runs were published are replaced by symlinks
+    through current.  Runs older than the last KEEP_RUNS are deleted if
+    they have not been used for RUN_GRACE_HOURS (see run_directory()).
+    """
+    _replace_symlink(directory / 'current', Path('runs') / run.name)
+    for name in RUN_ARTIFACTS:
+        if not (directory / name).is_symlink():
+            _replace_symlink(directory / name, Path('current') / name)
+    runs = sorted((directory / 'runs').iterdir())
+    cutoff = time.time() - RUN_GRACE_HOURS * 3600
+    for old_run in runs[:-KEEP_RUNS]:
+        try:
+            unused = old_run.stat().st_mtime < cutoff
+        except FileNotFoundError:   # Deleted by a concurrent publish
+            continue
+        if old_run != run and unused:
+            shutil.rmtree(old_run, ignore_errors=True)
+
+
+def run_directory(directory):
+    """Return the directory holding the artifacts of the current run.
+
+    Directories saved before runs were published hold the artifacts
+    themselves.  The modification time of the run is updated to mark it as
+    in use, so publish_run() keeps it for RUN_GRACE_HOURS.
+    """
+    current = directory / 'current'
+    if not current.exists():
+        return directory
+    run = current.resolve()
+    try:
+        os.utime(run)
+    except OSError:     # E.g. a read-only volume; the run is still returned
+        pass
+    return run
+
+
+def save_run(search, training_data, directory, results=None,
+             model_compression=None, artifact_compression=None):
+    """Save model, search metadata, training data, and results of a search.
+
+    training_data holds the entries of the train_data file, e.g. from
+    split_data() or sample_data() plus the training settings, and results
+    those returned by evaluation.evaluate().  The compression settings
+    default to MODEL_COMPRESSION and ARTIFACT_COMPRESSION.  The artifacts
+    are written to a new run directory, which is then published.
+    """
+    model_compression = model_compression or MODEL_COMPRESSION
+    artifact_compression = artifact_compression or ARTIFACT_COMPRESSION
+    run = new_run_directory(directory)
+    metadata = {name: getattr(search, name) for name in SEARCH_ATTRIBUTES
+                if hasattr(search, name)}
+    dump_artifact(search.best_estimator_, run / 'model', model_compression)
+    dump_artifact(metadata, run / 'search', artifact_compression)
+    dump_artifact(training_data, run / 'train_data', artifact_compression)
+    if results is not None:
+        dump_artifact(results, run / 'results', artifact_compression)
+    publish_run(run, directory)
+
+
+def _load_estimator(path):
+    """Return best estimator in a model file, memory-mapped if possible."""
+    with open(path, 'rb') as model_file:
+        # Uncompressed pickles start with the PROTO opcode
+        compressed = model_file.read(1) != b'\x80'
+    model = joblib.load(path, mmap_mode=None if compressed else 'r')
+    return getattr(model, 'best_estimator_', model)
+
+
+def load_model(path):
+    """Return the best estimator saved with a run.
+
+    Uncompressed files are memory-mapped.  Files saved before the estimator
+    was stored on its own hold the whole search, whose best estimator is
+    returned.  Models are loaded through the process-wide model cache, so
+    sessions viewing the same model share one copy.
+    """
+    return cached_load(path, _load_estimator)
+
+
+# %% Dataset
+def eda_frames(pickled_data):
+    """Return X (numeric columns but the target) and y of an eda_data pickle.
+
+    The webapp's id column is dropped.  Training and the Results app build X
+    and y with this function so that saved row indices and fingerprints
+    refer to the same frames.
+    """
+    data = pickled_data['data']
+    metadata = pickled_data['metadata']
+    target = metadata['target']
+    id_col = metadata['dataset'] + '_id'
+    numeric_cols = [x for x in data if x not in (id_col, target)
+                    and type(data[x][0]) in (float, int)]
+    data_df = pd.DataFrame({x: data[x] for x in numeric_cols + [target]})
+    return data_df[numeric_cols], data_df[target]
+
+
+def dump_eda_metadata(pickled_data, path=EDA_METADATA_PATH):
+    """Write the metadata, features, and row count of an eda_data pickle.
+
+    The webapp writes them next to the pickle, after it, so that the Train
+    app can lay out its widgets without loading the dataset.
+    """
+    X, _ = eda_frames(pickled_data)
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, 'wb') as metadata_file:
+        pickle.dump({'metadata': pickled_data['metadata'],
+                     'features': list(X.columns),
+                     'n_rows': len(X)}, metadata_file)
+    os.replace(tmp_path, path)
+
+
+def eda_metadata(eda_path=EDA_PATH, metadata_path=EDA_METADATA_PATH):
+    """Return metadata, feature names, and row count of the eda_data dataset.
+
+    They are read from the file written by dump_eda_metadata() if it is not
+    older than the pickle, else from the pickle itself.
+    """
+    if metadata_path.exists() and metadata_path.stat().st_mtime_ns \
+            >= eda_path.stat().st_mtime_ns:
+        with open(metadata_path, 'rb') as metadata_file:
+            saved = pickle.load(metadata_file)
+        return saved['metadata'], saved['features'], saved['n_rows']
+    with open(eda_path, 'rb') as data_file:
+        pickled_data = pickle.load(data_file)
+    X, _ = eda_frames(pickled_data)
+    return pickled_data['metadata'], list(X.columns), len(X)
+
+
+def load_source(path, target=None):
+    """Return X, y, and dataset name of a CSV file or an eda_data pickle.
+
+    X holds the numeric columns but the target.  target is required for CSV
+    files; it overrides the target in a pickle's metadata.
+    """
+    path = Path(path)
+    if path.suffix == '.csv':
+        data = pd.read_csv(path)
+        X = data.drop(columns=target).select_dtypes('number')
+        return X, data[target], path.stem
+    with open(path, 'rb') as data_file:
+        pickled_data = pickle.load(data_file)
+    if target is not None:
+        pickled_data['metadata'] = {**pickled_data['metadata'],
+                                    'target': target}
+    X, y = eda_frames(pickled_data)
+    return X, y, pickled_data['metadata']['dataset']
+
+
+def dataset_fingerprint(X, y):
+    """Return fingerprint of the column names and values of X and y."""
+    return joblib.hash((list(X.columns), X.to_numpy(), y.name, y.to_numpy()))
+
+
+# %% Training data entries
+def split_data(X, y, features, train_rows, test_rows, source=None):
+    """Return training data entries of a split of the full X and y by rows.
+
+    source is the path of the file X and y were read with load_source(), if
+    not the webapp's eda_data pickle.
+    """
+    entries = {'features': list(features),
+               'target': y.name,
+               'train_rows': np.asarray(train_rows, dtype=np.intp),
+               'test_rows': np.asarray(test_rows, dtype=np.intp),
+               'fingerprint': dataset_fingerprint(X, y)}
+    if source is not None:
+        entries['source'] = str(Path(source).resolve())
+    return entries
+
+
+def sample_data(X_train, X_test, y_train, y_test):
+    """Return training data entries holding samples of the data."""
+    return {'features': list(X_train.columns),
+            'target': y_train.name,
+            'X_train': X_train,
+            'X_test': X_test,
+            'y_train': y_train,
+            'y_test': y_test}
+
+
+# %% Training data
+class TrainingData:
+    """Training and test sets of a saved model, loaded lazily.
+
+    Frames are only built when first accessed, so the artifact can be read
+    for its settings and search summary without loading the dataset.
+    """
+
+    def __init__(self, data_path, eda_path=EDA_PATH):
+        """Load the train_data artifact saved with the model (cached)."""
+        self.artifact = cached_load(data_path)
+        self.eda_path = eda_path
+        self.training_settings = self.artifact['training_settings']
+        self.search_summary = self.artifact.get('search_summary')
+        # Artifacts saved before split indices were stored hold the frames
+        self.features = self.artifact.get('features',
+                                          self.training_settings['features'])
+        self.target = self.artifact.get('target')
+
+    @cached_property
+    def _dataset(self):
+        """Return the full X and y the split's row indices refer to."""
+        if 'source' in self.artifact:
+            path = Path(self.artifact['source'])
+            X, y, _ = load_source(path, self.target)
+        else:
+            path = self.eda_path
+            with open(path, 'rb') as data_file:
+                X, y = eda_frames(pickle.load(data_file))
+        if dataset_fingerprint(X, y) != self.artifact['fingerprint']:
+            raise ValueError(f'{path} no longer holds the dataset the model '
+                             'was trained on; train it again.')
+        return X, y
+
+    def _frame(self, name, rows):
+        """Return a saved sample, or the rows of the dataset."""
+        if name in self.artifact:
+            return self.artifact[name]
+        X, y = self._dataset
+        if name.startswith('X'):
+            return X.iloc[self.artifact[rows]][self.features]
+        return y.iloc[self.artifact[rows]]
+
+    @cached_property
+    def X_train(self):
+        """Return training features."""
+        return self._frame('X_train', 'train_rows')
+
+    @cached_property
+    def X_test(self):
+        """Return test features."""
+        return self._frame('X_test', 'test_rows')
+
+    @cached_property
+    def y_train(self):
+        """Return training targets."""
+        return self._frame('y_train', 'train_rows')
+
+    @cached_property
+    def y_test(self):
+        """Return test targets."""
+        return self._frame('y_test', 'test_rows')
@@ -0,0 +1,163 @@
+"""Train many configurations from the command line, without Bokeh.
+
+Reads a JSON (or, if PyYAML is installed, YAML) list of training settings,
+trains them through train_model() on the persistent worker pool, and writes
+every model's artifacts plus a leaderboard to an output directory.  Neither
+the Bokeh server nor the webapp is started, so sweeps can run on idle cores,
+e.g. nightly from cron.
+
+Each entry holds the training_settings used by the Train app, plus the path
+of the data to train on:
+
+    -   data: CSV file, or an eda_data pickle saved by the webapp.
+
+    -   target: Target column; taken from the pickle's metadata if omitted.
+
+    -   dataset: Name used in the leaderboard; defaults to the file name.
+
+    -   name: Optional run name for the artifacts directory; defaults to the
+        model name, numbered if a model appears more than once.
+
+    -   features: Optional, defaults to every numeric column but the target.
+
+    -   params: {name: [values]} or [[name, [values]], ...], as in the app.
+
+    -   train_split, time_budget, n_components: Optional, as in the app.
+
+The path of the data is saved with each run, so the Results app and
+twe-score rebuild its training and test sets from the same file.
+
+Entries on the same data and target are trained concurrently and share the
+worker pool, the published dataset, and the cache of scaled folds.
+
+Functions:
+    -   load_config: Return the list of training settings in a config file.
+
+    -   load_dataset: Return X, y, and dataset name of one config entry.
+
+    -   main: Command line entry point (twe-train).
+"""
+
+# %% Imports
+# Standard system imports
+import argparse
+from functools import partial
+import json
+from pathlib import Path
+
+# Related third party imports
+import pandas as pd
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn import worker_pool
+from bokeh_server.train.twe_learn.artifacts import load_source
+from bokeh_server.train.twe_learn.leaderboard import train_all
+
+
+# %% Configuration
+def load_config(path):
+    """Return the list of training settings in a JSON or YAML file."""
+    path = Path(path)
+    with open(path, 'r') as config_file:
+        if path.suffix in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise SystemExit('PyYAML is required for YAML configs; '
+                                 'install it or use JSON.')
+            config = yaml.safe_load(config_file)
+        else:
+            config = json.load(config_file)
+    if not isinstance(config, list):
+        raise SystemExit(f'{path} must contain a list of training settings.')
+    return config
+
+
+def load_dataset(entry):
+    """Return X (numeric columns but the target), y, and dataset name."""
+    path = Path(entry['data'])
+    if path.suffix == '.csv' and entry.get('target') is None:
+        raise SystemExit(f"No target given for {path}.")
+    X, y, name = load_source(path, entry.get('target'))
+    return X, y, entry.get('dataset', name)
+
+
+def _settings(entry, X, dataset):
+    """Return training_settings of a config entry, filling in defaults."""
+    params = entry.get('params', [])
+    if isinstance(params, dict):
+        params = list(params.items())
+    settings = {'dataset': dataset,
+                'mode': 'Batch',
+                'data': str(Path(entry['data']).resolve()),
+                'features': entry.get('features', list(X.columns)),
+                'model': entry['model'],
+                'train_split': entry.get('train_split', 0.8),
+                'params': [(name, list(values)) for name, values in params],
+                'time_budget': entry.get('time_budget')}
+    if 'n_components' in entry:
+        settings['n_components'] = entry['n_components']
+    return settings
+
+
+def _name_runs(settings_list, entries):
+    """Give every run of a dataset a distinct artifacts directory name."""
+    counts = {}
+    for settings, entry in zip(settings_list, entries):
+        name = entry.get('name', settings['model'])
+        counts[name] = counts.get(name, 0) + 1
+        settings['run_name'] = name if counts[name] == 1 \
+            else f'{name} {counts[name]}'
+
+
+# %% Command line
+def _report(dataset, row):
+    """Print a leaderboard row as soon as its model finishes."""
+    result = row['error'] or f"CV score {row['cv_score']:.4f}"
+    print(f"{dataset}: {row['run']}: {result}", flush=True)
+
+
+def main(argv=None):
+    """Train every configuration of a config file and write a leaderboard."""
+    parser = argparse.ArgumentParser(
+        description='Train many configurations without the Bokeh server.')
+    parser.add_argument('config', help='JSON or YAML list of settings')
+    parser.add_argument('-o', '--output', default='twe_runs',
+                        help='directory for artifacts and leaderboards')
+    parser.add_argument('-w', '--workers', type=int,
+                        default=worker_pool.N_WORKERS,
+                        help='worker processes (default: all cores)')
+    parser.add_argument('-c', '--concurrent', type=int, default=None,
+                        help='searches in flight per dataset (default: all)')
+    args = parser.parse_args(argv)
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    # Start the pool at its configured size before any search uses it
+    worker_pool.get_pool(args.workers)
+    # Group entries by data so each dataset is loaded and published once
+    groups = {}
+    for entry in load_config(args.config):
+        key = (entry['data'], entry.get('target'))
+        groups.setdefault(key, []).append(entry)
+    leaderboard = []
+    try:
+        for entries in groups.values():
+            X, y, dataset = load_dataset(entries[0])
+            settings_list = [_settings(x, X, dataset) for x in entries]
+            _name_runs(settings_list, entries)
+            rows = train_all(X, y, settings_list,
+                             on_result=partial(_report, dataset),
+                             max_concurrent=args.concurrent,
+                             directory=output / dataset, winner_directory=None,
+                             history_path=output / 'run_history.json')
+            leaderboard.extend({'dataset': dataset, **row} for row in rows)
+    finally:
+        worker_pool.shutdown_pool()
+    leaderboard = pd.DataFrame(leaderboard)
+    leaderboard.to_csv(output / 'leaderboard.csv', index=False)
+    print(leaderboard.drop(columns=['params', 'error']).to_string(
+        index=False))
+
+
+if __name__ == '__main__':
+    main()
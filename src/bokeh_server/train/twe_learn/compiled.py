@@ -0,0 +1,387 @@
+"""Compile fitted pipelines into flat NumPy inference code.
+
+Pipeline.predict validates its input and dispatches through every step on
+each call, which dominates the latency of small batches, and forests loop
+over their trees in Python.  compile_pipeline() turns a fitted StandardScaler
++ model pipeline into plain arrays whose predict() only does NumPy
+arithmetic:
+
+    -   Linear models: The scaler is folded into the coefficients, so a
+        prediction is one matrix product (plus an argmax for classifiers).
+
+    -   Random forests and gradient boosting: The nodes of every tree are
+        packed into shared arrays, with leaves pointing to themselves, and a
+        batch descends all trees at once, one tree level per step.  The
+        scaled features are rounded to float32 like sklearn's trees do, so
+        every sample reaches the same leaf.  Large batches, where sklearn's
+        Cython tree traversal wins, are passed to the ensemble's predict.
+
+    -   Approximate-kernel SVMs: The Nystroem feature map is computed with
+        the scaled features and followed by the folded linear model.
+
+Other models (k-nearest neighbors, exact kernel SVMs, naive Bayes, histogram
+gradient boosting) are not compiled; predictor() falls back to the
+pipeline's own predict for them.  It also falls back, with a warning, if the
+compiled predictions of VERIFY_ROWS random rows differ from the pipeline's.
+
+Classes:
+    -   CompiledModel: Flat NumPy predictor of a fitted pipeline.
+
+Functions:
+    -   compile_pipeline: Return the compiled predictor of a fitted pipeline.
+
+    -   predictor: Return compiled predictor, or the pipeline if unsupported.
+
+    -   predict_rows: Return predictions of a predictor for a feature matrix.
+
+    -   verify: Return whether compiled predictions equal the pipeline's.
+"""
+
+# %% Imports
+# Standard system imports
+import warnings
+
+# Related third party imports
+import numpy as np
+import pandas as pd
+from sklearn.base import is_classifier
+from sklearn.ensemble import GradientBoostingClassifier, \
+    GradientBoostingRegressor, RandomForestClassifier, RandomForestRegressor
+from sklearn.kernel_approximation import Nystroem
+from sklearn.linear_model import Lasso, LinearRegression, \
+    LogisticRegression, PassiveAggressiveClassifier, \
+    PassiveAggressiveRegressor, Ridge, SGDClassifier, SGDRegressor
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import LinearSVC, LinearSVR
+
+# Local application/library specific imports
+
+
+# %% Globals
+LINEAR_CLASSIFIERS = (LogisticRegression, PassiveAggressiveClassifier,
+                      SGDClassifier, LinearSVC)
+LINEAR_REGRESSORS = (Lasso, LinearRegression, PassiveAggressiveRegressor,
+                     Ridge, SGDRegressor, LinearSVR)
+CHUNK_NODES = 2**21     # Samples x trees descended at once by forests
+VERIFY_ROWS = 256       # Random rows checked by predictor() when compiling
+SEED = 214
+
+
+# %% Compiled models
+class CompiledModel:
+    """Flat NumPy predictor of a fitted pipeline.
+
+    Subclasses implement _predict() on the unscaled float64 features.
+    """
+
+    def __init__(self, mean, scale, n_features):
+        """Store the scaler's mean and scale and the number of features."""
+        self.mean = mean
+        self.scale = scale
+        self.n_features = n_features
+
+    def _scaled(self, X):
+        """Return X standardized with the same operations as the scaler."""
+        return (X - self.mean) / self.scale
+
+    def predict(self, X):
+        """Return predictions for a 2D array-like of feature rows."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f'Expected {self.n_features} features per row, '
+                             f'got shape {X.shape}.')
+        return self._predict(X)
+
+
+class _Linear(CompiledModel):
+    """Linear model with the scaler (and feature map) folded in."""
+
+    def __init__(self, model, mean, scale, n_features, feature_map=None):
+        """Fold the scaler into the coefficients unless a map comes first."""
+        super().__init__(mean, scale, n_features)
+        coef = np.atleast_2d(model.coef_).astype(np.float64)
+        intercept = np.broadcast_to(np.asarray(model.intercept_,
+                                               dtype=np.float64),
+                                    coef.shape[:1]).copy()
+        self.feature_map = feature_map
+        if feature_map is None:
+            intercept -= coef @ (mean / scale)
+            coef = coef / scale
+        self.coef = np.ascontiguousarray(coef.T)
+        self.intercept = intercept
+        self.classes = getattr(model, 'classes_', None)
+
+    def _predict(self, X):
+        """Return labels of the largest decision value, or the regression."""
+        if self.feature_map is not None:
+            X = self.feature_map(self._scaled(X))
+        decision = X @ self.coef + self.intercept
+        if self.classes is None:
+            return decision[:, 0]
+        if decision.shape[1] == 1:
+            return self.classes[(decision[:, 0] > 0).astype(np.intp)]
+        return self.classes[decision.argmax(axis=1)]
+
+
+class _NystroemMap:
+    """Nystroem feature map computed with NumPy."""
+
+    def __init__(self, nystroem):
+        """Copy the components, gamma, and normalization of a fitted map."""
+        if nystroem.kernel != 'rbf':
+            raise TypeError(f'Cannot compile {nystroem.kernel} kernel maps.')
+        self.components = nystroem.components_
+        self.sq_norms = (self.components**2).sum(axis=1)
+        self.gamma = nystroem.gamma or 1 / self.components.shape[1]
+        self.normalization = np.ascontiguousarray(nystroem.normalization_.T)
+
+    def __call__(self, X):
+        """Return the RBF kernel features of the rows of X."""
+        distances = (X**2).sum(axis=1)[:, None] - 2 * X @ self.components.T \
+            + self.sq_norms
+        np.maximum(distances, 0, out=distances)
+        return np.exp(-self.gamma * distances) @ self.normalization
+
+
+class _TreeEnsemble(CompiledModel):
+    """Trees packed into flat node arrays and descended level by level.
+
+    Batches of more than native_sample_trees samples x trees are passed to
+    the ensemble's own predict, whose Cython traversal is faster there.
+    """
+
+    native_sample_trees = 2**18
+
+    def __init__(self, model, trees, values, mean, scale, n_features):
+        """Pack the nodes of sklearn Tree objects and their output values.
+
+        values[i] holds the output of every node of trees[i], one row per
+        node.  Leaves point to themselves, so extra steps leave them put.
+        """
+        super().__init__(mean, scale, n_features)
+        sizes = [tree.node_count for tree in trees]
+        self.roots = np.cumsum([0] + sizes[:-1]).astype(np.intp)
+        node = np.arange(sum(sizes))
+        left = np.concatenate([tree.children_left for tree in trees]) \
+            .astype(np.intp)
+        right = np.concatenate([tree.children_right for tree in trees]) \
+            .astype(np.intp)
+        offsets = np.repeat(self.roots, sizes)
+        is_leaf = left == -1
+        # children[2 * node + go_right] is the next node of a sample
+        self.children = np.empty(2 * len(node), dtype=np.intp)
+        self.children[0::2] = np.where(is_leaf, node, left + offsets)
+        self.children[1::2] = np.where(is_leaf, node, right + offsets)
+        self.feature = np.where(
+            is_leaf, 0, np.concatenate([tree.feature for tree in trees])) \
+            .astype(np.intp)
+        self.threshold = np.concatenate([tree.threshold for tree in trees])
+        self.values = np.concatenate(values)
+        self.depth = max(tree.max_depth for tree in trees)
+        self.model = model
+
+    def predict(self, X):
+        """Return predictions, using the model's own for large batches."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 2 and X.shape[1] == self.n_features and \
+                len(X) * len(self.roots) > self.native_sample_trees:
+            return self.model.predict(self._scaled(X))
+        return super().predict(X)
+
+    def _leaves(self, X):
+        """Yield row slices of X and the leaf of every (row, tree) pair."""
+        # sklearn's trees compare float32 features with float64 thresholds
+        X = self._scaled(X).astype(np.float32)
+        chunk = max(1, CHUNK_NODES // len(self.roots))
+        for start in range(0, len(X), chunk):
+            X_chunk = X[start:start + chunk].ravel()
+            n_rows = len(X_chunk) // self.n_features
+            row_starts = (np.arange(n_rows) * self.n_features)[:, None]
+            nodes = np.broadcast_to(self.roots,
+                                    (n_rows, len(self.roots))).copy()
+            for _ in range(self.depth):
+                x = X_chunk.take(row_starts + self.feature.take(nodes))
+                nodes = self.children.take(
+                    2 * nodes + (x > self.threshold.take(nodes)))
+            yield slice(start, start + n_rows), nodes
+
+
+class _Forest(_TreeEnsemble):
+    """Random forest: mean of the trees' class probabilities or values."""
+
+    def __init__(self, model, mean, scale, n_features):
+        """Pack the trees with normalized class counts or node values."""
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        if trees[0].n_outputs != 1:
+            raise TypeError('Cannot compile multi-output forests.')
+        self.classes = getattr(model, 'classes_', None)
+        if self.classes is None:
+            values = [tree.value[:, 0, :] for tree in trees]
+        else:
+            values = [tree.value[:, 0, :] / tree.value[:, 0, :].sum(
+                axis=1, keepdims=True) for tree in trees]
+        super().__init__(model, trees, values, mean, scale, n_features)
+
+    def _predict(self, X):
+        """Return the class of highest mean probability, or the mean value."""
+        outputs = np.empty((len(X), self.values.shape[1]))
+        for rows, nodes in self._leaves(X):
+            outputs[rows] = self.values[nodes].mean(axis=1)
+        if self.classes is None:
+            return outputs[:, 0]
+        return self.classes[outputs.argmax(axis=1)]
+
+
+def _initial_raw_prediction(model, n_features, n_outputs):
+    """Return the constant raw prediction of a boosting model's init_.
+
+    init_ predicts a constant: the mean, median or quantile of the target,
+    or the prior of every class, which the classification losses turn into
+    log-odds (deviance), half log-odds (exponential) or log-probabilities
+    (multinomial deviance), clipped like sklearn's losses do.
+    """
+    if isinstance(model.init_, str):    # init='zero'
+        return np.zeros(n_outputs)
+    X = np.zeros((1, n_features))
+    if not hasattr(model, 'classes_'):
+        return np.ravel(model.init_.predict(X))[:1].astype(np.float64)
+    eps = np.finfo(np.float32).eps
+    proba = np.clip(model.init_.predict_proba(X)[0], eps, 1 - eps)
+    if n_outputs > 1:
+        return np.log(proba)
+    log_odds = np.log(proba[1] / (1 - proba[1]))
+    return np.array([0.5 * log_odds if model.loss == 'exponential'
+                     else log_odds])
+
+
+class _Boosting(_TreeEnsemble):
+    """Gradient boosting: initial raw prediction plus scaled tree values."""
+
+    native_sample_trees = 2**12     # sklearn predicts all stages in Cython
+
+    def __init__(self, model, mean, scale, n_features):
+        """Pack the stages' trees and the constant initial prediction."""
+        stages = model.estimators_
+        trees = [estimator.tree_ for estimator in stages.ravel()]
+        values = [tree.value[:, 0, :] for tree in trees]
+        super().__init__(model, trees, values, mean, scale, n_features)
+        self.n_stages, self.n_outputs = stages.shape
+        self.learning_rate = model.learning_rate
+        self.classes = getattr(model, 'classes_', None)
+        self.init = _initial_raw_prediction(model, n_features, self.n_outputs)
+        # The exponential loss predicts the positive class at a zero score
+        self.exponential = getattr(model, 'loss', None) == 'exponential'
+
+    def _predict(self, X):
+        """Return the class of the largest raw prediction, or the value."""
+        raw = np.empty((len(X), self.n_outputs))
+        for rows, nodes in self._leaves(X):
+            stage_values = self.values[nodes, 0].reshape(
+                len(nodes), self.n_stages, self.n_outputs)
+            raw[rows] = self.init + self.learning_rate * \
+                stage_values.sum(axis=1)
+        if self.classes is None:
+            return raw[:, 0]
+        if self.n_outputs == 1:
+            positive = raw[:, 0] >= 0 if self.exponential else raw[:, 0] > 0
+            return self.classes[positive.astype(np.intp)]
+        return self.classes[raw.argmax(axis=1)]
+
+
+# %% Compile
+def _scaler_arrays(scaler, n_features):
+    """Return mean and scale of a StandardScaler, or an identity scaling."""
+    if scaler in (None, 'passthrough'):
+        return np.zeros(n_features), np.ones(n_features)
+    if not isinstance(scaler, StandardScaler):
+        raise TypeError(f'Cannot compile {type(scaler).__name__}.')
+    mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(n_features)
+    scale = scaler.scale_ if scaler.scale_ is not None \
+        else np.ones(n_features)
+    return mean, scale
+
+
+def compile_pipeline(pipeline):
+    """Return the compiled predictor of a fitted scaler + model pipeline.
+
+    Raises TypeError if a step cannot be compiled.
+    """
+    steps = [step for _, step in pipeline.steps]
+    model = steps[-1]
+    n_features = pipeline.n_features_in_
+    mean, scale = _scaler_arrays(steps[0] if len(steps) > 1 else None,
+                                 n_features)
+    feature_map = None
+    if len(steps) == 3 and isinstance(steps[1], Nystroem):
+        feature_map = _NystroemMap(steps[1])
+    elif len(steps) > 2:
+        raise TypeError('Cannot compile pipelines with more than a scaler, '
+                        'a Nystroem map, and a model.')
+    if isinstance(model, LINEAR_CLASSIFIERS + LINEAR_REGRESSORS):
+        return _Linear(model, mean, scale, n_features, feature_map)
+    if feature_map is not None:
+        raise TypeError('Nystroem maps are only compiled for linear models.')
+    if isinstance(model, (RandomForestClassifier, RandomForestRegressor)):
+        return _Forest(model, mean, scale, n_features)
+    if isinstance(model, (GradientBoostingClassifier,
+                          GradientBoostingRegressor)):
+        return _Boosting(model, mean, scale, n_features)
+    raise TypeError(f'Cannot compile {type(model).__name__}.')
+
+
+def _verification_rows(pipeline, compiled):
+    """Return random rows spread like the features the scaler was fitted on.
+
+    Pipelines fitted on DataFrames get a DataFrame with their feature names.
+    """
+    rng = np.random.default_rng(SEED)
+    X = compiled.mean + compiled.scale * rng.standard_normal(
+        (VERIFY_ROWS, compiled.n_features))
+    if hasattr(pipeline, 'feature_names_in_'):
+        return pd.DataFrame(X, columns=pipeline.feature_names_in_)
+    return X
+
+
+def predictor(pipeline):
+    """Return compiled predictor, or the pipeline itself if unsupported.
+
+    The pipeline is also returned if the compiled predictor fails verify()
+    on random rows.
+    """
+    try:
+        compiled = compile_pipeline(pipeline)
+    except TypeError:
+        return pipeline
+    if not verify(compiled, pipeline, _verification_rows(pipeline, compiled)):
+        warnings.warn(f'Compiled {type(pipeline[-1]).__name__} predicts '
+                      'differently from the pipeline; using the pipeline.')
+        return pipeline
+    return compiled
+
+
+def predict_rows(model, X, features):
+    """Return predictions of predictor() output for a float feature matrix.
+
+    Pipelines fitted on DataFrames are given the rows as a DataFrame with
+    the feature names they were fitted with.
+    """
+    if isinstance(model, CompiledModel):
+        return model.predict(X)
+    return model.predict(pd.DataFrame(X, columns=features))
+
+
+def verify(compiled, pipeline, X, rtol=1e-9):
+    """Return whether compiled predictions equal the pipeline's on X.
+
+    Class labels must be identical; regression values may differ by the
+    rounding of a different order of operations (relative tolerance rtol).
+    compiled may also be the pipeline returned by predictor() for models
+    that are not compiled.  Tree ensembles are checked on their NumPy
+    traversal even for batches they would pass to the ensemble's predict.
+    """
+    expected = pipeline.predict(X)
+    actual = CompiledModel.predict(compiled, X) \
+        if isinstance(compiled, CompiledModel) else compiled.predict(X)
+    if is_classifier(pipeline):
+        return bool(np.array_equal(actual, expected))
+    return bool(np.allclose(actual, expected, rtol=rtol, atol=1e-9))
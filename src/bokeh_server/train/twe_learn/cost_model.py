@@ -0,0 +1,186 @@
+"""Predict the number of fits and the wall time of a grid search.
+
+The time of one candidate on one CV fold (fit plus score) is modelled as
+
+    seconds = k(model) * rows**ROW_EXPONENTS[model] * features * cost(params)
+
+where cost(params) is the product of each hyperparameter raised to its
+COST_EXPONENTS entry (e.g. twice the trees take twice as long).  k starts from
+a rough prior per model and is calibrated from a local history of completed
+grid searches, which records the mean fit and score times of every candidate
+from cv_results_.  The wall time divides the total by the number of worker
+processes and is corrected by the ratio of observed to predicted wall time of
+past runs, which absorbs pool overheads and the savings of search paths.
+
+Functions:
+    -   candidate_costs: Return the cost factor of each candidate's params.
+
+    -   load_history: Return the recorded grid search runs.
+
+    -   record_run: Append a completed grid search to the run history.
+
+    -   estimate_cost: Predict candidates, fits, and wall time of a search.
+"""
+
+# %% Imports
+# Standard system imports
+from itertools import product
+import json
+import threading
+
+# Related third party imports
+import numpy as np
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn import worker_pool
+from bokeh_server.train.twe_learn.artifacts import EDA_PATH
+
+
+# %% Globals
+HISTORY_PATH = EDA_PATH.with_name('run_history.json')   # In data directory
+MAX_HISTORY = 200   # Most recent runs kept in the history file
+_history_lock = threading.Lock()    # Concurrent searches record runs
+# Exponent of each parameter's effect on fit time
+COST_EXPONENTS = {'n_estimators': 1, 'max_iter': 1, 'max_depth': 1,
+                  'C': 0.5, 'alpha': -0.5}
+# Exponent of the number of training rows in fit time; 1 if not listed
+ROW_EXPONENTS = {'K-Nearest Neighbors CLF': 1.3,
+                 'K-Nearest Neighbors REG': 1.3,
+                 'SVC (rbf kernel)': 2,
+                 'SVR (rbf kernel)': 2}
+# Seconds per unit of rows, features, and cost before any run is recorded,
+# measured on one core; 5e-8 if not listed
+PRIOR_SECONDS = {'Gradient Boosting CLF': 6e-8,
+                 'Gradient Boosting REG': 6e-8,
+                 'Hist Gradient Boosting CLF': 1e-6,
+                 'Hist Gradient Boosting REG': 1e-6,
+                 'K-Nearest Neighbors CLF': 3e-7,
+                 'K-Nearest Neighbors REG': 3e-7,
+                 'Random Forest CLF': 3e-8,
+                 'Random Forest REG': 3e-8,
+                 'SVC (linear kernel)': 1.5e-6,
+                 'SVC (rbf kernel)': 4e-10,
+                 'SVR (rbf kernel)': 2e-9,
+                 'SVC (approx. rbf kernel)': 2e-6,
+                 'SVR (approx. rbf kernel)': 2e-6}
+DEFAULT_PRIOR_SECONDS = 5e-8
+
+
+# %% Cost factors
+def candidate_costs(candidates):
+    """Return the cost factor of each candidate's hyperparameters.
+
+    Parameter names may carry a pipeline prefix (e.g. model__C).  Parameters
+    not listed in COST_EXPONENTS, or with non-positive values, do not count.
+    """
+    costs = np.ones(len(candidates))
+    for idx, params in enumerate(candidates):
+        for name, value in params.items():
+            exponent = COST_EXPONENTS.get(name.split('__')[-1])
+            if exponent is not None and np.issubdtype(type(value), np.number) \
+                    and value > 0:
+                costs[idx] *= float(value)**exponent
+    return costs
+
+
+def _units(model_name, n_rows, n_features, costs):
+    """Return work units of fitting candidates with the given costs."""
+    return n_rows**ROW_EXPONENTS.get(model_name, 1) * n_features * costs
+
+
+# %% Run history
+def load_history(path=HISTORY_PATH):
+    """Return list of recorded grid search runs, oldest first."""
+    if not path.exists():
+        return []
+    with open(path, 'r') as history_file:
+        return json.load(history_file)
+
+
+def record_run(model_name, grid_search, n_rows, n_features,
+               path=HISTORY_PATH):
+    """Append a completed grid search to the run history file at path.
+
+    n_rows is the number of training rows before the CV split.  Only explored
+    candidates are recorded.
+    """
+    results = grid_search.cv_results_
+    explored = grid_search.explored_
+    n_folds = grid_search.n_splits_
+    seconds = results['mean_fit_time'] + results['mean_score_time']
+    run = {'model': model_name,
+           'rows': n_rows * (n_folds - 1) / n_folds,   # Rows of one CV fold
+           'features': int(n_features),
+           'workers': worker_pool.pool_size(),
+           'costs': candidate_costs(results['params'])[explored].tolist(),
+           'seconds': seconds[explored].tolist(),
+           'folds': n_folds,
+           'wall_time': grid_search.search_time_}
+    with _history_lock:
+        history = (load_history(path) + [run])[-MAX_HISTORY:]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as history_file:
+            json.dump(history, history_file)
+        tmp_path.replace(path)
+
+
+def _model_runs(model_name, history):
+    """Return the recorded runs of a model that timed any candidate."""
+    return [run for run in history if run['model'] == model_name
+            and run['seconds']]
+
+
+def _calibrate(model_name, history):
+    """Return seconds per unit and wall-time correction for a model.
+
+    The rate of a run is its total time over its total units, so the
+    recorded grid is reproduced even where a parameter's COST_EXPONENTS
+    entry is off.  Both values are medians over the recorded runs of the
+    model, so a single unusual run does not skew the estimate.
+    """
+    runs = _model_runs(model_name, history)
+    if not runs:
+        return PRIOR_SECONDS.get(model_name, DEFAULT_PRIOR_SECONDS), 1.0
+    rates, corrections = [], []
+    for run in runs:
+        units = _units(model_name, run['rows'], run['features'],
+                       np.array(run['costs']))
+        seconds = np.array(run['seconds'])
+        rates.append(seconds.sum() / units.sum())
+        busy = seconds.sum() * run['folds'] / run['workers']
+        if busy > 0:
+            corrections.append(run['wall_time'] / busy)
+    correction = float(np.median(corrections)) if corrections else 1.0
+    return float(np.median(rates)), correction
+
+
+# %% Estimate
+def estimate_cost(model_name, n_rows, n_features, params, n_folds=5,
+                  n_workers=None, history=None):
+    """Predict candidates, fits, and wall time of a grid search.
+
+    params is the list of (name, values) pairs of the hyperparameter grid and
+    n_rows the number of training rows before the CV split.  Returns a
+    dictionary with the number of candidates, the number of fits (every
+    candidate on every fold plus the refit of the best one), the predicted
+    wall time in seconds, and whether the estimate is calibrated from
+    recorded runs of the model.
+    """
+    n_workers = n_workers or worker_pool.pool_size()
+    history = load_history() if history is None else history
+    names = [name for name, _ in params]
+    candidates = [dict(zip(names, values))
+                  for values in product(*[values for _, values in params])]
+    rate, correction = _calibrate(model_name, history)
+    fold_rows = n_rows * (n_folds - 1) / n_folds
+    seconds = rate * _units(model_name, fold_rows, n_features,
+                            candidate_costs(candidates))
+    # Refit of the most expensive candidate on all training rows
+    refit = seconds.max() * (n_rows / fold_rows)**ROW_EXPONENTS.get(
+        model_name, 1)
+    wall_time = seconds.sum() * n_folds / n_workers * correction + refit
+    return {'candidates': len(candidates),
+            'fits': len(candidates) * n_folds + 1,
+            'seconds': float(wall_time),
+            'calibrated': bool(_model_runs(model_name, history))}
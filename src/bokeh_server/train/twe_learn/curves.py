@@ -0,0 +1,139 @@
+"""ROC and precision-recall curves of a classifier, one class versus the rest.
+
+The curves are computed from the model's decision scores on the test set
+(predict_proba, or decision_function for models without probabilities).
+Each class's scores are sorted once and the true and false positive counts
+at every distinct threshold are cumulative sums, so a curve costs one sort.
+AUC and average precision are computed on the full curves.
+
+A test set with many distinct scores has as many threshold points, so each
+curve is reduced to at most MAX_POINTS vertices before it is saved with the
+results.  The decimation is a vectorized form of Visvalingam-Whyatt: in each
+pass the interior vertices spanning the smallest triangles with their
+neighbours, which change the area under the curve the least, are removed.
+Only local minima of the triangle areas are removed in a pass, so no two
+neighbouring vertices are removed at once, and a pass costs a few array
+operations instead of one heap operation per vertex.
+
+Functions:
+    -   decision_scores: Return the decision scores of every class.
+
+    -   decimate: Return indices of the vertices kept in a reduced curve.
+
+    -   classifier_curves: Return ROC and PR curves of each class.
+"""
+
+# %% Imports
+# Standard system imports
+
+# Related third party imports
+import numpy as np
+
+# Local application/library specific imports
+
+
+# %% Globals
+MAX_POINTS = 200    # Vertices kept per curve
+
+
+# %% Curves
+def decision_scores(model, X):
+    """Return decision scores of X, one column per class in model.classes_.
+
+    Probabilities are used where the model provides them.  The single column
+    of a binary decision_function scores the second class, so the first
+    class is scored by its negation.
+    """
+    if hasattr(model, 'predict_proba'):
+        return model.predict_proba(X)
+    scores = model.decision_function(X)
+    if scores.ndim == 1:
+        scores = np.column_stack((-scores, scores))
+    return scores
+
+
+def _areas(x, y):
+    """Return twice the area of the triangle of each interior vertex."""
+    return np.abs((x[:-2] - x[2:]) * (y[1:-1] - y[2:])
+                  - (x[1:-1] - x[2:]) * (y[:-2] - y[2:]))
+
+
+def decimate(x, y, max_points=MAX_POINTS):
+    """Return indices of at most max_points vertices of the curve (x, y).
+
+    The first and last vertices are always kept.  Collinear vertices, e.g.
+    along the steps of a ROC curve, span no area and are removed first.
+    """
+    index = np.arange(len(x))
+    while len(index) > max(max_points, 2):
+        area = _areas(x[index], y[index])
+        if not area.all():  # Removing every collinear vertex is exact
+            index = np.r_[index[0], index[1:-1][area > 0], index[-1]]
+            continue
+        # Last vertex of each run of equal minima, so no two are neighbours
+        local_min = (area <= np.r_[np.inf, area[:-1]]) \
+            & (area < np.r_[area[1:], np.inf])
+        candidates = np.flatnonzero(local_min)
+        n_remove = len(index) - max_points
+        if len(candidates) > n_remove:
+            candidates = candidates[np.argpartition(
+                area[candidates], n_remove - 1)[:n_remove]]
+        index = np.delete(index, candidates + 1)
+    return index
+
+
+def _binary_curve(positive, scores):
+    """Return thresholds and true and false positive counts of a class.
+
+    Counts are those of predicting the class for scores at or above each
+    distinct threshold, in decreasing order of threshold.
+    """
+    order = np.argsort(scores, kind='mergesort')[::-1]
+    scores, positive = scores[order], positive[order]
+    # Last position of each distinct score
+    last = np.r_[np.flatnonzero(np.diff(scores)), len(scores) - 1]
+    tp = np.cumsum(positive)[last]
+    fp = last + 1 - tp
+    return scores[last], tp, fp
+
+
+def classifier_curves(model, X, y, max_points=MAX_POINTS):
+    """Return ROC and precision-recall curves of every class of a model.
+
+    Returns one entry per class of model.classes_ found in y with at least
+    one positive and one negative row: the class label, the ROC curve (fpr,
+    tpr) and its AUC, the PR curve (recall, precision) and its average
+    precision, the prevalence of the class, and the thresholds of the
+    vertices.  Each curve holds at most max_points float32 vertices.
+    """
+    scores = np.asarray(decision_scores(model, X), dtype=np.float64)
+    y = np.asarray(y)
+    curves = []
+    for column, label in enumerate(model.classes_):
+        positive = y == label
+        n_positive = int(positive.sum())
+        if n_positive in (0, len(y)):
+            continue
+        thresholds, tp, fp = _binary_curve(positive, scores[:, column])
+        # ROC curve starts at (0, 0) above the highest threshold
+        fpr = np.r_[0, fp / (len(y) - n_positive)]
+        tpr = np.r_[0, tp / n_positive]
+        roc_thresholds = np.r_[np.inf, thresholds]
+        # PR curve starts at (0, 1); average precision is the step integral
+        precision = np.r_[1, tp / (tp + fp)]
+        recall = np.r_[0, tp / n_positive]
+        roc = decimate(fpr, tpr, max_points)
+        pr = decimate(recall, precision, max_points)
+        curves.append({
+            'label': label,
+            'fpr': fpr[roc].astype(np.float32),
+            'tpr': tpr[roc].astype(np.float32),
+            'roc_thresholds': roc_thresholds[roc].astype(np.float32),
+            'roc_auc': float(np.trapz(tpr, fpr)),
+            'recall': recall[pr].astype(np.float32),
+            'precision': precision[pr].astype(np.float32),
+            'pr_thresholds': roc_thresholds[pr].astype(np.float32),
+            'average_precision': float(np.sum(np.diff(recall)
+                                              * precision[1:])),
+            'prevalence': n_positive / len(y)})
+    return curves
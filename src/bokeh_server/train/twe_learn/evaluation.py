@@ -0,0 +1,152 @@
+"""Evaluate a trained model once and save the results shown by Results app.
+
+The predictions on the training and test sets, the metrics, and the data of
+the plots are computed when the model is trained and saved as compact arrays
+in the results file of the run.  The Results app then loads them instead of
+loading the training data and predicting in every session.
+
+The results hold the description of the estimator and, for each of the
+train and test sets:
+
+    -   Classification: the class labels, the predictions and true targets
+        as codes into the labels, the classification report, the confusion
+        matrix counts, and the accuracy.
+
+    -   Regression: the predictions and true targets as float32, the MSE,
+        RMSE, MAE and R², the residuals histogram, the 2D histograms and
+        largest residuals plotted for large sets, and the R² score.
+
+The test results of classifiers also hold the ROC and precision-recall
+curves of each class under 'curves' (see curves.py).
+
+Runs trained in the app also save the permutation importance of their
+features (see importance.py) under 'importance'.
+
+Functions:
+    -   evaluate: Return results of a model on its training and test sets.
+
+    -   residual_density: Return 2D histograms and outliers of residuals.
+
+    -   predictions: Return the predictions of one set in their own labels.
+
+    -   load_results: Return the results saved with a run.
+"""
+
+# %% Imports
+# Standard system imports
+
+# Related third party imports
+import numpy as np
+from sklearn.base import is_classifier
+from sklearn.metrics import classification_report, confusion_matrix, \
+    mean_absolute_error, mean_squared_error, r2_score
+from sklearn.utils.multiclass import unique_labels
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.artifacts import load_model, TrainingData
+from bokeh_server.train.twe_learn.curves import classifier_curves
+from utility.model_cache import cached_load
+
+
+# %% Globals
+DENSITY_BINS = 60   # Bins per axis of the 2D histograms of large sets
+N_OUTLIERS = 500    # Rows with the largest residuals drawn over them
+
+
+# %% Evaluation
+def _codes(values, labels):
+    """Return values as the smallest integer codes into sorted labels."""
+    codes = np.searchsorted(labels, values)
+    return codes.astype(np.min_scalar_type(max(len(labels) - 1, 0)))
+
+
+def _classification(y_true, y_pred):
+    """Return classification results of one set."""
+    y_true, y_pred = np.asarray(y_true), np.asarray(y_pred)
+    labels = unique_labels(y_true, y_pred)
+    return {'labels': labels,
+            'y_true': _codes(y_true, labels),
+            'y_pred': _codes(y_pred, labels),
+            'report': classification_report(y_true, y_pred, output_dict=True,
+                                            zero_division=0),
+            'confusion': confusion_matrix(y_true, y_pred, labels=labels),
+            'score': float(np.mean(y_true == y_pred))}
+
+
+def _regression(y_true, y_pred):
+    """Return regression results of one set."""
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    mse = mean_squared_error(y_true, y_pred)
+    r2 = r2_score(y_true, y_pred)
+    hist, edges = np.histogram(y_true - y_pred, density=True, bins='auto')
+    return {'y_true': y_true.astype(np.float32),
+            'y_pred': y_pred.astype(np.float32),
+            'metrics': {'MSE': mse,
+                        'RMSE': np.sqrt(mse),
+                        'MAE': mean_absolute_error(y_true, y_pred),
+                        'R²': r2},
+            'hist': hist,
+            'edges': edges,
+            'density': residual_density(y_true, y_pred),
+            'score': r2}
+
+
+def residual_density(y_true, y_pred, bins=DENSITY_BINS,
+                     n_outliers=N_OUTLIERS):
+    """Return 2D histograms of a set and the rows of its largest residuals.
+
+    Returns the counts and x and y bin edges of true vs. predicted values
+    ('actual') and of residuals vs. predicted values ('residuals'), and the
+    row indices of the n_outliers largest absolute residuals ('outliers'),
+    selected in linear time.
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    residuals = y_true - y_pred
+    density = {}
+    for name, y in (('actual', y_true), ('residuals', residuals)):
+        counts, x_edges, y_edges = np.histogram2d(y_pred, y, bins)
+        density[name] = (counts.astype(np.int32), x_edges, y_edges)
+    if len(residuals) > n_outliers:
+        outliers = np.argpartition(np.abs(residuals), -n_outliers)
+        density['outliers'] = outliers[-n_outliers:]
+    else:
+        density['outliers'] = np.arange(len(residuals))
+    return density
+
+
+def evaluate(model, X_train, X_test, y_train, y_test):
+    """Return results of a fitted model on its training and test sets.
+
+    The score of each set is the model's default score: accuracy for
+    classifiers and R² for regressors.
+    """
+    evaluate_set = _classification if is_classifier(model) else _regression
+    results = {'estimator': str(model),
+               'train': evaluate_set(y_train, model.predict(X_train)),
+               'test': evaluate_set(y_test, model.predict(X_test))}
+    if is_classifier(model):
+        results['test']['curves'] = classifier_curves(model, X_test, y_test)
+    return results
+
+
+def predictions(result):
+    """Return the predictions of one set of results in their own labels."""
+    if 'labels' in result:
+        return result['labels'][result['y_pred']]
+    return result['y_pred']
+
+
+def load_results(directory):
+    """Return the results saved with the run in directory.
+
+    Results are loaded through the process-wide model cache.  Runs saved
+    before results were precomputed are evaluated from their model and
+    training data.
+    """
+    if (directory / 'results').exists():
+        return cached_load(directory / 'results')
+    data = TrainingData(directory / 'train_data')
+    return evaluate(load_model(directory / 'model'), data.X_train,
+                    data.X_test, data.y_train, data.y_test)
@@ -0,0 +1,222 @@
+"""Search for the subset of features that gives the best CV score.
+
+Three strategies are offered:
+
+    -   Forward selection: Start from no features and repeatedly add the
+        feature that improves the CV score most.
+
+    -   Backward elimination: Start from all features and repeatedly remove
+        the feature whose removal improves the CV score most.
+
+    -   MI-ranked prefixes: Rank features by mutual information with the
+        target and score every prefix of the ranking at once.
+
+Every subset is scored with the selected model's default hyperparameters on
+the persistent worker pool, using the same train split and CV folds as the
+grid search.  Standardizing a column does not depend on the other columns, so
+each worker scales a fold once and keeps it as a Fortran-ordered (column-major)
+matrix.  A subset is then moved to the leading columns by swapping columns in
+place, and the model is fitted on the view X[:, :k] instead of a copy of the
+subset's columns.  Consecutive subsets share all but one or two features, so
+few swaps are needed between them.
+
+Functions:
+    -   search_features: Return the best subset of features and search path.
+"""
+
+# %% Imports
+# Standard system imports
+from concurrent.futures import wait
+import time
+
+# Related third party imports
+import numpy as np
+from sklearn.base import clone, is_classifier
+from sklearn.feature_selection import mutual_info_classif, \
+    mutual_info_regression
+from sklearn.preprocessing import StandardScaler
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn import worker_pool
+from bokeh_server.train.twe_learn.search import cv_test_folds, fold_data
+from bokeh_server.train.twe_learn.train_model import build_pipeline, \
+    train_test_rows
+from bokeh_server.train.twe_learn.worker_pool import get_pool, \
+    publish_dataset, publish_split
+
+
+# %% Globals
+METHODS = ['Forward selection', 'Backward elimination', 'MI-ranked prefixes']
+MI_SAMPLE_SIZE = 10000  # Training rows used to rank features by MI
+_arranged_folds = {}    # Worker-side cache of column-arranged folds
+
+
+# %% Column arrangement
+class _ColumnArrangement:
+    """Scaled fold whose columns are permuted in place to expose subsets.
+
+    order[p] is the feature held in column p; position[f] is the column
+    holding feature f.  Train and test matrices are permuted together.
+    """
+
+    def __init__(self, X_train, X_test):
+        """Store Fortran-ordered copies of the scaled train and test sets."""
+        self.X_train = np.asfortranarray(X_train)
+        self.X_test = np.asfortranarray(X_test)
+        self.order = np.arange(X_train.shape[1])
+        self.position = np.arange(X_train.shape[1])
+
+    def _swap(self, p, q):
+        """Swap columns p and q of both matrices."""
+        for X in (self.X_train, self.X_test):
+            X[:, [p, q]] = X[:, [q, p]]
+        f, g = self.order[p], self.order[q]
+        self.order[p], self.order[q] = g, f
+        self.position[f], self.position[g] = q, p
+
+    def views(self, subset):
+        """Return views of the train and test columns of a feature subset."""
+        k = len(subset)
+        wanted = set(subset)
+        outside = [f for f in subset if self.position[f] >= k]
+        free = [p for p in range(k) if self.order[p] not in wanted]
+        for f, p in zip(outside, free):
+            self._swap(self.position[f], p)
+        return self.X_train[:, :k], self.X_test[:, :k]
+
+
+def _arranged_fold(data_key, split_key, fold):
+    """Return cached column arrangement and targets of a scaled CV fold.
+
+    Runs inside a worker process; only the folds of the latest split are
+    kept, so the cache holds at most one copy of the scaled dataset.
+    """
+    key = (data_key, split_key, fold)
+    if key not in _arranged_folds:
+        for old_key in [x for x in _arranged_folds if x[:2] != key[:2]]:
+            del _arranged_folds[old_key]
+        X_train, y_train, X_test, y_test = fold_data(data_key, split_key,
+                                                     fold)
+        scaler = StandardScaler(copy=False)  # Fold rows are already a copy
+        _arranged_folds[key] = (_ColumnArrangement(
+            scaler.fit_transform(X_train), scaler.transform(X_test)),
+            y_train, y_test)
+    return _arranged_folds[key]
+
+
+# %% Worker tasks
+def _score_subsets(data_key, split_key, fold, estimator, subsets):
+    """Return CV fold scores of feature subsets (runs in a worker)."""
+    arrangement, y_train, y_test = _arranged_fold(data_key, split_key, fold)
+    scores = []
+    for subset in subsets:
+        X_train, X_test = arrangement.views(subset)
+        model = clone(estimator).fit(X_train, y_train)
+        scores.append(model.score(X_test, y_test))
+    return scores
+
+
+# %% Feature search
+def _score_all(subsets, data_key, split_key, n_folds, estimator):
+    """Return mean CV score of every subset, scored on the worker pool.
+
+    Subsets are split into chunks so that there are at least as many tasks
+    as worker processes.
+    """
+    n_chunks = min(len(subsets), -(-worker_pool.pool_size() // n_folds))
+    chunks = [list(range(len(subsets)))[x::n_chunks]
+              for x in range(n_chunks)]
+    pool = get_pool()
+    futures = {pool.submit(_score_subsets, data_key, split_key, fold,
+                           estimator, [subsets[x] for x in chunk]):
+               (chunk, fold)
+               for chunk in chunks for fold in range(n_folds)}
+    wait(futures)
+    scores = np.empty((len(subsets), n_folds))
+    for future, (chunk, fold) in futures.items():
+        scores[chunk, fold] = future.result()
+    return scores.mean(axis=1)
+
+
+def _forward(n_features, score_all):
+    """Add features one at a time while the CV score improves."""
+    selected, best_score, path = [], -np.inf, []
+    while len(selected) < n_features:
+        remaining = [f for f in range(n_features) if f not in selected]
+        scores = score_all([selected + [f] for f in remaining])
+        best = int(np.argmax(scores))
+        if scores[best] <= best_score:
+            break
+        selected, best_score = selected + [remaining[best]], scores[best]
+        path.append((list(selected), best_score))
+    return selected, best_score, path
+
+
+def _backward(n_features, score_all):
+    """Remove features one at a time while the CV score improves."""
+    selected = list(range(n_features))
+    best_score = score_all([selected])[0]
+    path = [(list(selected), best_score)]
+    while len(selected) > 1:
+        subsets = [[f for f in selected if f != g] for g in selected]
+        scores = score_all(subsets)
+        best = int(np.argmax(scores))
+        if scores[best] <= best_score:
+            break
+        selected, best_score = subsets[best], scores[best]
+        path.append((list(selected), best_score))
+    return selected, best_score, path
+
+
+def _mi_prefixes(X_train, y_train, classifier, score_all):
+    """Score every prefix of the features ranked by mutual information."""
+    rng = np.random.default_rng(214)
+    sample = rng.permutation(len(X_train))[:MI_SAMPLE_SIZE]
+    mutual_info = mutual_info_classif if classifier \
+        else mutual_info_regression
+    ranking = list(np.argsort(-mutual_info(
+        StandardScaler().fit_transform(X_train[sample]), y_train[sample],
+        random_state=214)))
+    subsets = [ranking[:k] for k in range(1, len(ranking) + 1)]
+    scores = score_all(subsets)
+    best = int(np.argmax(scores))
+    return subsets[best], scores[best], list(zip(subsets, scores))
+
+
+def search_features(X, y, training_settings, method):
+    """Return the best subset of features found by a search method.
+
+    The features of training_settings are the candidates.  Returns the
+    chosen feature names, their mean CV score, the search path as a list of
+    (feature names, CV score) pairs, and the search time in seconds.
+    """
+    start = time.perf_counter()
+    features = training_settings['features']
+    estimator = build_pipeline(training_settings)
+    # Score subsets on pre-scaled folds with the model's default parameters
+    estimator.set_params(**{estimator.steps[0][0]: 'passthrough'})
+    classifier = is_classifier(estimator)
+    columns = np.array([X.columns.get_loc(x) for x in features])
+    train_rows, _ = train_test_rows(len(X), training_settings['train_split'])
+    X_train = X.iloc[train_rows, columns].to_numpy(dtype=np.float64)
+    y_train = y.iloc[train_rows].to_numpy()
+    n_folds, test_fold = cv_test_folds(5, X_train, y_train, classifier)
+    data_key = publish_dataset(X, y)
+    split_key = publish_split(train_rows, columns, test_fold)
+
+    def score_all(subsets):
+        return _score_all(subsets, data_key, split_key, n_folds, estimator)
+
+    if method == 'Forward selection':
+        selected, score, path = _forward(len(features), score_all)
+    elif method == 'Backward elimination':
+        selected, score, path = _backward(len(features), score_all)
+    elif method == 'MI-ranked prefixes':
+        selected, score, path = _mi_prefixes(X_train, y_train, classifier,
+                                             score_all)
+    else:
+        raise ValueError(f'Unknown feature search method: {method}')
+    names = [features[f] for f in sorted(selected)]
+    path = [([features[f] for f in subset], subset_score)
+            for subset, subset_score in path]
+    return names, score, path, time.perf_counter() - start
@@ -0,0 +1,128 @@
+"""Permutation importance of the features of a trained model.
+
+The importance of a feature is the drop of the model's test score when the
+values of that feature are shuffled, which breaks its relation to the
+target.  Every (feature, repeat) pair costs a full prediction of the test
+set, so the pairs are scored in parallel on the persistent worker pool.  The
+workers read the test rows from the dataset published for the grid search
+and predict with the compiled model (see compiled.py).
+
+The unpermuted baseline score of a classifier is computed from the test
+labels already predicted by evaluation.evaluate().  Regression predictions
+are saved as float32, so a regressor's baseline is predicted again in full
+precision, like the permuted scores.  At most MAX_ROWS test rows, sampled
+with a fixed seed, are used.
+
+The importances are computed when the model is trained and saved with the
+results of the run, which the Results app plots as a bar chart.
+
+Functions:
+    -   permutation_importance: Return permutation importance of features.
+"""
+
+# %% Imports
+# Standard system imports
+import time
+
+# Related third party imports
+import numpy as np
+from sklearn.base import is_classifier
+from sklearn.metrics import r2_score
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn import worker_pool
+from bokeh_server.train.twe_learn.compiled import predict_rows, predictor
+from bokeh_server.train.twe_learn.worker_pool import get_pool, load_dataset, \
+    load_split, publish_dataset, publish_split
+
+
+# %% Globals
+N_REPEATS = 5       # Permutations of each feature
+MAX_ROWS = 10000    # Test rows predicted per permutation
+SEED = 214
+
+
+# %% Scoring
+def _score(y_true, y_pred, classifier):
+    """Return accuracy of a classifier or R² of a regressor."""
+    y_pred = np.asarray(y_pred)
+    if not classifier:
+        return r2_score(y_true, y_pred)
+    if y_true.dtype.kind == 'U':    # Published object labels are strings
+        y_pred = y_pred.astype(str)
+    return float(np.mean(y_true == y_pred))
+
+
+def _permuted_scores(model, features, data_key, split_key, sample,
+                     classifier, pairs):
+    """Return scores with one feature permuted per pair (runs in a worker).
+
+    Each pair is a (feature, repeat) position; its permutation is seeded by
+    the pair, so scores do not depend on how pairs are split into tasks.
+    """
+    X_full, y_full = load_dataset(data_key)
+    rows, columns, _ = load_split(split_key)
+    rows = rows[sample]
+    X = X_full[rows][:, columns]    # Copy, permuted one column at a time
+    y = y_full[rows]
+    scores = []
+    for feature, repeat in pairs:
+        original = X[:, feature].copy()
+        rng = np.random.default_rng([SEED, feature, repeat])
+        X[:, feature] = original[rng.permutation(len(X))]
+        scores.append(_score(y, predict_rows(model, X, features),
+                             classifier))
+        X[:, feature] = original
+    return scores
+
+
+def permutation_importance(model, X, y, rows, columns, y_pred,
+                           n_repeats=N_REPEATS):
+    """Return permutation importance of columns of X on the test rows.
+
+    y_pred holds the model's predictions of the rows, as made by evaluate();
+    only a classifier's are used.
+    Returns the feature names, the mean and standard deviation of the score
+    drops over the repeats, the baseline score and its metric, and the
+    number of rows and seconds used.
+    """
+    start = time.perf_counter()
+    classifier = is_classifier(model)
+    features = list(X.columns[columns])
+    if len(rows) > MAX_ROWS:
+        rng = np.random.default_rng(SEED)
+        sample = np.sort(rng.choice(len(rows), MAX_ROWS, replace=False))
+    else:
+        sample = np.arange(len(rows))
+    sample_rows = np.asarray(rows)[sample]
+    compiled = predictor(model)
+    if classifier:
+        y_pred = np.asarray(y_pred)[sample]
+    else:
+        y_pred = predict_rows(compiled, X.iloc[sample_rows, columns]
+                              .to_numpy(dtype=np.float64), features)
+    baseline = _score(np.asarray(y)[sample_rows], y_pred, classifier)
+    # Rows are published as a single fold: every row is a test row
+    data_key = publish_dataset(X, y)
+    split_key = publish_split(rows, columns, np.zeros(len(rows)))
+    pairs = [(feature, repeat) for feature in range(len(columns))
+             for repeat in range(n_repeats)]
+    n_chunks = min(len(pairs), worker_pool.pool_size())
+    chunks = [pairs[x::n_chunks] for x in range(n_chunks)]
+    pool = get_pool()
+    futures = [pool.submit(_permuted_scores, compiled, features, data_key,
+                           split_key, sample, classifier, chunk)
+               for chunk in chunks]
+    scores = np.empty((len(columns), n_repeats))
+    for chunk, future in zip(chunks, futures):
+        for (feature, repeat), score in zip(chunk, future.result()):
+            scores[feature, repeat] = score
+    drops = baseline - scores
+    return {'features': features,
+            'mean': drops.mean(axis=1),
+            'std': drops.std(axis=1),
+            'baseline': baseline,
+            'metric': 'Accuracy' if classifier else 'R²',
+            'n_repeats': n_repeats,
+            'n_rows': len(sample),
+            'seconds': time.perf_counter() - start}
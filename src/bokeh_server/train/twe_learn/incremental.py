@@ -0,0 +1,322 @@
+"""Train partial_fit estimators out of core on batches streamed from MySQL.
+
+The in-memory grid search needs the whole table in a DataFrame.  The
+incremental mode instead reads the table in batches through an unbuffered
+(server-side) cursor, so tables far larger than memory can be trained on with
+a bounded resident set size:
+
+    1.  A StandardScaler is fitted with partial_fit over the training stream.
+
+    2.  Every hyperparameter candidate is trained side by side with
+        partial_fit on each scaled batch, for a number of epochs.
+
+    3.  The best candidate is chosen on a validation stream, and scored on the
+        training stream and on a held-out test stream.
+
+Rows are assigned to the training, validation, and test streams by hashing
+their primary key, so the split is reproducible without reading the table.
+Bounded reservoir samples of the training and test streams are kept for the
+results app.
+
+Classes:
+    -   MySQLStream: Stream batches of a MySQL table through a server-side
+        cursor.
+
+    -   IncrementalSearch: Fitted pipeline and scores of an incremental run.
+
+Functions:
+    -   connect_mysql: Return connection to MySQL with the webapp user's
+        credentials.
+
+    -   train_incremental: Train model on a MySQL table and save it to volume.
+"""
+
+# %% Imports
+# Standard system imports
+import os
+import time
+
+# Related third party imports
+from mysql.connector import connect
+import numpy as np
+import pandas as pd
+from sklearn.base import clone, is_classifier
+from sklearn.model_selection import ParameterGrid
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.artifacts import sample_data
+from bokeh_server.train.twe_learn.evaluation import evaluate, predictions
+from bokeh_server.train.twe_learn.importance import permutation_importance
+from bokeh_server.train.twe_learn.train_model import save_training, \
+    search_summary, select_model
+
+
+# %% Globals
+INCREMENTAL_MODELS = ['Naive Bayes', 'Passive Aggressive CLF',
+                      'Passive Aggressive REG', 'SGD Classifier',
+                      'SGD Regressor']
+BATCH_SIZE = 10000      # Rows fetched from MySQL per batch
+N_EPOCHS = 5            # Passes over the training stream
+SAMPLE_SIZE = 10000     # Rows of each stream kept for the results app
+N_BUCKETS = 100         # Hash buckets used to split rows into streams
+
+
+# %% MySQL streaming
+def connect_mysql():
+    """Return connection to MySQL server with the webapp user's credentials."""
+    with open(os.environ['MYSQL_PASSWORD_FILE'], 'r') as secret_file:
+        password = secret_file.read()
+    return connect(user=os.environ['MYSQL_USER'],
+                   password=password,
+                   host='db',
+                   auth_plugin='caching_sha2_password',
+                   database=os.environ['MYSQL_DATABASE'])
+
+
+class MySQLStream:
+    """Stream batches of a MySQL table through a server-side cursor.
+
+    Rows are split into training, validation, and test streams by hash bucket
+    of the primary key: buckets [0, test) are the test stream, buckets
+    [test, test + validation) the validation stream, and the rest the
+    training stream.
+    """
+
+    def __init__(self, table, id_col, features, target, train_split,
+                 batch_size=BATCH_SIZE):
+        """Store table layout and derive the bucket boundaries of streams."""
+        self.table = table
+        self.id_col = id_col
+        self.features = features
+        self.target = target
+        self.batch_size = batch_size
+        self.test_buckets = round((1 - train_split) * N_BUCKETS)
+        # Hold out one fifth of the training share for validation, like a
+        # single fold of the 5-fold CV used by the in-memory grid search
+        self.val_buckets = max(1, round(train_split * N_BUCKETS / 5))
+        self.cnx = None
+
+    def connect(self):
+        """Connect to MySQL server using the credentials of the webapp user."""
+        self.cnx = connect_mysql()
+
+    def close(self):
+        """Close connection to MySQL server."""
+        if self.cnx is not None:
+            self.cnx.close()
+            self.cnx = None
+
+    def _where(self, stream):
+        """Return WHERE clause selecting the hash buckets of a stream."""
+        bucket = f"MOD(CRC32({self.id_col}), {N_BUCKETS})"
+        val_end = self.test_buckets + self.val_buckets
+        if stream == 'test':
+            return f"{bucket} < {self.test_buckets}"
+        if stream == 'validation':
+            return f"{bucket} >= {self.test_buckets} AND {bucket} < {val_end}"
+        return f"{bucket} >= {val_end}"
+
+    def classes(self):
+        """Return sorted distinct values of the target column."""
+        cursor = self.cnx.cursor(buffered=True)
+        cursor.execute(f"SELECT DISTINCT {self.target} FROM {self.table}")
+        classes = sorted(value for (value,) in cursor)
+        cursor.close()
+        return np.array(classes)
+
+    def batches(self, stream, shuffle_seed=None):
+        """Yield (X, y) batches of a stream.
+
+        The unbuffered cursor leaves the result set on the server and only
+        fetches batch_size rows at a time.  Rows are read in primary key
+        order, which follows the clustered index and needs no sort on the
+        server.  If shuffle_seed is given the rows of each batch are shuffled
+        with a generator seeded by it, so consecutive rows of one class are
+        not learned one after the other.
+        """
+        columns = ', '.join(self.features + [self.target])
+        query = f"SELECT {columns} FROM {self.table} " \
+            f"WHERE {self._where(stream)} ORDER BY {self.id_col}"
+        rng = None if shuffle_seed is None \
+            else np.random.default_rng([214, shuffle_seed])
+        cursor = self.cnx.cursor()  # Unbuffered cursor streams the results
+        cursor.execute(query)
+        while True:
+            rows = cursor.fetchmany(self.batch_size)
+            if not rows:
+                break
+            rows = np.array(rows, dtype=object)
+            if rng is not None:
+                rows = rows[rng.permutation(len(rows))]
+            # Rebuild target from a list so numpy infers its natural dtype
+            yield rows[:, :-1].astype(np.float64), \
+                np.array(rows[:, -1].tolist())
+        cursor.close()
+
+
+# %% Streaming helpers
+def _reservoir_update(sample, X, y, seen, rng):
+    """Update a reservoir sample (Algorithm R) with one batch of rows."""
+    X_sample, y_sample = sample
+    n = len(y)
+    position = seen + np.arange(n)
+    slots = np.where(position < SAMPLE_SIZE, position,
+                     rng.integers(0, position + 1))
+    keep = slots < SAMPLE_SIZE
+    X_sample[slots[keep]] = X[keep]
+    y_sample[slots[keep]] = y[keep]
+    return seen + n
+
+
+class _StreamScore:
+    """Accumulate accuracy or R² of a model over a stream of batches."""
+
+    def __init__(self, classifier):
+        """Start with empty sums."""
+        self.classifier = classifier
+        self.n = 0
+        self.correct = 0
+        self.sum_y = 0.0
+        self.sum_y2 = 0.0
+        self.sse = 0.0
+
+    def update(self, y_true, y_pred):
+        """Add one batch of targets and predictions."""
+        self.n += len(y_true)
+        if self.classifier:
+            self.correct += np.count_nonzero(y_true == y_pred)
+        else:
+            self.sum_y += y_true.sum()
+            self.sum_y2 += (y_true**2).sum()
+            self.sse += ((y_true - y_pred)**2).sum()
+
+    def score(self):
+        """Return accuracy for classifiers or R² for regressors."""
+        if self.n == 0:
+            return np.nan
+        if self.classifier:
+            return self.correct / self.n
+        sst = self.sum_y2 - self.sum_y**2 / self.n
+        return 1 - self.sse / sst if sst > 0 else np.nan
+
+
+# %% Incremental search
+class IncrementalSearch:
+    """Fitted pipeline and scores of an incremental (out-of-core) run.
+
+    Provides the attributes of the grid search that the Results app relies on
+    (best_estimator_, best_params_, best_score_ and predict()).
+    """
+
+    def __init__(self, estimator, param_grid, n_epochs=N_EPOCHS):
+        """Store estimator, parameter grid, and number of training epochs."""
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.n_epochs = n_epochs
+
+    def fit(self, stream):
+        """Train every candidate on the stream and keep the best one."""
+        start = time.perf_counter()
+        classifier = is_classifier(self.estimator)
+        candidates = list(ParameterGrid(self.param_grid))
+        models = [clone(self.estimator).set_params(**params)
+                  for params in candidates]
+        fit_kwargs = {'classes': stream.classes()} if classifier else {}
+        # Fit scaler over the training stream
+        scaler = StandardScaler()
+        for X, _ in stream.batches('train'):
+            scaler.partial_fit(X)
+        # Train candidates side by side; every batch is read once per epoch
+        for epoch in range(self.n_epochs):
+            for X, y in stream.batches('train', shuffle_seed=epoch):
+                X = scaler.transform(X)
+                for model in models:
+                    model.partial_fit(X, y, **fit_kwargs)
+        # Choose best candidate on the validation stream
+        val_scores = [_StreamScore(classifier) for _ in models]
+        for X, y in stream.batches('validation'):
+            X = scaler.transform(X)
+            for model, val_score in zip(models, val_scores):
+                val_score.update(y, model.predict(X))
+        self.val_scores_ = np.array([x.score() for x in val_scores])
+        self.best_index_ = int(np.nanargmax(self.val_scores_))
+        self.best_params_ = {f'model__{key}': value for key, value in
+                             candidates[self.best_index_].items()}
+        self.best_score_ = self.val_scores_[self.best_index_]
+        self.best_estimator_ = Pipeline([('scale', scaler),
+                                         ('model', models[self.best_index_])])
+        # Every candidate is trained; kept for parity with the grid search
+        self.n_candidates_ = self.n_explored_ = len(candidates)
+        self.truncated_ = False
+        self.search_time_ = time.perf_counter() - start
+        return self
+
+    def score_stream(self, stream, name, rng):
+        """Return score on a stream and a reservoir sample of its rows."""
+        classifier = is_classifier(self.estimator)
+        n_features = len(stream.features)
+        sample = (np.empty((SAMPLE_SIZE, n_features)),
+                  np.empty(SAMPLE_SIZE, dtype=object))
+        stream_score = _StreamScore(classifier)
+        seen = 0
+        for X, y in stream.batches(name):
+            stream_score.update(y, self.best_estimator_.predict(X))
+            seen = _reservoir_update(sample, X, y, seen, rng)
+        size = min(seen, SAMPLE_SIZE)
+        return stream_score.score(), (sample[0][:size], sample[1][:size])
+
+    def predict(self, X):
+        """Predict using the best estimator found by the search."""
+        return self.best_estimator_.predict(X)
+
+    def score(self, X, y):
+        """Return score of the best estimator on the given data."""
+        return self.best_estimator_.score(X, y)
+
+
+# %% Train model
+def train_incremental(training_settings, id_col, target):
+    """Train model on a MySQL table without loading it and save to volume.
+
+    Returns the same (best params, train score, test score, search summary)
+    tuple as train_model().  The training data saved for the results app are
+    reservoir samples of at most SAMPLE_SIZE rows of the training and test
+    streams.
+    """
+    model = select_model(training_settings['model'])
+    param_grid = {x[0]: x[1] for x in training_settings['params']}
+    features = training_settings['features']
+    stream = MySQLStream(training_settings['dataset'], id_col, features,
+                         target, training_settings['train_split'])
+    search = IncrementalSearch(model(), param_grid)
+    rng = np.random.default_rng(214)
+    stream.connect()
+    try:
+        search.fit(stream)
+        train_score, (X_train, y_train) = search.score_stream(stream, 'train',
+                                                             rng)
+        test_score, (X_test, y_test) = search.score_stream(stream, 'test',
+                                                          rng)
+    finally:
+        stream.close()
+    # The samples are not rows of the eda_data pickle, so they are saved
+    classifier = is_classifier(search.estimator)
+    y_dtype = object if classifier else np.float64
+    training_data = sample_data(
+        pd.DataFrame(X_train, columns=features),
+        pd.DataFrame(X_test, columns=features),
+        pd.Series(y_train, name=target, dtype=y_dtype),
+        pd.Series(y_test, name=target, dtype=y_dtype))
+    # Results app plots the samples; the scores are those of whole streams
+    results = evaluate(search.best_estimator_, training_data['X_train'],
+                       training_data['X_test'], training_data['y_train'],
+                       training_data['y_test'])
+    results['importance'] = permutation_importance(
+        search.best_estimator_, training_data['X_test'],
+        training_data['y_test'], np.arange(len(y_test)),
+        np.arange(len(features)), predictions(results['test']))
+    save_training(search, training_data, results, training_settings)
+    return search.best_params_, train_score, test_score, \
+        search_summary(search)
@@ -0,0 +1,122 @@
+"""Train several models concurrently and rank them on a leaderboard.
+
+Every model's grid search runs in its own thread of the calling process, so
+all searches submit their candidates to the persistent worker pool at once
+and its N_WORKERS processes are the shared core budget.  The searches use
+the same train/test split and CV folds, so the dataset and split are
+published to the workers once, and the workers' cache of scaled folds serves
+every model.
+
+Each model's estimator, search metadata, training data, and results are
+saved in its own directory under LEADERBOARD_PATH (or another leaderboard
+directory); the winner's are also copied to the data directory read by the
+Results app.
+
+Functions:
+    -   artifact_directory: Return directory holding a model's artifacts.
+
+    -   publish_copy: Copy a run to another directory and publish it.
+
+    -   train_all: Train models concurrently and return the leaderboard.
+"""
+
+# %% Imports
+# Standard system imports
+from concurrent.futures import as_completed, ThreadPoolExecutor
+import re
+import shutil
+
+# Related third party imports
+import numpy as np
+import pandas as pd
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.artifacts import new_run_directory, \
+    publish_run, run_directory, RUN_ARTIFACTS
+from bokeh_server.train.twe_learn.cost_model import HISTORY_PATH
+from bokeh_server.train.twe_learn.train_model import DATA_PATH, train_model
+
+
+# %% Globals
+LEADERBOARD_PATH = DATA_PATH / 'leaderboard'
+
+
+# %% Leaderboard
+def artifact_directory(model_name, directory=LEADERBOARD_PATH):
+    """Return directory holding the artifacts of a model's last search."""
+    slug = re.sub(r'[^0-9a-z]+', '_', model_name.lower()).strip('_')
+    return directory / slug
+
+
+def _run(X, y, training_settings, directory, history_path):
+    """Train one model and return its leaderboard row.
+
+    Artifacts are saved under the settings' run_name if given, so several
+    configurations of one model can be kept, else under the model name.
+    """
+    run = training_settings.get('run_name', training_settings['model'])
+    row = {'run': run, 'model': training_settings['model'], 'cv_score': np.nan,
+           'train_score': np.nan, 'test_score': np.nan,
+           'search_time': np.nan, 'explored': np.nan, 'params': '',
+           'error': ''}
+    try:
+        params, train_score, test_score, summary = train_model(
+            X, y, training_settings,
+            artifact_directory(run, directory), history_path)
+    except Exception as exc:  # One failing model must not stop the others
+        row['error'] = f'{type(exc).__name__}: {exc}'
+        return row
+    row.update({'cv_score': summary['cv_score'],
+                'train_score': train_score,
+                'test_score': test_score,
+                'search_time': summary['search_time'],
+                'explored': summary['explored'] / summary['candidates'],
+                'params': str(params)})
+    return row
+
+
+def publish_copy(source, directory):
+    """Copy the current run of source to a new run of directory, published.
+
+    copy2 keeps the model's modification time, which identifies the model
+    of a saved learning curve, so the copy reuses the curve.
+    """
+    source = run_directory(source)
+    run = new_run_directory(directory)
+    for name in RUN_ARTIFACTS:
+        if (source / name).exists():
+            shutil.copy2(source / name, run / name)
+    publish_run(run, directory)
+
+
+def train_all(X, y, settings_list, on_result=None, max_concurrent=None,
+              directory=LEADERBOARD_PATH, winner_directory=DATA_PATH,
+              history_path=HISTORY_PATH):
+    """Train the models of settings_list concurrently.
+
+    on_result(row) is called from a training thread as each model finishes.
+    max_concurrent limits the number of searches in flight (default: all).
+    Returns the leaderboard rows sorted by CV score, best first, and saves
+    them to leaderboard.csv in directory.  The winner's artifacts are copied
+    to winner_directory unless it is None.  Searches are recorded in the
+    run history at history_path.
+    """
+    rows = []
+    with ThreadPoolExecutor(
+            max_workers=max_concurrent or len(settings_list)) as executor:
+        futures = [executor.submit(_run, X, y, training_settings, directory,
+                                   history_path)
+                   for training_settings in settings_list]
+        for future in as_completed(futures):
+            row = future.result()
+            rows.append(row)
+            if on_result is not None:
+                on_result(row)
+    rows.sort(key=lambda row: np.nan_to_num(row['cv_score'], nan=-np.inf),
+              reverse=True)
+    directory.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(rows).to_csv(directory / 'leaderboard.csv', index=False)
+    if winner_directory is not None and rows and not rows[0]['error']:
+        publish_copy(artifact_directory(rows[0]['run'], directory),
+                     winner_directory)
+    return rows
@@ -0,0 +1,253 @@
+"""Learning curve of a trained model computed in a background job.
+
+The learning curve shows the training and CV scores of the best estimator
+when it is fitted on growing subsets of the training folds.  Every (training
+size, fold) pair is a fit of its own, so the pairs are sent to the
+persistent worker pool as separate tasks.  A thread of the calling process
+collects their scores as they complete, so the Results app can plot the
+partial curve while the job runs instead of blocking the page.
+
+The folds are those of the grid search (same CV splitter and number of
+splits), and the subsets of a fold are nested: each training size adds rows
+to the subset of the previous one.  Sizes are fitted smallest first, so the
+curve fills in from the left.  The smallest size is at least the number of
+neighbors of a nearest neighbors model, which cannot score fewer rows.
+
+Finished curves are saved as the learning_curve artifact of the run,
+together with the identity of the model file they were computed for, and
+later sessions read them instead of fitting again.  One job per model runs
+at a time in a process; sessions opened while it runs subscribe to it.
+
+Classes:
+    -   LearningCurveJob: Learning curve of a saved model, computed once.
+
+Functions:
+    -   learning_curve_job: Return the job of a run, starting it if needed.
+"""
+
+# %% Imports
+# Standard system imports
+from concurrent.futures import as_completed
+import threading
+import time
+
+# Related third party imports
+import numpy as np
+from sklearn.base import clone, is_classifier
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.artifacts import ARTIFACT_COMPRESSION, \
+    dump_artifact, load_model, run_directory, TrainingData
+from bokeh_server.train.twe_learn.search import cv_test_folds, fold_data
+from bokeh_server.train.twe_learn.tuning import load_search
+from bokeh_server.train.twe_learn.worker_pool import get_pool, \
+    publish_dataset, publish_split
+from utility.model_cache import cached_load
+
+
+# %% Globals
+TRAIN_SIZES = np.linspace(0.1, 1.0, 5)  # Fractions of the training folds
+MIN_ROWS = 2        # Smallest training subset fitted
+SEED = 214
+_jobs = {}          # Running and finished jobs by model file identity
+_jobs_lock = threading.Lock()
+
+
+# %% Worker task
+def _fit_and_score(estimator, data_key, split_key, fold, n_rows):
+    """Fit on n_rows of a fold's training rows and score (runs in a worker).
+
+    The subset is a prefix of a permutation seeded by the fold, so the
+    subsets of one fold are nested.  Returns the train and test scores and
+    the fit time; a subset the estimator cannot be fitted or scored on (e.g.
+    a single class) scores NaN.
+    """
+    X_train, y_train, X_test, y_test = fold_data(data_key, split_key, fold)
+    rng = np.random.default_rng([SEED, fold])
+    subset = np.sort(rng.permutation(len(X_train))[:n_rows])
+    X_train, y_train = X_train[subset], y_train[subset]
+    start = time.perf_counter()
+    try:
+        estimator = clone(estimator).fit(X_train, y_train)
+        fit_time = time.perf_counter() - start
+        return estimator.score(X_train, y_train), \
+            estimator.score(X_test, y_test), fit_time
+    except Exception:   # Scored NaN like GridSearchCV's error_score
+        return np.nan, np.nan, time.perf_counter() - start
+
+
+# %% Learning curve job
+def _min_rows(model):
+    """Return the smallest training subset the model can be scored on."""
+    final = model[-1] if hasattr(model, 'steps') else model
+    return max(MIN_ROWS, final.get_params().get('n_neighbors') or 0)
+
+
+def _model_key(directory):
+    """Return the identity of a run's model file (modification and size)."""
+    stat = (directory / 'model').stat()
+    return str((directory / 'model').resolve()), stat.st_mtime_ns, \
+        stat.st_size
+
+
+class LearningCurveJob:
+    """Learning curve of the model saved in a directory, computed once.
+
+    Scores are held as (training sizes, folds) arrays that are NaN until
+    their fit completes.  snapshot() returns a copy of the current state and
+    subscribe() registers a callback called with a new snapshot, from the
+    job's thread, after every completed fit.
+    """
+
+    def __init__(self, directory):
+        """Load the saved curve of the model in directory, if any.
+
+        The curve is saved in the directory of the current run.
+        """
+        self.directory = run_directory(directory)
+        self.path = self.directory / 'learning_curve'
+        self.model_key = _model_key(self.directory)
+        self.error = ''
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._state = None
+        if self.path.exists():
+            saved = cached_load(self.path)
+            # A copied run (e.g. the leaderboard winner) keeps the curve of
+            # its model, whose modification time and size are preserved
+            if saved['model_key'][1:] == self.model_key[1:]:
+                self._state = saved
+
+    @property
+    def done(self):
+        """Return True once every fit has completed or the job failed."""
+        with self._lock:
+            return self.error != '' or (self._state is not None
+                                        and self._state['done'])
+
+    def snapshot(self):
+        """Return a copy of the current curve, or None before it starts."""
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self):
+        """Return a copy of the current curve; the lock must be held."""
+        if self._state is None:
+            return None
+        return {key: value.copy() if isinstance(value, np.ndarray) else value
+                for key, value in self._state.items()}
+
+    def subscribe(self, callback):
+        """Call callback(snapshot) on every update and return current one.
+
+        Callbacks are called from the job's thread; finished jobs return
+        their curve and call nothing.
+        """
+        with self._lock:
+            if not (self.error or (self._state and self._state['done'])):
+                self._callbacks.append(callback)
+            return self._snapshot()
+
+    def unsubscribe(self, callback):
+        """Stop calling callback, e.g. when its session is closed."""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def start(self):
+        """Start computing the curve in a thread unless it is already saved."""
+        if self._state is None:
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _notify(self):
+        """Call the subscribed callbacks with a snapshot of the curve."""
+        with self._lock:
+            snapshot = self._snapshot()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            callback(snapshot)
+
+    def _run(self):
+        """Fit every (training size, fold) pair on the worker pool."""
+        try:
+            self._compute()
+        except Exception as exc:  # Reported by the plot instead of raised
+            with self._lock:
+                self.error = f'{type(exc).__name__}: {exc}'
+        self._notify()
+        with self._lock:
+            self._callbacks = []
+
+    def _compute(self):
+        """Publish the training folds, fit the pairs, and save the curve.
+
+        Every pair is collected even if some tasks fail; the job then fails
+        with the first error and keeps the scores of the other pairs.
+        """
+        start = time.perf_counter()
+        model = load_model(self.directory / 'model')
+        data = TrainingData(self.directory / 'train_data')
+        X_train, y_train = data.X_train, data.y_train
+        n_splits = load_search(self.directory).get('n_splits_', 5)
+        n_folds, test_fold = cv_test_folds(n_splits, X_train, y_train,
+                                           is_classifier(model))
+        # Every fold trains on at least the rows outside the largest fold
+        n_fold_rows = len(y_train) - np.bincount(test_fold).max()
+        sizes = np.unique(np.clip((TRAIN_SIZES * n_fold_rows).astype(int),
+                                  _min_rows(model), n_fold_rows))
+        shape = (len(sizes), n_folds)
+        with self._lock:
+            self._state = {'train_sizes': sizes,
+                           'train_scores': np.full(shape, np.nan),
+                           'test_scores': np.full(shape, np.nan),
+                           'fit_times': np.full(shape, np.nan),
+                           'n_done': 0,
+                           'done': False,
+                           'seconds': 0.0,
+                           'model_key': self.model_key}
+        data_key = publish_dataset(X_train, y_train)
+        split_key = publish_split(np.arange(len(y_train)),
+                                  np.arange(X_train.shape[1]), test_fold)
+        estimator = clone(model)
+        pool = get_pool()
+        futures = {pool.submit(_fit_and_score, estimator, data_key,
+                               split_key, fold, n_rows): (size, fold)
+                   for size, n_rows in enumerate(sizes)
+                   for fold in range(n_folds)}
+        errors = []
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                train_score, test_score, fit_time = future.result()
+            except Exception as exc:  # E.g. a worker died; collect the rest
+                errors.append(exc)
+                train_score = test_score = fit_time = np.nan
+            with self._lock:
+                self._state['train_scores'][index] = train_score
+                self._state['test_scores'][index] = test_score
+                self._state['fit_times'][index] = fit_time
+                self._state['n_done'] += 1
+                self._state['seconds'] = time.perf_counter() - start
+            self._notify()
+        if errors:  # Reported without saving, so a later session retries
+            raise errors[0]
+        with self._lock:
+            self._state['done'] = True
+            state = self._snapshot()
+        dump_artifact(state, self.path, ARTIFACT_COMPRESSION)
+
+
+def learning_curve_job(directory):
+    """Return the learning curve job of the run in directory, started.
+
+    Sessions viewing the same model share its job; a new model in the
+    directory gets a new job.
+    """
+    key = _model_key(directory)
+    with _jobs_lock:
+        for old_key in [x for x in _jobs if x[0] == key[0] and x != key]:
+            del _jobs[old_key]
+        if key not in _jobs:
+            _jobs[key] = LearningCurveJob(directory)
+            _jobs[key].start()
+        return _jobs[key]
@@ -0,0 +1,208 @@
+"""Score a whole MySQL table with the trained model and save the predictions.
+
+The table (e.g. a newly loaded dataset with the schema the model was trained
+on) is read through an unbuffered (server-side) cursor in batches of
+batch_size rows, so memory stays bounded however large the table is.  Each
+batch is predicted with one vectorized call of the compiled model (see
+compiled.py), and the predictions are written to a results table with
+multi-row INSERT statements of insert_rows rows, committed once per batch.
+The read and write statements use separate connections, since the streaming
+cursor keeps its connection busy until the whole table is read.
+
+The results table holds the primary key of every row and its prediction,
+NULL for rows with a missing feature value.  It is created if it does not
+exist, and scoring a table again overwrites the predictions of its rows.
+
+LOAD DATA LOCAL INFILE is not used, since MySQL 8 disables local_infile by
+default on the server.
+
+Functions:
+    -   score_table: Predict every row of a table and write the predictions.
+
+    -   main: Command line entry point (twe-score).
+"""
+
+# %% Imports
+# Standard system imports
+import argparse
+from pathlib import Path
+import re
+import time
+
+# Related third party imports
+import numpy as np
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.artifacts import load_model, \
+    run_directory, TrainingData
+from bokeh_server.train.twe_learn.compiled import predict_rows, predictor
+from bokeh_server.train.twe_learn.incremental import BATCH_SIZE, \
+    connect_mysql
+from bokeh_server.train.twe_learn.train_model import DATA_PATH
+
+
+# %% Globals
+INSERT_ROWS = 1000      # Rows per multi-row INSERT statement
+
+
+# %% Table helpers
+def _check_identifier(name):
+    """Raise ValueError unless name is a plain MySQL identifier."""
+    if not re.fullmatch(r'\w+', name):
+        raise ValueError(f'Invalid table or column name: {name!r}.')
+    return name
+
+
+def _column_types(cnx, table):
+    """Return {column: column type} of a table of the current database."""
+    cursor = cnx.cursor(buffered=True)  # Buffered cursor fetches results
+    cursor.execute("SELECT COLUMN_NAME, COLUMN_TYPE "
+                   "FROM information_schema.COLUMNS "
+                   "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                   (table,))
+    types = {column: column_type for column, column_type in cursor}
+    cursor.close()
+    return types
+
+
+def _prediction_type(model):
+    """Return the MySQL column type of the predictions of a model."""
+    classes = getattr(model, 'classes', getattr(model, 'classes_', None))
+    if classes is None:     # Regressor
+        return 'DOUBLE'
+    kind = np.asarray(classes).dtype.kind
+    if kind == 'f':
+        return 'DOUBLE'
+    if kind in 'iu':
+        return 'BIGINT'
+    if kind == 'b':
+        return 'BOOLEAN'
+    return 'VARCHAR(255)'
+
+
+def _create_results_table(cnx, results_table, id_col, id_type,
+                          prediction_type):
+    """Create the results table if it does not exist yet."""
+    cursor = cnx.cursor()
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {results_table} ("
+                   f"{id_col} {id_type} NOT NULL PRIMARY KEY, "
+                   f"prediction {prediction_type} NULL)")
+    cursor.close()
+
+
+def _insert(cnx, results_table, id_col, ids, predictions, insert_rows):
+    """Write ids and predictions with multi-row INSERT statements."""
+    cursor = cnx.cursor()
+    for start in range(0, len(ids), insert_rows):
+        rows = list(zip(ids[start:start + insert_rows],
+                        predictions[start:start + insert_rows]))
+        values = ', '.join(['(%s, %s)'] * len(rows))
+        cursor.execute(f"INSERT INTO {results_table} ({id_col}, prediction) "
+                       f"VALUES {values} AS new "
+                       f"ON DUPLICATE KEY UPDATE prediction = new.prediction",
+                       [value for row in rows for value in row])
+    cursor.close()
+    cnx.commit()
+
+
+# %% Scoring
+def score_table(table, id_col=None, results_table=None, directory=DATA_PATH,
+                batch_size=BATCH_SIZE, insert_rows=INSERT_ROWS,
+                on_batch=None):
+    """Predict every row of a MySQL table and write to a results table.
+
+    id_col defaults to the webapp's <table>_id primary key and results_table
+    to <table>_predictions.  The model and its features are the ones saved
+    in directory.  on_batch(rows, seconds) is called after each batch with
+    the rows scored so far.  Returns a summary of the run.
+    """
+    id_col = _check_identifier(id_col or f'{table}_id')
+    results_table = _check_identifier(results_table or
+                                      f'{table}_predictions')
+    _check_identifier(table)
+    directory = run_directory(directory)
+    model = predictor(load_model(directory / 'model'))
+    features = list(TrainingData(directory / 'train_data').features)
+    read_cnx = connect_mysql()
+    write_cnx = connect_mysql()
+    try:
+        column_types = _column_types(read_cnx, table)
+        missing = [x for x in [id_col] + features if x not in column_types]
+        if missing:
+            raise ValueError(f'{table} has no column(s) {", ".join(missing)}.')
+        _create_results_table(write_cnx, results_table, id_col,
+                              column_types[id_col], _prediction_type(model))
+        columns = ', '.join([id_col] + features)
+        cursor = read_cnx.cursor()  # Unbuffered cursor streams the results
+        cursor.execute(f"SELECT {columns} FROM {table}")
+        n_rows = n_skipped = 0
+        start = time.perf_counter()
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            rows = np.array(rows, dtype=object)
+            values = rows[:, 1:]
+            X = np.where(values == None, np.nan, values)  # noqa: E711
+            X = X.astype(np.float64)
+            complete = np.flatnonzero(~np.isnan(X).any(axis=1))
+            predictions = [None] * len(rows)    # NULL if a value is missing
+            if len(complete):
+                for row, prediction in zip(complete, predict_rows(
+                        model, X[complete], features).tolist()):
+                    predictions[row] = prediction
+            _insert(write_cnx, results_table, id_col, rows[:, 0].tolist(),
+                    predictions, insert_rows)
+            n_rows += len(rows)
+            n_skipped += len(rows) - len(complete)
+            if on_batch is not None:
+                on_batch(n_rows, time.perf_counter() - start)
+        cursor.close()
+        seconds = time.perf_counter() - start
+    finally:
+        read_cnx.close()
+        write_cnx.close()
+    return {'table': table,
+            'results_table': results_table,
+            'rows': n_rows,
+            'skipped': n_skipped,
+            'seconds': seconds,
+            'rows_per_second': n_rows / seconds if seconds > 0 else np.nan}
+
+
+# %% Command line
+def _report(rows, seconds):
+    """Print the rows scored so far and the scoring rate."""
+    print(f'{rows} rows scored, {rows / seconds:.0f} rows/s', flush=True)
+
+
+def main(argv=None):
+    """Score a MySQL table with the trained model from the command line."""
+    parser = argparse.ArgumentParser(
+        description='Score a MySQL table with the trained model.')
+    parser.add_argument('table', help='table to score')
+    parser.add_argument('--id-col', help='primary key (default: <table>_id)')
+    parser.add_argument('--results-table',
+                        help='table of predictions '
+                        '(default: <table>_predictions)')
+    parser.add_argument('--model-dir', default=DATA_PATH, type=Path,
+                        help='directory of the saved model')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help='rows fetched and predicted at once')
+    parser.add_argument('--insert-rows', type=int, default=INSERT_ROWS,
+                        help='rows per INSERT statement')
+    args = parser.parse_args(argv)
+    try:
+        summary = score_table(args.table, args.id_col, args.results_table,
+                              args.model_dir, args.batch_size,
+                              args.insert_rows, on_batch=_report)
+    except (ValueError, FileNotFoundError) as err:
+        raise SystemExit(err)
+    print(f"Scored {summary['rows']} rows of {summary['table']} into "
+          f"{summary['results_table']} in {summary['seconds']:.1f} s "
+          f"({summary['rows_per_second']:.0f} rows/s, "
+          f"{summary['skipped']} with missing values).")
+
+
+if __name__ == '__main__':
+    main()
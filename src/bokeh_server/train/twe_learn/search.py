@@ -0,0 +1,360 @@
+"""Cross-validated grid search evaluated on the persistent worker pool.
+
+Candidates are scheduled by predicted cost: the cheapest groups of candidates
+are evaluated first, and once scores arrive, groups close to the best
+candidate so far in the grid are preferred over distant ones.  With a time
+budget, no new candidates are started once the budget is spent, and the best
+candidate explored so far is refitted.
+
+Functions:
+    -   cv_test_folds: Return the CV test fold of every training row.
+
+    -   fold_data: Return the train and test sets of a published CV fold.
+
+Classes:
+    -   GridSearch: Exhaustive search over a pipeline's hyperparameter grid.
+"""
+
+# %% Imports
+# Standard system imports
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import partial
+import time
+import warnings
+
+# Related third party imports
+import numpy as np
+from scipy.stats import rankdata
+from sklearn.base import clone, is_classifier
+from sklearn.exceptions import FitFailedWarning
+from sklearn.model_selection import check_cv, ParameterGrid
+from sklearn.preprocessing import StandardScaler
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn import worker_pool
+from bokeh_server.train.twe_learn.cost_model import candidate_costs
+from bokeh_server.train.twe_learn.search_paths import fit_and_score, \
+    group_singletons, SEARCH_PATHS
+from bokeh_server.train.twe_learn.worker_pool import get_pool, \
+    load_dataset, load_split, publish_dataset, publish_split
+
+
+# %% Globals
+SCALED_CACHE_BYTES = 512 * 2**20    # Scaled CV folds kept by each worker
+_scaled_folds = OrderedDict()       # Worker-side cache, least recent first
+
+
+# %% Helper functions
+def _take(X, rows, columns):
+    """Return the given rows and columns of a DataFrame, Series, or array."""
+    if hasattr(X, 'iloc'):
+        return X.iloc[rows] if X.ndim == 1 else X.iloc[rows, columns]
+    X = np.asarray(X)
+    if X.ndim == 1:
+        return X[rows]
+    X = X.take(rows, axis=0)  # Gathering rows first is much faster than ix_
+    if np.array_equal(columns, np.arange(X.shape[1])):
+        return X
+    return X[:, columns]
+
+
+def cv_test_folds(cv, X_train, y_train, classifier):
+    """Return number of folds and the CV test fold of every training row."""
+    cv = check_cv(cv, y_train, classifier=classifier)
+    test_fold = np.empty(len(y_train), dtype=np.int8)
+    for fold, (_, test) in enumerate(cv.split(X_train, y_train)):
+        test_fold[test] = fold
+    return cv.get_n_splits(X_train, y_train), test_fold
+
+
+def fold_data(data_key, split_key, fold):
+    """Return X_train, y_train, X_test, y_test of one CV fold.
+
+    Runs inside a worker process.  Only the fold number is sent with a task;
+    the rows are sliced out of the shared memory-mapped matrix.
+    """
+    X, y = load_dataset(data_key)
+    rows, columns, test_fold = load_split(split_key)
+    is_test = test_fold == fold
+    train, test = rows[~is_test], rows[is_test]
+    return _take(X, train, columns), y[train], _take(X, test, columns), \
+        y[test]
+
+
+def _grid_positions(candidates):
+    """Return coordinates of the candidates in the grid, scaled to [0, 1]."""
+    names = sorted({name for params in candidates for name in params})
+    positions = np.zeros((len(candidates), len(names)))
+    for col, name in enumerate(names):
+        values = list(dict.fromkeys(repr(params.get(name))
+                                    for params in candidates))
+        index = [values.index(repr(params.get(name))) for params in candidates]
+        positions[:, col] = np.array(index) / max(len(values) - 1, 1)
+    return positions
+
+
+def _scales_first(estimator):
+    """Return True if a pipeline starts with a default StandardScaler."""
+    if not hasattr(estimator, 'steps'):
+        return False
+    scaler = estimator.steps[0][1]
+    return isinstance(scaler, StandardScaler) and scaler.with_mean \
+        and scaler.with_std
+
+
+def _scaled_fold(data_key, split_key, fold):
+    """Return a CV fold standardized with the statistics of its train rows.
+
+    Runs inside a worker process.  Scaled folds are cached, up to
+    SCALED_CACHE_BYTES per worker, so every candidate group and every
+    concurrent search on the same split reuses them instead of gathering and
+    scaling the fold again.
+    """
+    key = (data_key, split_key, fold)
+    if key in _scaled_folds:
+        _scaled_folds.move_to_end(key)
+        return _scaled_folds[key]
+    X_train, y_train, X_test, y_test = fold_data(data_key, split_key, fold)
+    scaler = StandardScaler(copy=False)  # Fold rows are already a copy
+    scaled = (scaler.fit_transform(X_train), y_train,
+              scaler.transform(X_test), y_test)
+    _scaled_folds[key] = scaled
+    while len(_scaled_folds) > 1 and sum(
+            array.nbytes for fold_data in _scaled_folds.values()
+            for array in fold_data) > SCALED_CACHE_BYTES:
+        _scaled_folds.popitem(last=False)
+    return scaled
+
+
+# %% Worker tasks
+def _evaluate_group(data_key, split_key, fold, estimator, candidates,
+                    evaluate):
+    """Score a group of candidates on one CV fold with a search path.
+
+    Runs inside a worker process; the fold is read from the memory-mapped
+    dataset and split published under data_key and split_key.  A pipeline's
+    leading StandardScaler is applied from the cache of scaled folds and
+    replaced by a passthrough step.
+
+    If a specialized path raises, e.g. because one candidate of the group
+    cannot be fitted, the group is scored again candidate by candidate on
+    the same fold arrays (the cached scaled fold, if any), and the failing
+    candidates score NaN.
+    """
+    if _scales_first(estimator):
+        fold_arrays = partial(_scaled_fold, data_key, split_key, fold)
+        estimator = clone(estimator).set_params(
+            **{estimator.steps[0][0]: 'passthrough'})
+    else:
+        fold_arrays = partial(fold_data, data_key, split_key, fold)
+    try:
+        return evaluate(estimator, candidates, *fold_arrays())
+    except Exception:
+        if evaluate is fit_and_score:
+            raise
+    return fit_and_score(estimator, candidates, *fold_arrays())
+
+
+# %% Grid search
+class GridSearch:
+    """Exhaustive search over a pipeline's hyperparameter grid.
+
+    Provides the attributes of scikit-learn's GridSearchCV that the Train and
+    Results apps rely on (best_estimator_, best_params_, best_score_ and
+    cv_results_).  The candidate fits are sent to the persistent worker pool,
+    which receives the training data once per dataset version instead of once
+    per search.
+
+    fit() accepts the full dataset together with the row and column indices
+    of the training data.  The workers then share one memory-mapped copy of
+    the full matrix, and each task refers to its fold by number.
+
+    Model families listed in search_paths.SEARCH_PATHS are scored with a
+    specialized path that evaluates a group of candidates from shared work
+    (e.g. one boosting fit for every n_estimators); set search_paths=False
+    to fit every candidate separately.
+
+    time_budget (seconds) bounds the search: once it is spent no further
+    candidate groups are started, the groups already started are finished,
+    and truncated_ is set.  Unexplored candidates have NaN scores and the
+    worst rank in cv_results_; explored_ marks the explored candidates.  The
+    refit of the best candidate is not counted against the budget.
+
+    Candidates that fail to fit score NaN on the failing folds and rank last,
+    as with GridSearchCV's default error_score, and a FitFailedWarning is
+    issued.
+    """
+
+    def __init__(self, estimator, param_grid, cv=5, search_paths=True,
+                 time_budget=None):
+        """Store estimator, parameter grid, and cross-validation strategy."""
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.cv = cv
+        self.search_paths = search_paths
+        self.time_budget = time_budget
+
+    def _search_path(self):
+        """Return (group, evaluate) functions for the final estimator."""
+        final_estimator = self.estimator.steps[-1][1] \
+            if hasattr(self.estimator, 'steps') else self.estimator
+        if self.search_paths and type(final_estimator) in SEARCH_PATHS:
+            return SEARCH_PATHS[type(final_estimator)]
+        return group_singletons, fit_and_score
+
+    def _group_costs(self, candidates, groups, evaluate):
+        """Return predicted cost of evaluating each group.
+
+        A specialized path scores its group from about one fit of the most
+        expensive candidate; the generic path fits every candidate.
+        """
+        costs = candidate_costs(candidates)
+        combine = np.sum if evaluate is fit_and_score else np.max
+        return np.array([combine(costs[indices]) for indices in groups])
+
+    def _out_of_time(self, start):
+        """Return True if the time budget has been spent since start."""
+        return self.time_budget is not None \
+            and time.perf_counter() - start > self.time_budget
+
+    @staticmethod
+    def _next_group(unstarted, groups, costs, positions, best_position):
+        """Return the unstarted group to evaluate next.
+
+        Groups are taken cheapest first; once a best candidate is known, each
+        group's cost is inflated by its distance from that candidate in the
+        grid, so promising regions are explored before distant ones.
+        """
+        def priority(g):
+            if best_position is None:
+                return costs[g]
+            distance = np.linalg.norm(positions[groups[g]] - best_position,
+                                      axis=1).min()
+            return costs[g] * (1 + distance)
+        return min(unstarted, key=priority)
+
+    def fit(self, X, y, rows=None, columns=None):
+        """Evaluate candidates on every fold and refit the best one.
+
+        rows and columns select the training data from X and y; by default
+        all rows and columns are used.
+        """
+        start = time.perf_counter()
+        rows = np.arange(len(X)) if rows is None else np.asarray(rows)
+        columns = np.arange(X.shape[1]) if columns is None \
+            else np.asarray(columns)
+        X_train, y_train = _take(X, rows, columns), _take(y, rows, None)
+        n_folds, test_fold = cv_test_folds(
+            self.cv, X_train, y_train, is_classifier(self.estimator))
+        candidates = list(ParameterGrid(self.param_grid))
+        group, evaluate = self._search_path()
+        groups = group(candidates)
+        costs = self._group_costs(candidates, groups, evaluate)
+        positions = _grid_positions(candidates)
+        pool = get_pool()
+        data_key = publish_dataset(X, y)
+        split_key = publish_split(rows, columns, test_fold)
+        shape = (len(candidates), n_folds)
+        scores, fit_times, score_times = np.full(shape, np.nan), \
+            np.full(shape, np.nan), np.full(shape, np.nan)
+        # Keep one task per worker in flight so the order of the remaining
+        # groups can follow the scores that have arrived
+        unstarted = list(range(len(groups)))
+        queued, running = [], {}
+        folds_done = np.zeros(len(groups), dtype=int)
+        best_position, best_score = None, -np.inf
+        self.truncated_ = False
+        while unstarted or queued or running:
+            while len(running) < worker_pool.pool_size() \
+                    and (queued or unstarted):
+                if not queued:  # Start the next group of candidates
+                    if len(unstarted) < len(groups) \
+                            and self._out_of_time(start):
+                        self.truncated_ = True
+                        unstarted = []
+                        break
+                    nxt = self._next_group(unstarted, groups, costs,
+                                           positions, best_position)
+                    unstarted.remove(nxt)
+                    queued = [(nxt, fold) for fold in range(n_folds)]
+                nxt, fold = queued.pop(0)
+                future = pool.submit(_evaluate_group, data_key, split_key,
+                                     fold, self.estimator,
+                                     [candidates[x] for x in groups[nxt]],
+                                     evaluate)
+                running[future] = (nxt, fold)
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                nxt, fold = running.pop(future)
+                indices = groups[nxt]
+                for idx, result in zip(indices, future.result()):
+                    scores[idx, fold], fit_times[idx, fold], \
+                        score_times[idx, fold] = result
+                folds_done[nxt] += 1
+                if folds_done[nxt] < n_folds:
+                    continue
+                group_scores = scores[indices].mean(axis=1)
+                if np.nanmax(group_scores, initial=-np.inf) > best_score:
+                    best = int(np.nanargmax(group_scores))
+                    best_score = group_scores[best]
+                    best_position = positions[indices[best]]
+        self.explored_ = np.zeros(len(candidates), dtype=bool)
+        for g, indices in enumerate(groups):
+            self.explored_[indices] = folds_done[g] == n_folds
+        self.n_candidates_ = len(candidates)
+        self.n_explored_ = int(self.explored_.sum())
+        n_failed = int(np.isnan(scores[self.explored_]).sum())
+        if n_failed:
+            warnings.warn(f'{n_failed} of {self.n_explored_ * n_folds} fits '
+                          'failed and were scored NaN.', FitFailedWarning)
+        self.search_time_ = time.perf_counter() - start
+        self.n_splits_ = n_folds
+        self.cv_results_ = self._format_results(candidates, scores, fit_times,
+                                                score_times)
+        # Refit best candidate on the full training data in this process
+        self.best_index_ = int(np.argmin(self.cv_results_['rank_test_score']))
+        self.best_params_ = candidates[self.best_index_]
+        self.best_score_ = self.cv_results_['mean_test_score'][
+            self.best_index_]
+        self.best_estimator_ = clone(self.estimator).set_params(
+            **self.best_params_)
+        start = time.perf_counter()
+        self.best_estimator_.fit(X_train, y_train)
+        self.refit_time_ = time.perf_counter() - start
+        return self
+
+    @staticmethod
+    def _format_results(candidates, scores, fit_times, score_times):
+        """Return dictionary laid out like GridSearchCV's cv_results_."""
+        results = {
+            'mean_fit_time': fit_times.mean(axis=1),
+            'std_fit_time': fit_times.std(axis=1),
+            'mean_score_time': score_times.mean(axis=1),
+            'std_score_time': score_times.std(axis=1)
+        }
+        for name in sorted({name for params in candidates for name in params}):
+            results[f'param_{name}'] = np.ma.MaskedArray(
+                [params.get(name) for params in candidates],
+                mask=[name not in params for params in candidates],
+                dtype=object)
+        results['params'] = candidates
+        for fold in range(scores.shape[1]):
+            results[f'split{fold}_test_score'] = scores[:, fold]
+        results['mean_test_score'] = scores.mean(axis=1)
+        results['std_test_score'] = scores.std(axis=1)
+        # Unexplored or failed candidates (NaN scores) rank last
+        mean_scores = np.nan_to_num(results['mean_test_score'], nan=-np.inf)
+        results['rank_test_score'] = rankdata(
+            -mean_scores, method='min').astype(np.int32)
+        return results
+
+    def predict(self, X):
+        """Predict using the best estimator found by the search."""
+        return self.best_estimator_.predict(X)
+
+    def score(self, X, y):
+        """Return score of the best estimator on the given data."""
+        return self.best_estimator_.score(X, y)
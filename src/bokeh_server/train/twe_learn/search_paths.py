@@ -0,0 +1,439 @@
+"""Evaluation paths used by the grid search to score candidates on a CV fold.
+
+A search path is a pair of functions:
+
+    -   group(candidates): Split the candidate parameter dicts into groups
+        (lists of candidate indices) that can be scored from shared work.
+
+    -   evaluate(estimator, candidates, X_train, y_train, X_test, y_test):
+        Score every candidate of one group on one fold and return a list of
+        (score, fit time, score time) tuples in the same order.
+
+The generic path fits each candidate separately.  Specialized paths, looked
+up in SEARCH_PATHS by the type of the pipeline's final estimator, exploit the
+structure of a model family to score a whole group from about one fit.  Their
+scores are those of the estimator's own score() method, so the resulting
+cv_results_ match the generic path.  The estimator may be a pipeline or a
+bare estimator.
+
+A specialized path may raise if a candidate of its group cannot be fitted;
+the group is then scored again with the generic path, where only the failing
+candidates score NaN.
+
+Functions:
+    -   group_singletons: Put every candidate in its own group.
+
+    -   fit_and_score: Generic path, fit and score each candidate.
+
+    -   group_n_estimators: Group candidates differing only in n_estimators.
+
+    -   staged_boosting: Score every n_estimators from one boosting fit.
+
+    -   warm_start_forest: Grow one forest through every n_estimators.
+
+    -   group_alpha: Group candidates differing only in alpha.
+
+    -   group_c: Group candidates differing only in C.
+
+    -   lasso_coordinate_path: Score every alpha from one warm-started path.
+
+    -   ridge_svd_path: Score every alpha from one SVD of the fold.
+
+    -   warm_start_c: Fit along increasing C, starting from the previous fit.
+
+    -   group_n_neighbors: Group candidates differing only in n_neighbors.
+
+    -   shared_neighbors: Score every n_neighbors from one neighbor search.
+"""
+
+# %% Imports
+# Standard system imports
+import time
+
+# Related third party imports
+import numpy as np
+from sklearn.base import clone, is_classifier
+from sklearn.ensemble import GradientBoostingClassifier, \
+    GradientBoostingRegressor, RandomForestClassifier, RandomForestRegressor
+from sklearn.linear_model import Lasso, lasso_path, LogisticRegression, Ridge
+from sklearn.metrics import accuracy_score, r2_score
+from sklearn.neighbors import KNeighborsClassifier, KNeighborsRegressor
+
+# Local application/library specific imports
+
+
+# %% Helper functions
+def _prepare(estimator, params):
+    """Return clone of estimator with params set and in-place scaling.
+
+    The fold arrays passed to a search path are private to the task, so the
+    scaler is allowed to transform them in place.
+    """
+    estimator = clone(estimator).set_params(**params)
+    if 'scale__copy' in estimator.get_params():
+        estimator.set_params(scale__copy=False)
+    return estimator
+
+
+def _score(model, y_true, y_pred):
+    """Return accuracy or R², the default score() of the model's type."""
+    if is_classifier(model):
+        return accuracy_score(y_true, y_pred)
+    return r2_score(y_true, y_pred)
+
+
+def _group_by(candidates, name):
+    """Group candidate indices by every parameter except the named one."""
+    groups = {}
+    for idx, params in enumerate(candidates):
+        key = tuple(sorted((k, repr(v)) for k, v in params.items()
+                           if k != name))
+        groups.setdefault(key, []).append(idx)
+    return list(groups.values())
+
+
+def _param_name(candidates, param):
+    """Return full (pipeline-prefixed) name of a parameter in candidates."""
+    for name in candidates[0]:
+        if name == param or name.endswith(f'__{param}'):
+            return name
+    return None
+
+
+def _group_param(candidates, param):
+    """Group candidates that differ only in the given parameter."""
+    name = _param_name(candidates, param)
+    if name is None:
+        return group_singletons(candidates)
+    return _group_by(candidates, name)
+
+
+def _final(pipe):
+    """Return the final estimator of a pipeline, or a bare estimator."""
+    return pipe[-1] if hasattr(pipe, 'steps') else pipe
+
+
+def _scale_fold(pipe, X_train, y_train, X_test):
+    """Fit the pipeline's preprocessing on a fold and transform both sets."""
+    if not hasattr(pipe, 'steps'):
+        return X_train, X_test
+    X_train = pipe[:-1].fit_transform(X_train, y_train)
+    return X_train, pipe[:-1].transform(X_test)
+
+
+# %% Generic path
+def group_singletons(candidates):
+    """Put every candidate in its own group."""
+    return [[idx] for idx in range(len(candidates))]
+
+
+def fit_and_score(estimator, candidates, X_train, y_train, X_test, y_test):
+    """Fit and score each candidate separately.
+
+    A candidate whose fit or score raises an exception (e.g. a penalty its
+    solver does not support) scores NaN, like GridSearchCV's default
+    error_score.  Only a single candidate may scale the fold in place.
+    """
+    results = []
+    for params in candidates:
+        model = _prepare(estimator, params) if len(candidates) == 1 \
+            else clone(estimator).set_params(**params)
+        start = time.perf_counter()
+        try:
+            model.fit(X_train, y_train)
+            fit_time = time.perf_counter() - start
+            score = model.score(X_test, y_test)
+        except Exception:   # Failed candidates score NaN
+            results.append((np.nan, time.perf_counter() - start, 0.0))
+            continue
+        results.append((score, fit_time,
+                        time.perf_counter() - start - fit_time))
+    return results
+
+
+# %% Ensemble paths
+def group_n_estimators(candidates):
+    """Group candidates that differ only in n_estimators."""
+    return _group_param(candidates, 'n_estimators')
+
+
+def staged_boosting(estimator, candidates, X_train, y_train, X_test, y_test):
+    """Score every n_estimators of a gradient boosting group from one fit.
+
+    A boosted model with n trees is the first n stages of a larger model, so
+    the largest candidate is fitted once and staged_predict() yields the
+    predictions of every smaller one.  Fit time is attributed to candidates
+    in proportion to their number of stages.
+    """
+    name = _param_name(candidates, 'n_estimators')
+    if name is None:
+        return fit_and_score(estimator, candidates, X_train, y_train, X_test,
+                             y_test)
+    n_stages = [params[name] for params in candidates]
+    largest = candidates[int(np.argmax(n_stages))]
+    pipe = _prepare(estimator, largest)
+    start = time.perf_counter()
+    pipe.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+    model = _final(pipe)
+    if hasattr(pipe, 'steps'):
+        X_test = pipe[:-1].transform(X_test)
+    wanted = set(n_stages)
+    scores = {}
+    for stage, y_pred in enumerate(model.staged_predict(X_test), start=1):
+        if stage in wanted:
+            scores[stage] = _score(model, y_test, y_pred)
+    score_time = (time.perf_counter() - start - fit_time) / len(candidates)
+    return [(scores[n], fit_time * n / max(n_stages), score_time)
+            for n in n_stages]
+
+
+def warm_start_forest(estimator, candidates, X_train, y_train, X_test,
+                      y_test):
+    """Grow one random forest through every n_estimators of a group.
+
+    The forest is fitted with warm_start, adding trees up to each candidate's
+    n_estimators in increasing order; with a fixed random_state, which the
+    Train app sets, the trees are the same as those of a forest fitted at
+    once.  The forest's prediction is an average over trees, so running sums
+    of the new trees' predictions give each candidate's predictions without
+    re-predicting earlier trees.
+    """
+    name = _param_name(candidates, 'n_estimators')
+    if name is None:
+        return fit_and_score(estimator, candidates, X_train, y_train, X_test,
+                             y_test)
+    n_trees = [params[name] for params in candidates]
+    pipe = _prepare(estimator, candidates[int(np.argmin(n_trees))])
+    model = _final(pipe).set_params(warm_start=True)
+    # Scale once; the forest is then grown on the scaled fold
+    start = time.perf_counter()
+    X_train, X_test = _scale_fold(pipe, X_train, y_train, X_test)
+    scale_time = time.perf_counter() - start
+    X_test = X_test.astype(np.float32)
+    classifier = is_classifier(model)
+    scores, fit_times, score_times = {}, {}, {}
+    prediction_sum, grown = 0, 0
+    for n in sorted(set(n_trees)):
+        start = time.perf_counter()
+        model.set_params(n_estimators=n)
+        model.fit(X_train, y_train)
+        fit_times[n] = time.perf_counter() - start
+        start = time.perf_counter()
+        for tree in model.estimators_[grown:]:
+            prediction_sum = prediction_sum + (
+                tree.predict_proba(X_test) if classifier
+                else tree.predict(X_test))
+        grown = n
+        if classifier:
+            y_pred = model.classes_.take(np.argmax(prediction_sum, axis=1))
+        else:
+            y_pred = prediction_sum / n
+        scores[n] = _score(model, y_test, y_pred)
+        score_times[n] = time.perf_counter() - start
+    # Warm start fits are cumulative; report the cost of reaching each size
+    sizes = sorted(fit_times)
+    cumulative = scale_time + np.cumsum([fit_times[n] for n in sizes])
+    fit_times = dict(zip(sizes, cumulative))
+    return [(scores[n], fit_times[n], score_times[n]) for n in n_trees]
+
+
+# %% Linear model paths
+def group_alpha(candidates):
+    """Group candidates that differ only in alpha."""
+    return _group_param(candidates, 'alpha')
+
+
+def group_c(candidates):
+    """Group candidates that differ only in C."""
+    return _group_param(candidates, 'C')
+
+
+def _center(model, X_train, y_train, X_test):
+    """Center a fold for a linear model with an intercept.
+
+    Returns centered X_train, y_train, X_test and the intercept offset that
+    is added back to the predictions.
+    """
+    if not model.fit_intercept:
+        return X_train, y_train, X_test, 0.0
+    X_mean, y_mean = X_train.mean(axis=0), y_train.mean()
+    return X_train - X_mean, y_train - y_mean, X_test - X_mean, y_mean
+
+
+def lasso_coordinate_path(estimator, candidates, X_train, y_train, X_test,
+                          y_test):
+    """Score every alpha of a Lasso group from one coordinate-descent path.
+
+    lasso_path() solves the alphas from largest to smallest, starting each
+    solve from the previous coefficients, which is much cheaper than fitting
+    every alpha from zero.  Scores agree with separate fits up to the
+    solver's tolerance.
+    """
+    name = _param_name(candidates, 'alpha')
+    if name is None:
+        return fit_and_score(estimator, candidates, X_train, y_train, X_test,
+                             y_test)
+    alphas = [params[name] for params in candidates]
+    pipe = _prepare(estimator, candidates[0])
+    model = _final(pipe)
+    start = time.perf_counter()
+    X_train, X_test = _scale_fold(pipe, X_train, y_train, X_test)
+    X_train, y_centered, X_test, offset = _center(model, X_train,
+                                                  y_train.astype(np.float64),
+                                                  X_test)
+    path_alphas, coefs, _ = lasso_path(X_train, y_centered, alphas=alphas,
+                                       max_iter=model.max_iter, tol=model.tol)
+    fit_time = (time.perf_counter() - start) / len(candidates)
+    start = time.perf_counter()
+    y_pred = X_test @ coefs + offset  # Predictions of every alpha at once
+    column = {alpha: idx for idx, alpha in enumerate(path_alphas)}
+    scores = [_score(model, y_test, y_pred[:, column[alpha]])
+              for alpha in alphas]
+    score_time = (time.perf_counter() - start) / len(candidates)
+    return [(score, fit_time, score_time) for score in scores]
+
+
+def ridge_svd_path(estimator, candidates, X_train, y_train, X_test, y_test):
+    """Score every alpha of a Ridge group from one SVD of the fold.
+
+    With X = U S V', the ridge coefficients for any alpha are
+    V diag(s / (s² + alpha)) U'y, so after one SVD each alpha costs a few
+    small matrix products.  This is the closed-form solution computed by
+    Ridge's default solver.
+    """
+    name = _param_name(candidates, 'alpha')
+    if name is None:
+        return fit_and_score(estimator, candidates, X_train, y_train, X_test,
+                             y_test)
+    alphas = np.array([params[name] for params in candidates], dtype=float)
+    pipe = _prepare(estimator, candidates[0])
+    model = _final(pipe)
+    start = time.perf_counter()
+    X_train, X_test = _scale_fold(pipe, X_train, y_train, X_test)
+    X_train, y_centered, X_test, offset = _center(model, X_train,
+                                                  y_train.astype(np.float64),
+                                                  X_test)
+    U, s, Vt = np.linalg.svd(X_train, full_matrices=False)
+    Uty = U.T @ y_centered
+    shrink = s[:, None] / (s[:, None]**2 + alphas[None, :])
+    coefs = Vt.T @ (shrink * Uty[:, None])  # One column per alpha
+    fit_time = (time.perf_counter() - start) / len(candidates)
+    start = time.perf_counter()
+    y_pred = X_test @ coefs + offset
+    scores = [_score(model, y_test, y_pred[:, idx])
+              for idx in range(len(alphas))]
+    score_time = (time.perf_counter() - start) / len(candidates)
+    return [(score, fit_time, score_time) for score in scores]
+
+
+def warm_start_c(estimator, candidates, X_train, y_train, X_test, y_test):
+    """Fit a Logistic Regression group along increasing C with warm starts.
+
+    The fold is scaled once, and each fit starts from the coefficients of
+    the previous (more strongly regularized) C.  Scores agree with separate
+    fits up to the solver's tolerance.
+    """
+    name = _param_name(candidates, 'C')
+    if name is None:
+        return fit_and_score(estimator, candidates, X_train, y_train, X_test,
+                             y_test)
+    c_values = [params[name] for params in candidates]
+    pipe = _prepare(estimator, candidates[0])
+    model = _final(pipe)
+    model.set_params(warm_start=True)
+    start = time.perf_counter()
+    X_train, X_test = _scale_fold(pipe, X_train, y_train, X_test)
+    scale_time = (time.perf_counter() - start) / len(candidates)
+    results = {}
+    for c in sorted(set(c_values)):
+        start = time.perf_counter()
+        model.set_params(C=c)
+        model.fit(X_train, y_train)
+        fit_time = time.perf_counter() - start
+        score = model.score(X_test, y_test)
+        results[c] = (score, scale_time + fit_time,
+                      time.perf_counter() - start - fit_time)
+    return [results[c] for c in c_values]
+
+
+# %% Nearest neighbors path
+def group_n_neighbors(candidates):
+    """Group candidates that differ only in n_neighbors."""
+    return _group_param(candidates, 'n_neighbors')
+
+
+def shared_neighbors(estimator, candidates, X_train, y_train, X_test,
+                     y_test):
+    """Score every n_neighbors of a K-Nearest Neighbors group.
+
+    The k_max nearest neighbors of the test rows are found once; the k
+    nearest for any smaller k are the first k columns of that graph.  Votes
+    (classification) or target sums (regression) are accumulated one
+    neighbor column at a time, so every k is scored with vectorized updates
+    instead of a new neighbor search.  Only uniform weights are supported;
+    other weightings fall back to separate fits.
+
+    Test rows whose k-th and (k+1)-th neighbors are at the same distance
+    (e.g. duplicate training rows) may have other k nearest neighbors in a
+    search for k alone, so they are predicted by a model fitted with k.
+    """
+    name = _param_name(candidates, 'n_neighbors')
+    pipe = _prepare(estimator, candidates[0])
+    if name is None or _final(pipe).weights != 'uniform':
+        return fit_and_score(estimator, candidates, X_train, y_train, X_test,
+                             y_test)
+    ks = [params[name] for params in candidates]
+    pipe = _prepare(estimator, candidates[int(np.argmax(ks))])
+    model = _final(pipe)
+    start = time.perf_counter()
+    X_train, X_test = _scale_fold(pipe, X_train, y_train, X_test)
+    model.fit(X_train, y_train)
+    fit_time = (time.perf_counter() - start) / len(candidates)
+    start = time.perf_counter()
+    distances, neighbors = model.kneighbors(X_test)
+    classifier = is_classifier(model)
+    if classifier:  # Classes sorted like the classifier's classes_
+        classes, y_encoded = np.unique(y_train, return_inverse=True)
+        neighbor_targets = y_encoded[neighbors]
+        votes = np.zeros((len(X_test), len(classes)))
+        test_rows = np.arange(len(X_test))
+    else:
+        neighbor_targets = np.asarray(y_train, dtype=np.float64)[neighbors]
+        target_sum = np.zeros(len(X_test))
+    wanted = set(ks)
+    scores = {}
+    for column in range(neighbors.shape[1]):
+        k = column + 1
+        if classifier:
+            votes[test_rows, neighbor_targets[:, column]] += 1
+        else:
+            target_sum += neighbor_targets[:, column]
+        if k in wanted:
+            # argmax picks the smallest class among ties, like the
+            # classifier's majority vote
+            y_pred = classes[np.argmax(votes, axis=1)] if classifier \
+                else target_sum / k
+            if k < neighbors.shape[1]:
+                tied = np.isclose(distances[:, k - 1], distances[:, k],
+                                  rtol=1e-9, atol=0)
+                if tied.any():
+                    y_pred[tied] = clone(model).set_params(n_neighbors=k) \
+                        .fit(X_train, y_train).predict(X_test[tied])
+            scores[k] = _score(model, y_test, y_pred)
+    score_time = (time.perf_counter() - start) / len(candidates)
+    return [(scores[k], fit_time, score_time) for k in ks]
+
+
+# %% Registry
+SEARCH_PATHS = {
+    GradientBoostingClassifier: (group_n_estimators, staged_boosting),
+    GradientBoostingRegressor: (group_n_estimators, staged_boosting),
+    RandomForestClassifier: (group_n_estimators, warm_start_forest),
+    RandomForestRegressor: (group_n_estimators, warm_start_forest),
+    Lasso: (group_alpha, lasso_coordinate_path),
+    Ridge: (group_alpha, ridge_svd_path),
+    LogisticRegression: (group_c, warm_start_c),
+    KNeighborsClassifier: (group_n_neighbors, shared_neighbors),
+    KNeighborsRegressor: (group_n_neighbors, shared_neighbors),
+}
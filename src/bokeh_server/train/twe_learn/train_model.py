@@ -1,93 +1,215 @@
 """Train model on data according to provided hyperparameters.
 
-Performs grid search and saves grid search estimator and settings to volume.
+Performs grid search on the persistent worker pool and saves grid search
+estimator and settings to volume.
+
+Functions:
+    -   select_model: Return estimator class of a model name in the Train UI.
+
+    -   build_pipeline: Return scaling and model pipeline of a model.
+
+    -   search_summary: Return how much of the grid a search explored.
+
+    -   save_training: Save estimator, search, data, and results to volume.
+
+    -   train_test_rows: Return train and test row indices of the split.
+
+    -   train_model: Train model and save estimator to volume.
 """
 
 # %% Imports
 # Standard system imports
+from functools import partial
 from pathlib import Path
 
 # Related third party imports
-import joblib
 import numpy as np
 # Import models
+from sklearn.experimental import enable_hist_gradient_boosting  # noqa: F401
 from sklearn.ensemble import GradientBoostingClassifier, \
-    GradientBoostingRegressor, RandomForestClassifier, RandomForestRegressor
+    GradientBoostingRegressor, HistGradientBoostingClassifier, \
+    HistGradientBoostingRegressor, RandomForestClassifier, \
+    RandomForestRegressor
 from sklearn.linear_model import LogisticRegression, LinearRegression, Lasso, \
-    Ridge
+    PassiveAggressiveClassifier, PassiveAggressiveRegressor, Ridge, \
+    SGDClassifier, SGDRegressor
 from sklearn.naive_bayes import GaussianNB
 from sklearn.neighbors import KNeighborsClassifier, KNeighborsRegressor
 from sklearn.svm import LinearSVC, SVC, SVR, LinearSVR
 # Preprocessing, model selection, pipeline, metrics
+from sklearn.kernel_approximation import Nystroem
 from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split, GridSearchCV
+from sklearn.model_selection import train_test_split
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import accuracy_score
 
 # Local application/library specific imports
+from bokeh_server.train.twe_learn.artifacts import save_run, split_data
+from bokeh_server.train.twe_learn.cost_model import HISTORY_PATH, \
+    record_run
+from bokeh_server.train.twe_learn.evaluation import evaluate, predictions
+from bokeh_server.train.twe_learn.importance import permutation_importance
+from bokeh_server.train.twe_learn.search import GridSearch
+
+
+# %% Globals
+DATA_PATH = Path('src/bokeh_server/data')   # Artifacts read by Results app
+APPROX_KERNEL_MODELS = ['SVC (approx. rbf kernel)', 'SVR (approx. rbf kernel)']
+N_COMPONENTS = 300  # Default number of components of the kernel feature map
+HGB_MAX_ITER = 500  # Upper bound on trees; early stopping usually ends sooner
 
 
 # %% Train model
-def train_model(X, y, training_settings):
-    """Train model and save estimator to volume."""
-    # Model selection
-    if training_settings['model'] == 'Gradient Boosting CLF':
+def select_model(model_name):
+    """Return estimator class corresponding to model name shown in Train UI."""
+    if model_name == 'Gradient Boosting CLF':
         model = GradientBoostingClassifier
-    elif training_settings['model'] == 'Gradient Boosting REG':
+    elif model_name == 'Gradient Boosting REG':
         model = GradientBoostingRegressor
-    elif training_settings['model'] == 'K-Nearest Neighbors CLF':
+    elif model_name == 'Hist Gradient Boosting CLF':
+        model = partial(HistGradientBoostingClassifier, early_stopping=True,
+                        max_iter=HGB_MAX_ITER, random_state=214)
+    elif model_name == 'Hist Gradient Boosting REG':
+        model = partial(HistGradientBoostingRegressor, early_stopping=True,
+                        max_iter=HGB_MAX_ITER, random_state=214)
+    elif model_name == 'K-Nearest Neighbors CLF':
         model = KNeighborsClassifier
-    elif training_settings['model'] == 'K-Nearest Neighbors REG':
+    elif model_name == 'K-Nearest Neighbors REG':
         model = KNeighborsRegressor
-    elif training_settings['model'] == 'Logistic Regression':
+    elif model_name == 'Logistic Regression':
         model = LogisticRegression
-    elif training_settings['model'] == 'Linear Regression':
+    elif model_name == 'Linear Regression':
         model = LinearRegression
-    elif training_settings['model'] == 'Lasso Regression':
+    elif model_name == 'Lasso Regression':
         model = Lasso
-    elif training_settings['model'] == 'Ridge Regression':
+    elif model_name == 'Ridge Regression':
         model = Ridge
-    elif training_settings['model'] == 'Naive Bayes':
+    elif model_name == 'Naive Bayes':
         model = GaussianNB
-    elif training_settings['model'] == 'Random Forest CLF':
-        model = RandomForestClassifier
-    elif training_settings['model'] == 'Random Forest REG':
-        model = RandomForestRegressor
-    elif training_settings['model'] == 'SVC (linear kernel)':
+    elif model_name == 'Passive Aggressive CLF':
+        model = PassiveAggressiveClassifier
+    elif model_name == 'Passive Aggressive REG':
+        model = PassiveAggressiveRegressor
+    elif model_name == 'Random Forest CLF':
+        model = partial(RandomForestClassifier, random_state=214)
+    elif model_name == 'Random Forest REG':
+        model = partial(RandomForestRegressor, random_state=214)
+    elif model_name == 'SGD Classifier':
+        model = SGDClassifier
+    elif model_name == 'SGD Regressor':
+        model = SGDRegressor
+    elif model_name == 'SVC (linear kernel)':
         model = LinearSVC
-    elif training_settings['model'] == 'SVC (rbf kernel)':
+    elif model_name == 'SVC (rbf kernel)':
         model = SVC
-    elif training_settings['model'] == 'SVR (linear kernel)':
+    elif model_name == 'SVR (linear kernel)':
         model = LinearSVR
-    elif training_settings['model'] == 'SVR (rbf kernel)':
+    elif model_name == 'SVR (rbf kernel)':
         model = SVR
+    elif model_name == 'SVC (approx. rbf kernel)':
+        model = LinearSVC
+    elif model_name == 'SVR (approx. rbf kernel)':
+        # Primal solver is much faster when rows outnumber kernel components
+        model = partial(LinearSVR, loss='squared_epsilon_insensitive',
+                        dual=False)
+    else:
+        raise ValueError(f'Unknown model: {model_name}')
+    return model
+
+
+def build_pipeline(training_settings):
+    """Return scaling and model pipeline for the selected model.
+
+    Approximate-kernel models insert a Nystroem feature map between the scaler
+    and the linear solver.  Its default gamma of 1 / n_features equals the
+    gamma='scale' of SVC and SVR on standardized features.
+    """
+    model = select_model(training_settings['model'])
+    estimators = [('scale', StandardScaler())]
+    if training_settings['model'] in APPROX_KERNEL_MODELS:
+        n_components = training_settings.get('n_components', N_COMPONENTS)
+        estimators.append(('kernel', Nystroem(n_components=n_components,
+                                              random_state=214)))
+    estimators.append(('model', model()))
+    return Pipeline(estimators)
+
+
+def search_summary(search):
+    """Return how much of the candidate grid a fitted search explored."""
+    return {'candidates': search.n_candidates_,
+            'explored': search.n_explored_,
+            'truncated': search.truncated_,
+            'cv_score': float(search.best_score_),
+            'search_time': search.search_time_}
+
+
+def save_training(grid_search, training_data, results, training_settings,
+                  directory=DATA_PATH):
+    """Save best estimator, search metadata, data, and results to volume.
+
+    training_data holds the entries returned by artifacts.split_data() or
+    artifacts.sample_data(), and results those of evaluation.evaluate().
+    """
+    save_run(grid_search, {**training_data,
+                           'training_settings': training_settings,
+                           'search_summary': search_summary(grid_search)},
+             directory, results)
+
+
+def train_test_rows(n_rows, train_size):
+    """Return train and test row indices of the split used for training."""
+    return train_test_split(np.arange(n_rows), train_size=train_size,
+                            random_state=214)
+
+
+def train_model(X, y, training_settings, directory=DATA_PATH,
+                history_path=HISTORY_PATH):
+    """Train model and save estimator to volume.
+
+    X contains every numeric feature of the dataset; the features used for
+    training are listed in training_settings.  An optional time_budget
+    setting (seconds) bounds the grid search, and an optional data setting
+    is the file X and y were read from if not the webapp's eda_data pickle.
+
+    Returns the best parameters, train and test scores, and a summary of the
+    search: how much of the grid was explored before the time budget ran
+    out, the best CV score, and the search time.  Artifacts are saved in
+    directory, and the search is recorded in the run history at
+    history_path.
+    """
     # Define hyperparameters used for GridSearch
     param_grid = {f'model__{x[0]}': x[1] for x in training_settings['params']}
     # Define pipeline
-    estimators = [('scale', StandardScaler()),
-                  ('model', model())
-                  ]
-    pipe = Pipeline(estimators)
-    # Split data into train and test sets
-    train_size = training_settings['train_split']
-    X_train, X_test, y_train, y_test = train_test_split(X, y,
-                                                        train_size=train_size,
-                                                        random_state=214)
-    # Perform grid search
-    grid_search = GridSearchCV(pipe, param_grid=param_grid, n_jobs=-1)
-    grid_search.fit(X_train, y_train)
-    # Save model and data to volume using joblib
-    model_filename = Path('src/bokeh_server/data/model')
-    data_filename = Path('src/bokeh_server/data/train_data')
-    with open(model_filename, 'wb') as model_file:
-        joblib.dump(grid_search, model_file)
-    with open(data_filename, 'wb') as data_file:
-        joblib.dump({'X_train': X_train,
-                     'X_test': X_test,
-                     'y_train': y_train,
-                     'y_test': y_test,
-                     'training_settings': training_settings
-                     }, data_file)
-
-    return grid_search.best_params_, grid_search.score(X_train, y_train), \
-        grid_search.score(X_test, y_test)
+    pipe = build_pipeline(training_settings)
+    # Split row indices into train and test sets; X holds every feature and
+    # the selected features are passed to the grid search by column index
+    columns = [X.columns.get_loc(x) for x in training_settings['features']]
+    train_rows, test_rows = train_test_rows(len(X),
+                                            training_settings['train_split'])
+    X_train = X.iloc[train_rows, columns]
+    X_test = X.iloc[test_rows, columns]
+    y_train = y.iloc[train_rows]
+    y_test = y.iloc[test_rows]
+    # Perform grid search on the shared full matrix
+    grid_search = GridSearch(
+        pipe, param_grid=param_grid,
+        time_budget=training_settings.get('time_budget'))
+    grid_search.fit(X, y, rows=train_rows, columns=columns)
+    # Calibrate the cost model shown in the Train app with this run
+    record_run(training_settings['model'], grid_search, len(train_rows),
+               len(columns), history_path)
+    # Predictions and metrics are computed once for the Results app
+    results = evaluate(grid_search.best_estimator_, X_train, X_test, y_train,
+                       y_test)
+    results['importance'] = permutation_importance(
+        grid_search.best_estimator_, X, y, test_rows, columns,
+        predictions(results['test']))
+    # Save model, and split indices instead of copies of the data, to volume
+    save_training(grid_search,
+                  split_data(X, y, training_settings['features'],
+                             train_rows, test_rows,
+                             training_settings.get('data')),
+                  results, training_settings, directory)
+
+    return grid_search.best_params_, results['train']['score'], \
+        results['test']['score'], search_summary(grid_search)
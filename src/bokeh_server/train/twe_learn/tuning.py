@@ -0,0 +1,116 @@
+"""Tuning diagnostics of a grid search read from its saved cv_results_.
+
+The mean and standard deviation of the CV score and the mean fit time of
+every candidate are scattered into arrays with one axis per hyperparameter,
+so validation curves and heatmaps are slices of those arrays and no model is
+fitted again.  Candidates left unexplored by a time budget keep NaN values.
+
+Slices are taken through the best candidate: a validation curve varies one
+hyperparameter with the others at their best values, and a heatmap varies
+two.
+
+Functions:
+    -   load_search: Return the search metadata saved with a run.
+
+    -   search_grid: Return the cv_results_ of a search as parameter grids.
+
+    -   validation_curve: Return score and fit time along one parameter.
+
+    -   heatmap: Return a grid sliced along two parameters.
+"""
+
+# %% Imports
+# Standard system imports
+
+# Related third party imports
+import joblib
+import numpy as np
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.artifacts import SEARCH_ATTRIBUTES
+from utility.model_cache import cached_load
+
+
+# %% Grids
+def load_search(directory):
+    """Return the search metadata saved with the run in directory.
+
+    Runs saved before the metadata was stored on its own hold the whole
+    search in the model file, which is read without the model cache since
+    the cache holds its best estimator under the same path.
+    """
+    if (directory / 'search').exists():
+        return cached_load(directory / 'search')
+    search = joblib.load(directory / 'model')
+    return {name: getattr(search, name) for name in SEARCH_ATTRIBUTES
+            if hasattr(search, name)}
+
+
+def _codes(values):
+    """Return distinct values in order of appearance and each value's code."""
+    distinct = {}
+    codes = np.array([distinct.setdefault(repr(x), len(distinct))
+                      for x in values])
+    names = {code: x for x, code in zip(values, codes)}
+    return [names[code] for code in range(len(distinct))], codes
+
+
+def search_grid(cv_results):
+    """Return the cv_results_ of a search as arrays indexed by parameters.
+
+    Returns the parameter names, their values, the mean and std of the CV
+    score and the mean fit time shaped (n_values of each parameter), and the
+    grid index of the best candidate.  Returns None if no hyperparameter was
+    searched.
+    """
+    names = sorted(key[len('param_'):] for key in cv_results
+                   if key.startswith('param_'))
+    if not names:
+        return None
+    values, codes = zip(*[_codes(list(cv_results[f'param_{name}']))
+                          for name in names])
+    shape = tuple(len(x) for x in values)
+    flat = np.ravel_multi_index(codes, shape)
+    grid = {'names': names, 'values': list(values)}
+    for key, result in (('mean_score', 'mean_test_score'),
+                        ('std_score', 'std_test_score'),
+                        ('fit_time', 'mean_fit_time')):
+        grid[key] = np.full(shape, np.nan)
+        grid[key].flat[flat] = cv_results[result]
+    if np.isnan(grid['mean_score']).all():
+        grid['best'] = (0,) * len(names)
+    else:
+        grid['best'] = np.unravel_index(np.nanargmax(grid['mean_score']),
+                                        shape)
+    return grid
+
+
+# %% Slices
+def _slice(grid, key, names):
+    """Return grid[key] along names, other parameters at the best values."""
+    index = tuple(slice(None) if name in names else grid['best'][axis]
+                  for axis, name in enumerate(grid['names']))
+    return grid[key][index]
+
+
+def validation_curve(grid, name):
+    """Return values, mean and std of score, and fit time along a parameter.
+
+    The other parameters are held at the values of the best candidate.
+    """
+    axis = grid['names'].index(name)
+    return (grid['values'][axis], _slice(grid, 'mean_score', [name]),
+            _slice(grid, 'std_score', [name]),
+            _slice(grid, 'fit_time', [name]))
+
+
+def heatmap(grid, x_name, y_name, key='mean_score'):
+    """Return grid[key] indexed [y value, x value] along two parameters.
+
+    The other parameters are held at the values of the best candidate.
+    """
+    values = _slice(grid, key, [x_name, y_name])
+    # The remaining axes are in the order of grid['names']
+    if grid['names'].index(x_name) < grid['names'].index(y_name):
+        values = values.T
+    return values
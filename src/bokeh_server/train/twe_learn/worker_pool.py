@@ -0,0 +1,208 @@
+"""Persistent pool of worker processes shared by every training run.
+
+The pool is owned by the Bokeh server process: it is started once (see the
+train app's server_lifecycle.py) and reused by all subsequent training runs.
+Each worker imports the scikit-learn estimators when it starts, so a grid
+search never pays for process startup or module imports.
+
+Training data is handed to the workers through memory-mapped .npy files.  The
+full feature matrix is written once per dataset version (identified by its
+fingerprint), and each worker maps it once and keeps it for later runs on the
+same data.  The rows, features, and CV folds used by a search are published
+as small index arrays, so the workers slice the shared matrix themselves and
+no task carries a copy of the data.
+
+A pool whose worker died abruptly (e.g. killed for running out of memory) is
+broken: its pending tasks fail with BrokenProcessPool and it accepts no new
+ones.  get_pool() then starts a new pool, so only the runs in flight fail.
+
+Functions:
+    -   get_pool: Return the shared process pool, starting it if necessary.
+
+    -   pool_size: Return the number of worker processes of the pool.
+
+    -   shutdown_pool: Stop the worker processes and delete published data.
+
+    -   publish_dataset: Write arrays for the workers once per dataset version.
+
+    -   publish_split: Write the row, column, and fold indices of a search.
+
+    -   load_dataset: Return the memory-mapped arrays of a published dataset.
+
+    -   load_split: Return the memory-mapped indices of a published split.
+"""
+
+# %% Imports
+# Standard system imports
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import importlib
+import multiprocessing
+import os
+from pathlib import Path
+import tempfile
+import threading
+
+# Related third party imports
+import joblib
+import numpy as np
+
+# Local application/library specific imports
+
+
+# %% Globals
+POOL_DIR = Path(tempfile.gettempdir()) / 'twe_pool'  # Shared .npy files
+N_WORKERS = os.cpu_count() or 1     # Same core count as n_jobs=-1
+MAX_PUBLISHED = 8                   # Published array sets kept on disk
+_pool = None        # Process pool owned by the Bokeh server process
+_n_workers = None   # Size set by get_pool(), else N_WORKERS
+_lock = threading.Lock()    # Concurrent searches share the pool and files
+_published = []     # Keys of arrays written by this process, oldest first
+_loaded = {}        # Worker-side cache of memory-mapped arrays
+
+
+# %% Pool management
+def _init_worker():
+    """Import estimators and limit native threads in a new worker process."""
+    importlib.import_module('bokeh_server.train.twe_learn.train_model')
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(limits=1)  # One BLAS/OpenMP thread per worker process
+
+
+def _warm_up():
+    """No-op task used to start the worker processes ahead of time."""
+    return os.getpid()
+
+
+def get_pool(n_workers=None):
+    """Return the shared process pool, starting it if necessary.
+
+    Worker processes are spawned rather than forked so that they do not
+    inherit the threads of the Bokeh server's event loop.  A broken pool,
+    which refuses new tasks, is replaced.  n_workers sets the size of the
+    pools started until shutdown_pool() (default: N_WORKERS).
+    """
+    global _pool, _n_workers
+    with _lock:
+        if n_workers is not None:
+            _n_workers = n_workers
+        if _pool is not None:
+            try:
+                _pool.submit(_warm_up)
+            except BrokenProcessPool:
+                _pool.shutdown(wait=False)
+                _pool = None
+        if _pool is None:
+            POOL_DIR.mkdir(parents=True, exist_ok=True)
+            context = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(max_workers=pool_size(),
+                                        mp_context=context,
+                                        initializer=_init_worker)
+            for _ in range(pool_size()):  # Start workers before first search
+                _pool.submit(_warm_up)
+        return _pool
+
+
+def pool_size():
+    """Return the number of worker processes of the shared pool."""
+    return _n_workers or N_WORKERS
+
+
+def shutdown_pool():
+    """Stop the worker processes and delete the published datasets."""
+    global _pool, _n_workers
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+        _n_workers = None
+        while _published:
+            _remove_arrays(_published.pop())
+
+
+# %% Shared arrays
+def _array_path(key, name):
+    """Return path of the .npy file holding one published array."""
+    return POOL_DIR / f'{key}_{name}.npy'
+
+
+def _save_array(path, array):
+    """Write array to .npy file atomically so workers never see a partial."""
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as npy_file:
+        np.save(npy_file, array)
+    os.replace(tmp_path, path)
+
+
+def _remove_arrays(key):
+    """Delete the files of a published set of arrays."""
+    for path in POOL_DIR.glob(f'{key}_*.npy'):
+        path.unlink()
+
+
+def _publish(**arrays):
+    """Write named arrays for the worker processes and return their key.
+
+    The key is a fingerprint of the arrays, so arrays that have already been
+    published are not written again.
+    """
+    key = joblib.hash(arrays)
+    paths = [_array_path(key, name) for name in arrays]
+    with _lock:
+        if key in _published and all(path.exists() for path in paths):
+            _published.remove(key)
+        else:
+            POOL_DIR.mkdir(parents=True, exist_ok=True)
+            for path, array in zip(paths, arrays.values()):
+                _save_array(path, array)
+        _published.append(key)
+        while len(_published) > MAX_PUBLISHED:  # Discard the oldest version
+            _remove_arrays(_published.pop(0))
+    return key
+
+
+def _load(key, *names):
+    """Return memory-mapped arrays published under key (worker side)."""
+    if key not in _loaded:
+        _loaded[key] = tuple(np.load(_array_path(key, name), mmap_mode='r')
+                             for name in names)
+        while len(_loaded) > MAX_PUBLISHED:
+            del _loaded[next(iter(_loaded))]
+    return _loaded[key]
+
+
+def publish_dataset(X, y):
+    """Write the full X and y for the worker processes and return their key.
+
+    Called once per dataset version: the features and rows used by a search
+    are selected by reference with publish_split().  Object arrays (e.g.
+    string class labels) are converted to fixed-width strings because they
+    cannot be memory-mapped.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    if y.dtype == object:
+        y = y.astype(str)
+    return _publish(X=X, y=y)
+
+
+def publish_split(rows, columns, test_fold):
+    """Write the row and column indices of a training split and its CV folds.
+
+    test_fold holds, for every training row, the number of the CV fold in
+    which that row is used for testing.  Tasks then refer to a fold by number
+    instead of carrying its index arrays.
+    """
+    return _publish(rows=np.asarray(rows, dtype=np.intp),
+                    columns=np.asarray(columns, dtype=np.intp),
+                    test_fold=np.asarray(test_fold, dtype=np.int8))
+
+
+def load_dataset(key):
+    """Return memory-mapped X and y of a published dataset."""
+    return _load(key, 'X', 'y')
+
+
+def load_split(key):
+    """Return memory-mapped rows, columns, and test folds of a split."""
+    return _load(key, 'rows', 'columns', 'test_fold')
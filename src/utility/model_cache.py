@@ -0,0 +1,99 @@
+"""Process-wide cache of deserialized model and training artifacts.
+
+Every Bokeh session (and any prediction endpoint) of a process loads the
+artifacts of a trained model through the same cache, so only the first
+session after training pays for deserializing them.  Entries are keyed by
+the resolved path, modification time, and size of the file, so an artifact
+rewritten by a new training run is loaded again and its stale entry dropped.
+Memory is bounded by evicting least recently used entries once the total
+size of the cached files exceeds a budget (TWE_MODEL_CACHE_MB, 512 MB by
+default).  Compressed files count with their size on disk, so the budget is
+approximate for them.
+
+Cached objects are shared between sessions and must not be modified.
+
+Classes:
+    -   ModelCache: Memory-bounded LRU cache of objects loaded from files.
+
+Functions:
+    -   cached_load: Return object loaded from a file through the shared cache.
+"""
+
+# %% Imports
+# Standard system imports
+from collections import OrderedDict
+import os
+from pathlib import Path
+import threading
+
+# Related third party imports
+import joblib
+
+# Local application/library specific imports
+
+
+# %% Globals
+MAX_CACHE_BYTES = int(os.environ.get('TWE_MODEL_CACHE_MB', 512)) * 2**20
+
+
+# %% Model cache
+class ModelCache:
+    """Memory-bounded LRU cache of objects loaded from files."""
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        """Start with an empty cache holding at most max_bytes of files."""
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # key: (object, size), oldest first
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path, loader=joblib.load):
+        """Return the object in a file, loading it with loader on a miss.
+
+        The loader is called outside the lock, so sessions loading different
+        files do not wait on each other.  The most recently used entry is
+        always kept, even if it alone exceeds the budget.
+        """
+        path = Path(path).resolve()
+        stat = path.stat()
+        key = (str(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        obj = loader(path)
+        with self._lock:
+            # Drop entries of older versions of the file
+            for old_key in [x for x in self._entries
+                            if x[0] == key[0] and x != key]:
+                self._bytes -= self._entries.pop(old_key)[1]
+            if key not in self._entries:
+                self._entries[key] = (obj, stat.st_size)
+                self._bytes += stat.st_size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._bytes -= self._entries.popitem(last=False)[1][1]
+        return obj
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def info(self):
+        """Return number of entries, cached bytes, hits, and misses."""
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+model_cache = ModelCache()  # Shared by every session of the process
+
+
+def cached_load(path, loader=joblib.load):
+    """Return object loaded from a file through the process-wide cache."""
+    return model_cache.get(path, loader)
@@ -0,0 +1,58 @@
+"""Test publishing training runs and the deletion of replaced runs."""
+
+# %% Imports
+# Standard system imports
+import os
+import time
+from types import SimpleNamespace
+
+# Related third party imports
+import joblib
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.artifacts import KEEP_RUNS, run_directory, \
+    RUN_GRACE_HOURS, save_run
+
+
+# %% Helper functions
+def save(directory, value):
+    """Save a run whose model is value and return its run directory."""
+    save_run(SimpleNamespace(best_estimator_=value), {}, directory)
+    return run_directory(directory)
+
+
+def age(run, hours):
+    """Set the modification time of a run directory to hours ago."""
+    mtime = time.time() - hours * 3600
+    os.utime(run, (mtime, mtime))
+
+
+# %% Run publishing unit tests
+def test_current_run(tmp_path):
+    """Test that the artifact names read the last published run."""
+    save(tmp_path, 'first')
+    run = save(tmp_path, 'second')
+    assert joblib.load(tmp_path / 'model') == 'second'
+    assert run == (tmp_path / 'current').resolve()
+
+
+def test_replaced_runs_kept_while_used(tmp_path):
+    """Test that old runs are only deleted once unused for the grace time."""
+    runs = [save(tmp_path, x) for x in range(KEEP_RUNS + 2)]
+    assert sorted((tmp_path / 'runs').iterdir()) == runs
+    age(runs[0], RUN_GRACE_HOURS + 1)
+    age(runs[1], RUN_GRACE_HOURS - 1)
+    runs.append(save(tmp_path, 'last'))
+    assert sorted((tmp_path / 'runs').iterdir()) == runs[1:]
+    age(runs[1], RUN_GRACE_HOURS + 1)
+    age(runs[2], RUN_GRACE_HOURS + 1)
+    runs.append(save(tmp_path, 'after'))
+    assert sorted((tmp_path / 'runs').iterdir()) == runs[3:]
+
+
+def test_run_directory_marks_run_used(tmp_path):
+    """Test that resolving the current run keeps it from being deleted."""
+    run = save(tmp_path, 'model')
+    age(run, RUN_GRACE_HOURS + 1)
+    assert run_directory(tmp_path) == run
+    assert run.stat().st_mtime > time.time() - 60
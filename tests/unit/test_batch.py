@@ -0,0 +1,51 @@
+"""Test the twe-train command line on a small CSV file."""
+
+# %% Imports
+# Standard system imports
+import json
+
+# Related third party imports
+import pandas as pd
+from sklearn.datasets import load_iris
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn import cost_model, worker_pool
+from bokeh_server.train.twe_learn.artifacts import run_directory
+from bokeh_server.train.twe_learn.batch import main
+from bokeh_server.train.twe_learn.cost_model import load_history
+from bokeh_server.train.twe_learn.leaderboard import artifact_directory
+
+
+# %% Command line unit tests
+def test_main(tmp_path, capsys):
+    """Test that main trains every entry into the configured directories."""
+    data = load_iris(as_frame=True).frame
+    data.to_csv(tmp_path / 'iris.csv', index=False)
+    entry = {'data': str(tmp_path / 'iris.csv'), 'target': 'target',
+             'model': 'Logistic Regression', 'params': {'C': [0.1, 1.0]}}
+    config = [entry, {**entry, 'params': {'C': [10.0]}},
+              {**entry, 'model': 'K-Nearest Neighbors CLF',
+               'params': {'n_neighbors': [3, 5]}}]
+    with open(tmp_path / 'config.json', 'w') as config_file:
+        json.dump(config, config_file)
+    history_mtime = cost_model.HISTORY_PATH.stat().st_mtime_ns \
+        if cost_model.HISTORY_PATH.exists() else None
+    main([str(tmp_path / 'config.json'), '-o', str(tmp_path / 'out'),
+          '-w', '2'])
+    leaderboard = pd.read_csv(tmp_path / 'out' / 'leaderboard.csv')
+    assert sorted(leaderboard['run']) == ['K-Nearest Neighbors CLF',
+                                          'Logistic Regression',
+                                          'Logistic Regression 2']
+    assert leaderboard['error'].isna().all()
+    assert (leaderboard['dataset'] == 'iris').all()
+    for run in leaderboard['run']:
+        directory = artifact_directory(run, tmp_path / 'out' / 'iris')
+        assert (run_directory(directory) / 'results').exists()
+    history = load_history(tmp_path / 'out' / 'run_history.json')
+    assert len(history) == 3
+    assert {run['workers'] for run in history} == {2}
+    # Configuration is not left behind in the modules
+    assert worker_pool.pool_size() == worker_pool.N_WORKERS
+    assert (cost_model.HISTORY_PATH.stat().st_mtime_ns
+            if cost_model.HISTORY_PATH.exists() else None) == history_mtime
+    assert 'K-Nearest Neighbors CLF: CV score' in capsys.readouterr().out
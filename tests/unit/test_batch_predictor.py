@@ -0,0 +1,130 @@
+"""Test parsing, validation, and micro-batched scoring of prediction rows."""
+
+# %% Imports
+# Standard system imports
+from concurrent.futures import ThreadPoolExecutor
+import json
+from types import SimpleNamespace
+
+# Related third party imports
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.datasets import make_classification
+
+# Local application/library specific imports
+from app.main.batch_predictor import BatchPredictor, parse_rows
+from bokeh_server.train.twe_learn.artifacts import save_run
+from bokeh_server.train.twe_learn.train_model import build_pipeline
+
+
+# %% Globals
+FEATURES = ['a', 'b', 'c']
+
+
+# %% Fixtures
+def train(directory, features, seed=214):
+    """Fit and save a model on the given features like a training run."""
+    X, y = make_classification(n_samples=100, n_features=len(features),
+                               n_informative=2, n_redundant=0,
+                               random_state=seed)
+    X = pd.DataFrame(X, columns=features)
+    pipe = build_pipeline({'model': 'Logistic Regression'}).fit(X, y)
+    save_run(SimpleNamespace(best_estimator_=pipe),
+             {'features': features,
+              'training_settings': {'features': features}}, directory)
+    return pipe, X
+
+
+@pytest.fixture
+def trained(tmp_path):
+    """Return a predictor of a saved model, the model, and its rows."""
+    pipe, X = train(tmp_path, FEATURES)
+    return BatchPredictor(tmp_path / 'model', tmp_path / 'train_data'), \
+        pipe, X
+
+
+# %% Parsing unit tests
+def test_parse_json_records_and_columns():
+    """Test JSON rows given as records or as columns, in feature order."""
+    expected = np.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+    records = json.dumps([{'c': 3, 'b': 2, 'a': 1, 'extra': 'x'},
+                          {'a': 4, 'b': 5, 'c': 6, 'extra': 'y'}])
+    columns = json.dumps({'b': [2, 5], 'a': [1, 4], 'c': [3, 6]})
+    for body in (records, columns):
+        X = parse_rows(body, 'application/json', FEATURES)
+        assert X.dtype == np.float64
+        np.testing.assert_array_equal(X, expected)
+
+
+def test_parse_csv():
+    """Test CSV rows with a header row and an ignored column."""
+    body = 'id,c,a,b\n7,3,1,2\n8,6,4,5\n'
+    np.testing.assert_array_equal(parse_rows(body, 'text/csv', FEATURES),
+                                  [[1, 2, 3], [4, 5, 6]])
+
+
+@pytest.mark.parametrize('body, mimetype, message', [
+    ('a,b,c\n1,2,3\n', 'text/plain', 'application/json or text/csv'),
+    ('[{"a": 1,', 'application/json', 'Cannot parse'),
+    ('a,b,c\n1,2,3\n1,2,3,4,5\n', 'text/csv', 'Cannot parse'),
+    ('[]', 'application/json', 'No rows'),
+    ('a,b\n1,2\n', 'text/csv', 'Missing features: c'),
+    ('a,b,c\n1,x,3\n', 'text/csv', 'must be numeric'),
+    ('a,b,c\n1,2,3\n4,,6\n', 'text/csv', 'rows [1]')])
+def test_parse_errors(body, mimetype, message):
+    """Test that invalid bodies raise ValueError with a useful message."""
+    with pytest.raises(ValueError, match=message.replace('[', r'\[')):
+        parse_rows(body, mimetype, FEATURES)
+
+
+def test_parse_max_rows():
+    """Test the limit on rows per request."""
+    body = 'a,b,c\n' + '1,2,3\n' * 11
+    assert len(parse_rows(body, 'text/csv', FEATURES, max_rows=11)) == 11
+    with pytest.raises(ValueError, match='At most 10 rows'):
+        parse_rows(body, 'text/csv', FEATURES, max_rows=10)
+
+
+# %% Batch predictor unit tests
+def test_predict_matches_model(trained):
+    """Test that scored rows get the predictions of the saved model."""
+    predictor, pipe, X = trained
+    rows, features = predictor.parse(X.to_csv(index=False), 'text/csv')
+    assert features == FEATURES
+    np.testing.assert_array_equal(predictor.predict(rows, features),
+                                  pipe.predict(X))
+
+
+def test_concurrent_requests(trained):
+    """Test that requests batched together each get their own rows."""
+    predictor, pipe, X = trained
+    predictor.batch_wait = 0.05     # Let requests gather into batches
+    expected = pipe.predict(X)
+    chunks = np.array_split(np.arange(len(X)), 20)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(
+            lambda rows: predictor.predict(X.to_numpy()[rows], FEATURES),
+            chunks))
+    for rows, result in zip(chunks, results):
+        np.testing.assert_array_equal(result, expected[rows])
+
+
+def test_retrained_model_is_picked_up(trained, tmp_path):
+    """Test that a new run's model and feature list replace the old ones."""
+    predictor, _, X = trained
+    predictor.parse(X.to_csv(index=False), 'text/csv')
+    pipe, X = train(tmp_path, ['b', 'd'], seed=1)
+    rows, features = predictor.parse(X.to_csv(index=False), 'text/csv')
+    assert features == ['b', 'd']
+    np.testing.assert_array_equal(predictor.predict(rows, features),
+                                  pipe.predict(X))
+    with pytest.raises(ValueError, match='retrained'):
+        predictor.predict(rows[:, :1].repeat(3, axis=1), FEATURES)
+
+
+def test_no_model(tmp_path):
+    """Test that a missing model raises FileNotFoundError."""
+    predictor = BatchPredictor(tmp_path / 'model', tmp_path / 'train_data')
+    with pytest.raises(FileNotFoundError):
+        predictor.parse('a,b,c\n1,2,3\n', 'text/csv')
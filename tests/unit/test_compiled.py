@@ -0,0 +1,108 @@
+"""Test compiled predictors against the pipelines of the Train app.
+
+Every model family offered by the Train app is fitted with its pipeline, and
+the predictions of predictor() (compiled, or the pipeline itself for models
+that are not compiled) must equal those of the pipeline.
+"""
+
+# %% Imports
+# Standard system imports
+
+# Related third party imports
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification, make_regression
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn import compiled
+from bokeh_server.train.twe_learn.compiled import compile_pipeline, \
+    CompiledModel, predictor, verify
+from bokeh_server.train.twe_learn.train_model import build_pipeline
+
+
+# %% Globals
+CLASSIFIERS = ['Gradient Boosting CLF', 'Hist Gradient Boosting CLF',
+               'K-Nearest Neighbors CLF', 'Logistic Regression',
+               'Naive Bayes', 'Passive Aggressive CLF', 'Random Forest CLF',
+               'SGD Classifier', 'SVC (linear kernel)', 'SVC (rbf kernel)',
+               'SVC (approx. rbf kernel)']
+REGRESSORS = ['Gradient Boosting REG', 'Hist Gradient Boosting REG',
+              'K-Nearest Neighbors REG', 'Linear Regression',
+              'Lasso Regression', 'Passive Aggressive REG',
+              'Ridge Regression', 'Random Forest REG', 'SGD Regressor',
+              'SVR (linear kernel)', 'SVR (rbf kernel)',
+              'SVR (approx. rbf kernel)']
+COMPILED = ['Gradient Boosting CLF', 'Logistic Regression',
+            'Passive Aggressive CLF', 'Random Forest CLF', 'SGD Classifier',
+            'SVC (linear kernel)', 'SVC (approx. rbf kernel)',
+            'Gradient Boosting REG', 'Linear Regression', 'Lasso Regression',
+            'Passive Aggressive REG', 'Ridge Regression', 'Random Forest REG',
+            'SGD Regressor', 'SVR (linear kernel)',
+            'SVR (approx. rbf kernel)']
+
+
+# %% Helper functions
+def fitted(model_name, n_classes=2, **params):
+    """Return a Train app pipeline fitted on a small dataset, and the X."""
+    if model_name in CLASSIFIERS:
+        X, y = make_classification(n_samples=300, n_features=8,
+                                   n_informative=5, n_classes=n_classes,
+                                   random_state=214)
+    else:
+        X, y = make_regression(n_samples=300, n_features=8, n_informative=5,
+                               noise=10, random_state=214)
+    pipe = build_pipeline({'model': model_name, 'n_components': 50})
+    pipe.set_params(**{f'model__{key}': value
+                       for key, value in params.items()})
+    return pipe.fit(X, y), X
+
+
+# %% Compiled model unit tests
+@pytest.mark.parametrize('model_name', CLASSIFIERS + REGRESSORS)
+def test_verify_every_model(model_name):
+    """Test that predictor() predicts like the pipeline of every model."""
+    pipe, X = fitted(model_name)
+    model = predictor(pipe)
+    assert isinstance(model, CompiledModel) == (model_name in COMPILED)
+    assert verify(model, pipe, X)
+    assert verify(model, pipe, X[:1])
+
+
+@pytest.mark.parametrize('model_name', [x for x in CLASSIFIERS
+                                        if x in COMPILED])
+def test_verify_multiclass(model_name):
+    """Test compiled classifiers on three classes."""
+    pipe, X = fitted(model_name, n_classes=3)
+    assert verify(compile_pipeline(pipe), pipe, X)
+
+
+@pytest.mark.parametrize('model_name, params', [
+    ('Gradient Boosting CLF', {'loss': 'exponential'}),
+    ('Gradient Boosting CLF', {'init': 'zero'}),
+    ('Gradient Boosting REG', {'loss': 'huber'}),
+    ('Gradient Boosting REG', {'loss': 'quantile', 'alpha': 0.8}),
+    ('Gradient Boosting REG', {'init': 'zero'})])
+def test_verify_boosting_losses(model_name, params):
+    """Test the initial prediction of every gradient boosting loss."""
+    pipe, X = fitted(model_name, **params)
+    assert verify(compile_pipeline(pipe), pipe, X)
+
+
+@pytest.mark.parametrize('loss', ['deviance', 'exponential'])
+def test_boosting_zero_score(loss):
+    """Test the class predicted at a raw score of exactly zero."""
+    X, y = np.array([[0.0], [0.0], [1.0], [1.0]]), np.array([0, 1, 1, 1])
+    pipe = build_pipeline({'model': 'Gradient Boosting CLF'})
+    pipe.set_params(model__loss=loss, model__init='zero',
+                    model__n_estimators=1, model__max_depth=1).fit(X, y)
+    assert pipe[-1].decision_function(pipe[0].transform(X[:1]))[0] == 0
+    assert verify(compile_pipeline(pipe), pipe, X)
+
+
+def test_predictor_falls_back_on_mismatch(monkeypatch):
+    """Test that a compiled model failing verification is not used."""
+    pipe, X = fitted('Ridge Regression')
+    monkeypatch.setattr(compiled._Linear, '_predict',
+                        lambda self, X: np.zeros(len(X)))
+    with pytest.warns(UserWarning, match='using the pipeline'):
+        assert predictor(pipe) is pipe
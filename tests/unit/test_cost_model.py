@@ -0,0 +1,82 @@
+"""Test the calibration and the estimates of the grid search cost model."""
+
+# %% Imports
+# Standard system imports
+from types import SimpleNamespace
+
+# Related third party imports
+import numpy as np
+import pytest
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn import cost_model
+from bokeh_server.train.twe_learn.cost_model import _calibrate, \
+    estimate_cost, load_history, record_run
+
+
+# %% Helper functions
+def recorded_run(rate, wall_time, model_name='Random Forest CLF'):
+    """Return a history entry timed at rate seconds per unit of work."""
+    costs = [10.0, 20.0, 40.0]
+    units = 800**cost_model.ROW_EXPONENTS.get(model_name, 1) * 5 * \
+        np.array(costs)
+    return {'model': model_name, 'rows': 800.0, 'features': 5, 'workers': 4,
+            'costs': costs, 'seconds': (rate * units).tolist(), 'folds': 5,
+            'wall_time': wall_time}
+
+
+# %% Cost model unit tests
+def test_record_run(tmp_path):
+    """Test that only explored candidates are appended to the history."""
+    grid_search = SimpleNamespace(
+        cv_results_={'params': [{'model__n_estimators': x}
+                                for x in (10, 20, 40)],
+                     'mean_fit_time': np.array([1.0, 2.0, 0.0]),
+                     'mean_score_time': np.array([0.5, 0.5, 0.0])},
+        explored_=np.array([True, True, False]), n_splits_=5,
+        search_time_=4.0)
+    path = tmp_path / 'data' / 'run_history.json'
+    record_run('Random Forest CLF', grid_search, 1000, 5, path=path)
+    record_run('Random Forest CLF', grid_search, 1000, 5, path=path)
+    history = load_history(path)
+    assert len(history) == 2
+    assert history[0]['rows'] == 800
+    assert history[0]['costs'] == [10.0, 20.0]
+    assert history[0]['seconds'] == [1.5, 2.5]
+    assert load_history(tmp_path / 'missing.json') == []
+
+
+def test_calibrate():
+    """Test the median rate and wall-time correction of recorded runs."""
+    history = [recorded_run(1e-6, 20.0), recorded_run(2e-6, 30.0),
+               recorded_run(9e-6, 40.0), recorded_run(1.0, 1.0, 'Lasso')]
+    rate, correction = _calibrate('Random Forest CLF', history)
+    assert rate == pytest.approx(2e-6)
+    busy = 2e-6 * 800 * 5 * 70 * 5 / 4
+    assert correction == pytest.approx(30.0 / busy)
+    assert _calibrate('Ridge Regression', history) == \
+        (cost_model.DEFAULT_PRIOR_SECONDS, 1.0)
+
+
+def test_estimate_reproduces_run():
+    """Test that a calibrated estimate predicts the recorded wall time."""
+    history = [recorded_run(2e-6, 25.0)]
+    estimate = estimate_cost('Random Forest CLF', 1000, 5,
+                             [('n_estimators', [10, 20, 40])], n_workers=4,
+                             history=history)
+    assert estimate['candidates'] == 3 and estimate['fits'] == 16
+    assert estimate['calibrated']
+    refit = 2e-6 * 1000 * 5 * 40
+    assert estimate['seconds'] == pytest.approx(25.0 + refit)
+
+
+def test_untimed_runs_not_calibrated():
+    """Test that runs without timed candidates leave the prior in place."""
+    history = [dict(recorded_run(1.0, 10.0), costs=[], seconds=[])]
+    estimate = estimate_cost('Random Forest CLF', 1000, 5,
+                             [('n_estimators', [100])], n_workers=1,
+                             history=history)
+    assert not estimate['calibrated']
+    prior = cost_model.PRIOR_SECONDS['Random Forest CLF']
+    assert estimate['seconds'] == pytest.approx(
+        prior * 800 * 5 * 100 * 5 + prior * 1000 * 5 * 100)
@@ -0,0 +1,96 @@
+"""Test ROC and precision-recall curves and their decimation."""
+
+# %% Imports
+# Standard system imports
+
+# Related third party imports
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import average_precision_score, roc_auc_score, \
+    roc_curve
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.curves import classifier_curves, decimate
+
+
+# %% Helper functions
+def roc(n_rows, seed=214):
+    """Return a ROC curve of noisy scores with many distinct thresholds."""
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 2, n_rows)
+    fpr, tpr, _ = roc_curve(y, y + rng.normal(scale=1.5, size=n_rows),
+                            drop_intermediate=False)
+    return fpr, tpr
+
+
+# %% Decimation unit tests
+@pytest.mark.parametrize('n_rows', [1000, 20000])
+@pytest.mark.parametrize('max_points', [2, 10, 200])
+def test_decimate_bounds(n_rows, max_points):
+    """Test that at most max_points sorted vertices and both ends are kept."""
+    fpr, tpr = roc(n_rows)
+    index = decimate(fpr, tpr, max_points)
+    assert len(index) <= max_points
+    assert index[0] == 0 and index[-1] == len(fpr) - 1
+    assert (np.diff(index) > 0).all()
+
+
+@pytest.mark.parametrize('n_rows', [1000, 20000])
+def test_decimate_preserves_auc(n_rows):
+    """Test that the area under the reduced curve is nearly unchanged."""
+    fpr, tpr = roc(n_rows)
+    index = decimate(fpr, tpr)
+    assert len(index) == 200
+    assert np.trapz(tpr[index], fpr[index]) == \
+        pytest.approx(np.trapz(tpr, fpr), abs=1e-3)
+
+
+def test_decimate_collinear_is_exact():
+    """Test that collinear vertices are removed without changing the curve."""
+    x = np.arange(99.0)     # Two segments of exactly collinear vertices
+    y = np.where(x < 49, 2 * x, 49 + x)
+    index = decimate(x, y, max_points=10)
+    np.testing.assert_array_equal(index, [0, 49, 98])
+
+
+def test_decimate_short_curve():
+    """Test that curves within max_points are kept whole."""
+    x, y = np.array([0, 0.2, 1]), np.array([0, 0.7, 1])
+    np.testing.assert_array_equal(decimate(x, y), [0, 1, 2])
+
+
+# %% Classifier curves unit tests
+@pytest.mark.parametrize('n_classes', [2, 3])
+def test_classifier_curves(n_classes):
+    """Test the AUC and average precision of every class against sklearn."""
+    X, y = make_classification(n_samples=3000, n_features=6, n_informative=3,
+                               n_classes=n_classes, flip_y=0.2,
+                               random_state=214)
+    model = LogisticRegression().fit(X[:1000], y[:1000])
+    X_test, y_test = X[1000:], y[1000:]
+    curves = classifier_curves(model, X_test, y_test, max_points=50)
+    scores = model.predict_proba(X_test)
+    assert [curve['label'] for curve in curves] == list(model.classes_)
+    for column, curve in enumerate(curves):
+        positive = y_test == curve['label']
+        assert curve['roc_auc'] == pytest.approx(
+            roc_auc_score(positive, scores[:, column]))
+        assert curve['average_precision'] == pytest.approx(
+            average_precision_score(positive, scores[:, column]))
+        assert curve['prevalence'] == pytest.approx(positive.mean())
+        assert len(curve['fpr']) <= 50 and len(curve['recall']) <= 50
+        assert (curve['fpr'][0], curve['tpr'][0]) == (0, 0)
+        assert (curve['fpr'][-1], curve['tpr'][-1]) == (1, 1)
+        assert np.trapz(curve['tpr'], curve['fpr']) == pytest.approx(
+            curve['roc_auc'], abs=5e-3)
+
+
+def test_classifier_curves_skip_absent_class():
+    """Test that classes without positive rows get no curve."""
+    X, y = make_classification(n_samples=300, n_classes=3, n_informative=3,
+                               random_state=214)
+    model = LogisticRegression().fit(X, y)
+    curves = classifier_curves(model, X[y != 2], y[y != 2])
+    assert [curve['label'] for curve in curves] == [0, 1]
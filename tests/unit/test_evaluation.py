@@ -0,0 +1,59 @@
+"""Test the 2D histograms and outliers of the residuals of regressors."""
+
+# %% Imports
+# Standard system imports
+
+# Related third party imports
+import numpy as np
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.evaluation import residual_density
+
+
+# %% Helper functions
+def known_residuals():
+    """Return targets and predictions with residuals known for every row.
+
+    Predictions take 4 values, 25 rows each.  Residuals alternate -1 and 1,
+    except for 6 planted outliers of mixed sign, from 5 to 10 in magnitude.
+    """
+    y_pred = np.repeat([0.0, 1.0, 2.0, 3.0], 25)
+    residuals = np.where(np.arange(100) % 2, 1.0, -1.0)
+    outliers = np.array([3, 17, 42, 58, 71, 96])
+    residuals[outliers] = [5, -6, 7, -8, 10, -10]
+    return y_pred + residuals, y_pred, outliers
+
+
+# %% Residual density unit tests
+def test_residual_bins():
+    """Test the counts and edges of the 2D histograms of known residuals."""
+    y_true, y_pred, _ = known_residuals()
+    density = residual_density(y_true, y_pred, bins=4)
+    counts, x_edges, y_edges = density['residuals']
+    np.testing.assert_allclose(x_edges, [0, 0.75, 1.5, 2.25, 3])
+    np.testing.assert_allclose(y_edges, [-10, -5, 0, 5, 10])
+    assert counts.dtype == np.int32 and counts.sum() == 100
+    # Columns: outliers <= -5, ordinary -1, ordinary 1, outliers >= 5
+    expected = [[1, 13, 10, 1], [0, 11, 13, 1], [1, 12, 11, 1],
+                [1, 11, 13, 0]]
+    np.testing.assert_array_equal(counts, expected)
+    counts, x_edges, y_edges = density['actual']
+    np.testing.assert_allclose(y_edges, [-7, -2.25, 2.5, 7.25, 12])
+    assert counts.sum() == 100
+
+
+def test_largest_residual_rows():
+    """Test that the outliers are the rows of the largest |residuals|."""
+    y_true, y_pred, outliers = known_residuals()
+    density = residual_density(y_true, y_pred, n_outliers=4)
+    np.testing.assert_array_equal(np.sort(density['outliers']),
+                                  outliers[2:])
+    density = residual_density(y_true, y_pred, n_outliers=6)
+    np.testing.assert_array_equal(np.sort(density['outliers']), outliers)
+
+
+def test_small_set_outliers():
+    """Test that every row is an outlier of sets up to n_outliers rows."""
+    y_true, y_pred, _ = known_residuals()
+    density = residual_density(y_true[:10], y_pred[:10], n_outliers=10)
+    np.testing.assert_array_equal(density['outliers'], np.arange(10))
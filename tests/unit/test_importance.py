@@ -0,0 +1,113 @@
+"""Test the permutation importance computed on the worker pool."""
+
+# %% Imports
+# Standard system imports
+
+# Related third party imports
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn import inspection
+from sklearn.datasets import make_classification
+from sklearn.metrics import r2_score
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn import importance, worker_pool
+from bokeh_server.train.twe_learn.importance import permutation_importance
+from bokeh_server.train.twe_learn.train_model import build_pipeline
+from bokeh_server.train.twe_learn.worker_pool import shutdown_pool
+
+
+# %% Fixtures
+@pytest.fixture(scope="module", autouse=True)
+def worker_pool_shutdown():
+    """Stop the worker pool once the importance tests are done."""
+    yield
+    shutdown_pool()
+
+
+def fitted(model_name, n_rows=400):
+    """Return a fitted pipeline, X, y, and the test rows of a dataset.
+
+    The regression target has a large offset, which float32 predictions do
+    not resolve, and the features decreasing importance.
+    """
+    rng = np.random.default_rng(214)
+    if model_name == 'Logistic Regression':
+        X, y = make_classification(n_samples=n_rows, n_features=4,
+                                   n_informative=2, n_redundant=0,
+                                   shuffle=False, random_state=214)
+    else:
+        X = rng.normal(size=(n_rows, 4))
+        y = 1e6 + X @ [3, 1, 0.3, 0] + rng.normal(scale=0.5, size=n_rows)
+    X = pd.DataFrame(X, columns=list('abcd'))
+    y = pd.Series(y, name='target')
+    train_rows, test_rows = np.arange(n_rows // 2), np.arange(n_rows // 2,
+                                                              n_rows)
+    pipe = build_pipeline({'model': model_name})
+    pipe.fit(X.iloc[train_rows], y.iloc[train_rows])
+    return pipe, X, y, test_rows
+
+
+def importances(pipe, X, y, rows, **kwargs):
+    """Return permutation importance of every column on rows."""
+    y_pred = pipe.predict(X.iloc[rows])
+    if y_pred.dtype.kind == 'f':    # As saved by evaluate()
+        y_pred = y_pred.astype(np.float32)
+    return permutation_importance(pipe, X, y, rows, np.arange(X.shape[1]),
+                                  y_pred, **kwargs)
+
+
+# %% Permutation importance unit tests
+@pytest.mark.parametrize('model_name', ['Logistic Regression',
+                                        'Ridge Regression'])
+def test_matches_sklearn(model_name):
+    """Test mean score drops against sklearn's permutation_importance."""
+    pipe, X, y, rows = fitted(model_name)
+    result = importances(pipe, X, y, rows, n_repeats=30)
+    expected = inspection.permutation_importance(
+        pipe, X.iloc[rows], y.iloc[rows], n_repeats=30, random_state=214)
+    assert result['features'] == list('abcd')
+    np.testing.assert_allclose(result['mean'], expected.importances_mean,
+                               atol=0.03)
+    assert np.argmax(result['mean']) == np.argmax(expected.importances_mean)
+
+
+def test_full_precision_baseline():
+    """Test that a regressor's baseline is not that of float32 predictions."""
+    pipe, X, y, rows = fitted('Ridge Regression')
+    result = importances(pipe, X, y, rows)
+    y_true, y_pred = y.iloc[rows], pipe.predict(X.iloc[rows])
+    assert result['baseline'] == pytest.approx(r2_score(y_true, y_pred),
+                                               abs=1e-9)
+    assert abs(r2_score(y_true, y_pred.astype(np.float32))
+               - result['baseline']) > 1e-5
+    # The last feature is unused, so permuting it barely changes the score
+    assert abs(result['mean'][3]) < 1e-3
+
+
+def test_pairs_seeded_independently(monkeypatch):
+    """Test that scores do not depend on how pairs are split into tasks."""
+    pipe, X, y, rows = fitted('Logistic Regression')
+    monkeypatch.setattr(worker_pool, 'N_WORKERS', 1)
+    one_task = importances(pipe, X, y, rows)
+    monkeypatch.setattr(worker_pool, 'N_WORKERS', 3)
+    three_tasks = importances(pipe, X, y, rows)
+    np.testing.assert_array_equal(one_task['mean'], three_tasks['mean'])
+    np.testing.assert_array_equal(one_task['std'], three_tasks['std'])
+    assert (one_task['std'] > 0).any()
+
+
+def test_max_rows_sample(monkeypatch):
+    """Test that at most MAX_ROWS test rows, sampled by seed, are scored."""
+    pipe, X, y, rows = fitted('Logistic Regression')
+    monkeypatch.setattr(importance, 'MAX_ROWS', 50)
+    result = importances(pipe, X, y, rows)
+    again = importances(pipe, X, y, rows)
+    assert result['n_rows'] == 50
+    np.testing.assert_array_equal(result['mean'], again['mean'])
+    sample = np.sort(np.random.default_rng(importance.SEED).choice(
+        len(rows), 50, replace=False))
+    sample_rows = rows[sample]
+    assert result['baseline'] == pytest.approx(
+        np.mean(pipe.predict(X.iloc[sample_rows]) == y.iloc[sample_rows]))
@@ -0,0 +1,184 @@
+"""Test the streams, reservoir samples, and scores of incremental training.
+
+MySQLStream is run against an in-memory SQLite table, with the CRC32 and MOD
+functions of MySQL registered in Python.
+"""
+
+# %% Imports
+# Standard system imports
+import sqlite3
+import zlib
+
+# Related third party imports
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score, r2_score
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn import incremental
+from bokeh_server.train.twe_learn.incremental import _reservoir_update, \
+    _StreamScore, IncrementalSearch, MySQLStream, N_BUCKETS
+from bokeh_server.train.twe_learn.train_model import select_model
+
+
+# %% Fixtures
+class SQLiteConnection:
+    """SQLite connection taking the cursor arguments of MySQL Connector."""
+
+    def __init__(self, n_rows):
+        """Create table iris(iris_id, a, b, species) of n_rows rows."""
+        self.cnx = sqlite3.connect(':memory:')
+        self.cnx.create_function(
+            'CRC32', 1, lambda value: zlib.crc32(str(value).encode()))
+        self.cnx.create_function('MOD', 2, lambda x, y: x % y)
+        rng = np.random.default_rng(214)
+        a, b = rng.normal(size=(2, n_rows))
+        species = np.where(a + b > 0, 'setosa', 'virginica')
+        self.cnx.execute('CREATE TABLE iris '
+                         '(iris_id INTEGER PRIMARY KEY, a, b, species)')
+        self.cnx.executemany('INSERT INTO iris VALUES (?, ?, ?, ?)',
+                             zip(range(1, n_rows + 1), a, b, species))
+
+    def cursor(self, buffered=False):
+        """Return a cursor; SQLite cursors fetch rows on demand."""
+        return self.cnx.cursor()
+
+    def close(self):
+        """Close the database."""
+        self.cnx.close()
+
+
+def stream(n_rows=2000, train_split=0.8, batch_size=128):
+    """Return a connected stream of a SQLite iris table."""
+    iris = MySQLStream('iris', 'iris_id', ['a', 'b'], 'species', train_split,
+                       batch_size=batch_size)
+    iris.cnx = SQLiteConnection(n_rows)
+    return iris
+
+
+def read(iris, name, **kwargs):
+    """Return the concatenated X and y of every batch of a stream."""
+    batches = list(iris.batches(name, **kwargs))
+    return np.concatenate([X for X, _ in batches]), \
+        np.concatenate([y for _, y in batches])
+
+
+# %% Stream split unit tests
+@pytest.mark.parametrize('train_split', [0.5, 0.8, 0.95])
+def test_streams_partition_by_crc32(train_split):
+    """Test that streams are the CRC32 bucket ranges of the primary key."""
+    iris = stream(train_split=train_split)
+    ids = np.arange(1, 2001)
+    buckets = np.array([zlib.crc32(str(x).encode()) for x in ids]) \
+        % N_BUCKETS
+    val_end = iris.test_buckets + iris.val_buckets
+    expected = {'test': buckets < iris.test_buckets,
+                'validation': (buckets >= iris.test_buckets)
+                & (buckets < val_end),
+                'train': buckets >= val_end}
+    a = iris.cnx.cnx.execute('SELECT a FROM iris ORDER BY iris_id')
+    a = np.array([value for (value,) in a])
+    for name, rows in expected.items():
+        X, _ = read(iris, name)
+        np.testing.assert_array_equal(X[:, 0], a[rows])  # Primary key order
+    assert iris.test_buckets == round((1 - train_split) * N_BUCKETS)
+    assert abs(expected['test'].mean() - (1 - train_split)) < 0.05
+
+
+def test_shuffled_batches():
+    """Test that shuffling permutes rows within batches, reproducibly."""
+    iris = stream()
+    X, y = read(iris, 'train')
+    X_first, y_first = read(iris, 'train', shuffle_seed=0)
+    X_again, _ = read(iris, 'train', shuffle_seed=0)
+    X_other, _ = read(iris, 'train', shuffle_seed=1)
+    np.testing.assert_array_equal(X_first, X_again)
+    assert not np.array_equal(X_first, X) \
+        and not np.array_equal(X_first, X_other)
+    for start in range(0, len(X), iris.batch_size):
+        batch = slice(start, start + iris.batch_size)
+        assert sorted(map(tuple, X_first[batch])) == \
+            sorted(map(tuple, X[batch]))
+    assert set(zip(X_first[:, 0], y_first)) == set(zip(X[:, 0], y))
+    assert y.dtype.kind == 'U' and X.dtype == np.float64
+
+
+def test_incremental_search():
+    """Test that every candidate is trained and the best one is chosen."""
+    iris = stream()
+    model = select_model('SGD Classifier')(random_state=214)
+    search = IncrementalSearch(model, {'alpha': [1e-4, 1e-2]}, n_epochs=2)
+    search.fit(iris)
+    assert search.val_scores_.shape == (2,)
+    assert search.best_score_ == np.nanmax(search.val_scores_)
+    assert search.best_params_ == {
+        'model__alpha': [1e-4, 1e-2][search.best_index_]}
+    X, y = read(iris, 'test')
+    assert search.score(X, y) > 0.9
+
+
+# %% Reservoir sampling unit tests
+def test_reservoir_keeps_every_row_until_full(monkeypatch):
+    """Test that the reservoir holds every row while it is not full."""
+    monkeypatch.setattr(incremental, 'SAMPLE_SIZE', 10)
+    sample = (np.empty((10, 1)), np.empty(10, dtype=object))
+    rng = np.random.default_rng(214)
+    seen = _reservoir_update(sample, np.arange(4.0)[:, None], np.arange(4),
+                             0, rng)
+    seen = _reservoir_update(sample, np.arange(4.0, 10)[:, None],
+                             np.arange(4, 10), seen, rng)
+    assert seen == 10
+    np.testing.assert_array_equal(sample[0][:, 0], np.arange(10))
+    np.testing.assert_array_equal(sample[1], np.arange(10))
+
+
+def test_reservoir_is_uniform(monkeypatch):
+    """Test that every row of a stream is kept with equal probability."""
+    monkeypatch.setattr(incremental, 'SAMPLE_SIZE', 10)
+    n_rows, n_trials = 100, 3000
+    kept = np.zeros(n_rows)
+    rng = np.random.default_rng(214)
+    for _ in range(n_trials):
+        sample = (np.empty((10, 1)), np.empty(10, dtype=object))
+        seen = 0
+        for batch in np.array_split(np.arange(n_rows), 13):
+            seen = _reservoir_update(sample, batch[:, None].astype(float),
+                                     batch, seen, rng)
+        rows = sample[1].astype(int)
+        np.testing.assert_array_equal(sample[0][:, 0], rows)  # Aligned
+        assert len(set(rows)) == 10
+        kept[rows] += 1
+    # Each row is kept with probability 10 / 100
+    np.testing.assert_allclose(kept / n_trials, 0.1, atol=0.025)
+    assert abs(kept[:50].mean() - kept[50:].mean()) / n_trials < 0.01
+
+
+# %% Stream score unit tests
+def test_stream_score_accuracy():
+    """Test that accuracy over batches equals that of the whole stream."""
+    rng = np.random.default_rng(214)
+    y_true, y_pred = rng.choice(['a', 'b', 'c'], size=(2, 1000))
+    score = _StreamScore(classifier=True)
+    for batch in np.array_split(np.arange(1000), 7):
+        score.update(y_true[batch], y_pred[batch])
+    assert score.score() == pytest.approx(accuracy_score(y_true, y_pred))
+
+
+def test_stream_score_r2():
+    """Test that R² over batches equals that of the whole stream."""
+    rng = np.random.default_rng(214)
+    y_true = 1000 + rng.normal(size=1000)
+    y_pred = y_true + rng.normal(scale=0.5, size=1000)
+    score = _StreamScore(classifier=False)
+    for batch in np.array_split(np.arange(1000), 7):
+        score.update(y_true[batch], y_pred[batch])
+    assert score.score() == pytest.approx(r2_score(y_true, y_pred),
+                                          abs=1e-6)
+
+
+def test_stream_score_undefined():
+    """Test NaN for an empty stream and for a constant target."""
+    assert np.isnan(_StreamScore(classifier=True).score())
+    score = _StreamScore(classifier=False)
+    score.update(np.ones(5), np.zeros(5))
+    assert np.isnan(score.score())
@@ -0,0 +1,139 @@
+"""Test the learning curve job of a saved model and its worker task."""
+
+# %% Imports
+# Standard system imports
+from concurrent.futures import ThreadPoolExecutor
+import time
+from types import SimpleNamespace
+
+# Related third party imports
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.base import BaseEstimator
+from sklearn.datasets import load_iris
+from sklearn.model_selection import train_test_split
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn import learning_curve
+from bokeh_server.train.twe_learn.artifacts import sample_data, save_run
+from bokeh_server.train.twe_learn.leaderboard import publish_copy
+from bokeh_server.train.twe_learn.train_model import build_pipeline
+from bokeh_server.train.twe_learn.worker_pool import publish_dataset, \
+    publish_split, shutdown_pool
+
+
+# %% Fixtures
+@pytest.fixture(scope="module", autouse=True)
+def worker_pool():
+    """Stop the worker pool once the learning curve tests are done."""
+    yield
+    shutdown_pool()
+
+
+def save_knn(directory, n_neighbors=10, n_train=60):
+    """Save a fitted KNN model of a small iris training set as a run."""
+    X, y = load_iris(return_X_y=True, as_frame=True)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, train_size=n_train, stratify=y, random_state=214)
+    pipe = build_pipeline({'model': 'K-Nearest Neighbors CLF'})
+    pipe.set_params(model__n_neighbors=n_neighbors).fit(X_train, y_train)
+    training_data = sample_data(X_train, X_test, y_train, y_test)
+    training_data['training_settings'] = {'features': list(X.columns)}
+    save_run(SimpleNamespace(best_estimator_=pipe), training_data, directory)
+
+
+def wait(job, timeout=60):
+    """Return the final snapshot of a job once it is done."""
+    deadline = time.monotonic() + timeout
+    while not job.done:
+        assert time.monotonic() < deadline, 'Learning curve timed out'
+        time.sleep(0.05)
+    return job.snapshot()
+
+
+class RecordingEstimator(BaseEstimator):
+    """Estimator recording its training rows, unable to score few rows."""
+
+    fitted_rows = []
+
+    def __init__(self, min_rows=0):
+        """Refuse to score training sets smaller than min_rows."""
+        self.min_rows = min_rows
+
+    def fit(self, X, y):
+        """Record the first column of the training rows."""
+        self.fitted_rows.append(np.asarray(X)[:, 0].copy())
+        self.n_rows_ = len(X)
+        return self
+
+    def score(self, X, y):
+        """Return 1, or raise like KNN if fitted on too few rows."""
+        if self.n_rows_ < self.min_rows:
+            raise ValueError('Expected n_neighbors <= n_samples')
+        return 1.0
+
+
+# %% Learning curve unit tests
+def test_knn_small_sizes(tmp_path):
+    """Test that sizes start at n_neighbors and every pair scores."""
+    save_knn(tmp_path)
+    job = learning_curve.learning_curve_job(tmp_path)
+    curve = wait(job)
+    assert job.error == ''
+    assert curve['done'] and curve['n_done'] == curve['test_scores'].size
+    assert curve['train_sizes'][0] == 10
+    assert np.isfinite(curve['train_scores']).all()
+    assert np.isfinite(curve['test_scores']).all()
+    assert (tmp_path / 'learning_curve').exists()
+
+
+def test_nested_subsets_and_nan_scores():
+    """Test nested subsets of a fold, and NaN for a subset not scored."""
+    X = pd.DataFrame({'row': np.arange(50.0)})
+    y = np.arange(50) % 2
+    data_key = publish_dataset(X, y)
+    split_key = publish_split(np.arange(50), [0], np.arange(50) % 5)
+    estimator = RecordingEstimator(min_rows=10)
+    RecordingEstimator.fitted_rows.clear()
+    scores = [learning_curve._fit_and_score(estimator, data_key, split_key,
+                                            1, n_rows)
+              for n_rows in (5, 20, 40)]
+    small, medium, large = RecordingEstimator.fitted_rows
+    assert set(small) <= set(medium) <= set(large)
+    assert len(large) == 40 and not np.isin(large % 5, 1).any()
+    assert np.isnan(scores[0][:2]).all()
+    assert scores[1][:2] == scores[2][:2] == (1.0, 1.0)
+
+
+def test_failed_task_keeps_other_scores(tmp_path, monkeypatch):
+    """Test that a failed task is collected and the job reports it."""
+    def fit_and_score(estimator, data_key, split_key, fold, n_rows):
+        if fold == 0:
+            raise RuntimeError('worker died')
+        return 0.5, 0.25, 0.0
+
+    save_knn(tmp_path, n_neighbors=1)
+    monkeypatch.setattr(learning_curve, '_fit_and_score', fit_and_score)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        monkeypatch.setattr(learning_curve, 'get_pool', lambda: pool)
+        job = learning_curve.LearningCurveJob(tmp_path)
+        job.start()
+        curve = wait(job)
+    assert job.error == 'RuntimeError: worker died'
+    assert not curve['done']
+    assert curve['n_done'] == curve['test_scores'].size
+    assert np.isnan(curve['test_scores'][:, 0]).all()
+    assert (curve['test_scores'][:, 1:] == 0.25).all()
+    assert not (tmp_path / 'learning_curve').exists()
+
+
+def test_copied_run_reuses_curve(tmp_path):
+    """Test that a run copied like the leaderboard winner keeps its curve."""
+    save_knn(tmp_path / 'leaderboard')
+    curve = wait(learning_curve.learning_curve_job(tmp_path / 'leaderboard'))
+    publish_copy(tmp_path / 'leaderboard', tmp_path / 'data')
+    job = learning_curve.LearningCurveJob(tmp_path / 'data')
+    assert job.done
+    np.testing.assert_array_equal(job.snapshot()['test_scores'],
+                                  curve['test_scores'])
@@ -0,0 +1,107 @@
+"""Test the process-wide cache of deserialized artifacts."""
+
+# %% Imports
+# Standard system imports
+import os
+
+# Related third party imports
+
+# Local application/library specific imports
+from utility.model_cache import ModelCache
+
+
+# %% Helper functions
+class CountingLoader:
+    """Loader returning a new object per call and counting the calls."""
+
+    def __init__(self):
+        """Start with no calls."""
+        self.calls = []
+
+    def __call__(self, path):
+        """Return the contents of the file in a new list."""
+        self.calls.append(path.name)
+        return [path.read_bytes()]
+
+
+def write(path, size, mtime_ns=None):
+    """Write size bytes to path and optionally set its modification time."""
+    path.write_bytes(b'x' * size)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+# %% Model cache unit tests
+def test_hits_share_one_object(tmp_path):
+    """Test that a cached file is loaded once and its object shared."""
+    cache, loader = ModelCache(max_bytes=1000), CountingLoader()
+    path = write(tmp_path / 'model', 10)
+    first = cache.get(path, loader)
+    assert cache.get(path, loader) is first
+    assert cache.get(tmp_path / '.' / 'model', loader) is first
+    assert loader.calls == ['model']
+    assert cache.info() == {'entries': 1, 'bytes': 10, 'hits': 2,
+                            'misses': 1}
+
+
+def test_evicts_least_recently_used(tmp_path):
+    """Test that the least recently used entries are evicted first."""
+    cache, loader = ModelCache(max_bytes=250), CountingLoader()
+    a, b, c = (write(tmp_path / name, 100) for name in 'abc')
+    cache.get(a, loader)
+    cache.get(b, loader)
+    cache.get(a, loader)    # b is now the least recently used
+    cache.get(c, loader)
+    assert cache.info()['entries'] == 2
+    assert cache.info()['bytes'] == 200
+    cache.get(a, loader)
+    cache.get(c, loader)
+    assert loader.calls == ['a', 'b', 'c']
+    cache.get(b, loader)    # Reloaded, evicting a
+    assert loader.calls == ['a', 'b', 'c', 'b']
+    cache.get(a, loader)
+    assert loader.calls[-1] == 'a'
+
+
+def test_keeps_entry_larger_than_budget(tmp_path):
+    """Test that the most recent entry is kept even if over budget."""
+    cache, loader = ModelCache(max_bytes=50), CountingLoader()
+    small = write(tmp_path / 'small', 10)
+    large = write(tmp_path / 'large', 100)
+    cache.get(small, loader)
+    cache.get(large, loader)
+    assert cache.info()['entries'] == 1
+    cache.get(large, loader)
+    assert loader.calls == ['small', 'large']
+
+
+def test_rewritten_file_is_reloaded(tmp_path):
+    """Test that a rewritten file is loaded again and its old entry dropped.
+
+    Rewriting with the same size but a new modification time, or with a new
+    size, invalidates the entry.
+    """
+    cache, loader = ModelCache(max_bytes=1000), CountingLoader()
+    path = write(tmp_path / 'model', 10, mtime_ns=10**18)
+    first = cache.get(path, loader)
+    write(path, 10, mtime_ns=2 * 10**18)
+    second = cache.get(path, loader)
+    assert second is not first
+    write(path, 20, mtime_ns=2 * 10**18)
+    third = cache.get(path, loader)
+    assert third == [b'x' * 20]
+    assert loader.calls == ['model'] * 3
+    assert cache.info()['entries'] == 1
+    assert cache.info()['bytes'] == 20
+
+
+def test_clear(tmp_path):
+    """Test that clear() empties the cache."""
+    cache, loader = ModelCache(max_bytes=1000), CountingLoader()
+    path = write(tmp_path / 'model', 10)
+    cache.get(path, loader)
+    cache.clear()
+    assert cache.info()['entries'] == cache.info()['bytes'] == 0
+    cache.get(path, loader)
+    assert loader.calls == ['model', 'model']
@@ -0,0 +1,194 @@
+"""Test the grid search of the Train app against scikit-learn's GridSearchCV.
+
+The candidates of GridSearch are scored on the persistent worker pool, with
+the specialized search path of the model family where there is one.  Its
+cv_results_ and best_params_ must match those of GridSearchCV on the same
+folds.
+"""
+
+# %% Imports
+# Standard system imports
+import warnings
+
+# Related third party imports
+import numpy as np
+import pytest
+from sklearn.datasets import load_iris, make_classification, \
+    make_regression
+from sklearn.exceptions import FitFailedWarning
+from sklearn.model_selection import GridSearchCV
+
+# Local application/library specific imports
+from bokeh_server.train.twe_learn.search import GridSearch
+from bokeh_server.train.twe_learn.search_paths import SEARCH_PATHS
+from bokeh_server.train.twe_learn.train_model import build_pipeline
+from bokeh_server.train.twe_learn.worker_pool import shutdown_pool
+
+
+# %% Globals
+# Grids of every model family with a search path, and some without.  Paths
+# solving to a tolerance (warm starts, coordinate descent) are compared to a
+# looser tolerance than the exact ones.
+GRIDS = {
+    'Gradient Boosting CLF': ({'model__n_estimators': [5, 20, 50],
+                               'model__max_depth': [1, 3]}, 1e-9),
+    'Gradient Boosting REG': ({'model__n_estimators': [5, 20, 50],
+                               'model__max_depth': [1, 3]}, 1e-9),
+    'Random Forest CLF': ({'model__n_estimators': [5, 20],
+                           'model__max_depth': [2, None]}, 1e-9),
+    'Random Forest REG': ({'model__n_estimators': [5, 20],
+                           'model__max_depth': [2, None]}, 1e-9),
+    'Lasso Regression': ({'model__alpha': [0.1, 1, 10, 100]}, 1e-3),
+    'Ridge Regression': ({'model__alpha': [0.1, 1, 10, 1000]}, 1e-9),
+    'Logistic Regression': ({'model__C': [0.001, 0.1, 10]}, 1e-2),
+    'SVC (linear kernel)': ({'model__C': [0.001, 0.1, 10]}, 1e-9),
+    'SVR (linear kernel)': ({'model__C': [0.01, 1, 100]}, 1e-9),
+    'K-Nearest Neighbors CLF': ({'model__n_neighbors': [1, 5, 15],
+                                 'model__weights': ['uniform', 'distance']},
+                                1e-9),
+    'K-Nearest Neighbors REG': ({'model__n_neighbors': [1, 5, 15],
+                                 'model__weights': ['uniform', 'distance']},
+                                1e-9),
+    'Naive Bayes': ({'model__var_smoothing': [1e-9, 1e-1, 10]}, 1e-9),
+}
+CLASSIFIERS = ('Gradient Boosting CLF', 'Random Forest CLF',
+               'Logistic Regression', 'SVC (linear kernel)',
+               'K-Nearest Neighbors CLF', 'Naive Bayes')
+
+
+# %% Fixtures
+@pytest.fixture(scope="module", autouse=True)
+def worker_pool():
+    """Stop the worker pool once the search tests are done."""
+    yield
+    shutdown_pool()
+
+
+def dataset(model_name):
+    """Return a small classification or regression dataset for a model."""
+    if model_name in CLASSIFIERS:
+        return make_classification(n_samples=200, n_features=8,
+                                   n_informative=4, random_state=214)
+    return make_regression(n_samples=200, n_features=8, n_informative=4,
+                           noise=20, random_state=214)
+
+
+def pipeline(model_name):
+    """Return the Train app's pipeline of a model, with a fixed seed."""
+    pipe = build_pipeline({'model': model_name})
+    if 'random_state' in pipe[-1].get_params():
+        pipe.set_params(model__random_state=214)
+    return pipe
+
+
+# %% Grid search unit tests
+def test_grids_cover_search_paths():
+    """Test that every specialized search path is compared below."""
+    families = {type(pipeline(name)[-1]) for name in GRIDS}
+    assert set(SEARCH_PATHS) <= families
+
+
+@pytest.mark.parametrize('model_name', list(GRIDS))
+def test_matches_grid_search_cv(model_name):
+    """Test cv_results_ and best_params_ against GridSearchCV."""
+    X, y = dataset(model_name)
+    param_grid, tolerance = GRIDS[model_name]
+    search = GridSearch(pipeline(model_name), param_grid).fit(X, y)
+    expected = GridSearchCV(pipeline(model_name), param_grid).fit(X, y)
+    assert search.cv_results_['params'] == expected.cv_results_['params']
+    for fold in range(5):
+        key = f'split{fold}_test_score'
+        np.testing.assert_allclose(search.cv_results_[key],
+                                   expected.cv_results_[key],
+                                   atol=tolerance)
+    np.testing.assert_allclose(search.cv_results_['mean_test_score'],
+                               expected.cv_results_['mean_test_score'],
+                               atol=tolerance)
+    assert search.best_params_ == expected.best_params_
+    assert search.explored_.all() and not search.truncated_
+
+
+@pytest.mark.parametrize('model_name', list(GRIDS))
+def test_bare_estimator(model_name):
+    """Test every path given the final estimator without a pipeline."""
+    X, y = dataset(model_name)
+    param_grid, tolerance = GRIDS[model_name]
+    param_grid = {name.replace('model__', ''): values
+                  for name, values in param_grid.items()}
+    estimator = pipeline(model_name)[-1]
+    search = GridSearch(estimator, param_grid).fit(X, y)
+    expected = GridSearchCV(estimator, param_grid).fit(X, y)
+    np.testing.assert_allclose(search.cv_results_['mean_test_score'],
+                               expected.cv_results_['mean_test_score'],
+                               atol=tolerance)
+
+
+@pytest.mark.parametrize('model_name', ['K-Nearest Neighbors CLF',
+                                        'K-Nearest Neighbors REG'])
+def test_tied_neighbors(model_name):
+    """Test the shared neighbor graph on data with duplicate rows."""
+    X, y = load_iris(return_X_y=True)
+    X = X.round(1)      # Many duplicate rows, so many tied distances
+    if model_name.endswith('REG'):
+        X, y = X[:, :3], X[:, 3]
+    param_grid = {'model__n_neighbors': [1, 3, 5, 10, 15]}
+    search = GridSearch(pipeline(model_name), param_grid).fit(X, y)
+    expected = GridSearchCV(pipeline(model_name), param_grid).fit(X, y)
+    np.testing.assert_allclose(search.cv_results_['mean_test_score'],
+                               expected.cv_results_['mean_test_score'],
+                               atol=1e-12)
+
+
+def test_search_paths_disabled():
+    """Test that the generic path gives the scores of a search path."""
+    X, y = dataset('Ridge Regression')
+    param_grid, _ = GRIDS['Ridge Regression']
+    fast = GridSearch(pipeline('Ridge Regression'), param_grid).fit(X, y)
+    slow = GridSearch(pipeline('Ridge Regression'), param_grid,
+                      search_paths=False).fit(X, y)
+    np.testing.assert_allclose(fast.cv_results_['mean_test_score'],
+                               slow.cv_results_['mean_test_score'])
+    assert fast.best_params_ == slow.best_params_
+
+
+def test_time_budget_truncates():
+    """Test that a spent time budget stops starting new candidate groups."""
+    X, y = dataset('K-Nearest Neighbors CLF')
+    param_grid = {'model__n_neighbors': [1, 5, 15],
+                  'model__weights': ['uniform', 'distance']}
+    search = GridSearch(pipeline('K-Nearest Neighbors CLF'), param_grid,
+                        time_budget=0).fit(X, y)
+    results = search.cv_results_
+    assert search.truncated_
+    # Only the first group (one weighting, every n_neighbors) is explored
+    assert search.n_explored_ == search.explored_.sum() == 3
+    assert search.n_candidates_ == 6
+    assert np.isfinite(results['mean_test_score'][search.explored_]).all()
+    assert np.isnan(results['mean_test_score'][~search.explored_]).all()
+    assert (results['rank_test_score'][~search.explored_]
+            > results['rank_test_score'][search.explored_].max()).all()
+    assert search.explored_[search.best_index_]
+    assert search.best_params_ == results['params'][search.best_index_]
+
+
+@pytest.mark.parametrize('search_paths', [True, False])
+def test_failed_candidates_score_nan(search_paths):
+    """Test that candidates failing to fit score NaN and rank last."""
+    X, y = dataset('Logistic Regression')
+    param_grid = {'model__penalty': ['l2', 'l1'], 'model__C': [0.1, 1]}
+    with pytest.warns(FitFailedWarning):
+        search = GridSearch(pipeline('Logistic Regression'), param_grid,
+                            search_paths=search_paths).fit(X, y)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        expected = GridSearchCV(pipeline('Logistic Regression'), param_grid,
+                                error_score=np.nan).fit(X, y)
+    mean_scores = expected.cv_results_['mean_test_score']
+    np.testing.assert_allclose(search.cv_results_['mean_test_score'],
+                               mean_scores, atol=1e-2)
+    failed = np.isnan(mean_scores)
+    assert failed.any() and not failed.all()
+    assert (search.cv_results_['rank_test_score'][failed]
+            > search.cv_results_['rank_test_score'][~failed].max()).all()
+    assert search.best_params_ == \
+        expected.cv_results_['params'][int(np.nanargmax(mean_scores))]
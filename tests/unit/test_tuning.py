@@ -0,0 +1,106 @@
+"""Test the parameter grids, slices, and plots of a saved grid search."""
+
+# %% Imports
+# Standard system imports
+from types import SimpleNamespace
+
+# Related third party imports
+from bokeh.models import Div
+import numpy as np
+from sklearn.datasets import make_classification, make_regression
+from sklearn.model_selection import GridSearchCV
+
+# Local application/library specific imports
+from bokeh_server.results.plots.tuning_plot import _heatmap_data, \
+    create_tuning_panel
+from bokeh_server.train.twe_learn.artifacts import run_directory, save_run
+from bokeh_server.train.twe_learn.train_model import build_pipeline
+from bokeh_server.train.twe_learn.tuning import heatmap, load_search, \
+    search_grid, validation_curve
+
+
+# %% Helper functions
+def knn_search():
+    """Return a fitted n_neighbors x weights search of a KNN classifier."""
+    X, y = make_classification(n_samples=200, random_state=214)
+    param_grid = {'model__n_neighbors': [1, 3, 5],
+                  'model__weights': ['uniform', 'distance']}
+    return GridSearchCV(build_pipeline({'model': 'K-Nearest Neighbors CLF'}),
+                        param_grid).fit(X, y)
+
+
+def cell_of(grid, params):
+    """Return the grid index of a candidate's parameters."""
+    return tuple(grid['values'][axis].index(params[name])
+                 for axis, name in enumerate(grid['names']))
+
+
+# %% Grid unit tests
+def test_one_parameter_grid():
+    """Test the grid, validation curve, and panel of a single parameter."""
+    X, y = make_regression(n_samples=200, noise=20, random_state=214)
+    search = GridSearchCV(build_pipeline({'model': 'Ridge Regression'}),
+                          {'model__alpha': [0.1, 10, 1000]}).fit(X, y)
+    grid = search_grid(search.cv_results_)
+    assert grid['names'] == ['model__alpha']
+    assert grid['values'] == [[0.1, 10, 1000]]
+    np.testing.assert_array_equal(grid['mean_score'],
+                                  search.cv_results_['mean_test_score'])
+    assert grid['best'] == (search.best_index_,)
+    values, mean, std, fit_time = validation_curve(grid, 'model__alpha')
+    assert values == [0.1, 10, 1000]
+    np.testing.assert_array_equal(std, search.cv_results_['std_test_score'])
+    np.testing.assert_array_equal(fit_time,
+                                  search.cv_results_['mean_fit_time'])
+    panel = create_tuning_panel(grid, 600)
+    assert len(panel.children) == 2     # Validation curves, no heatmap
+
+
+def test_two_parameter_grid():
+    """Test that every candidate lands in its cell of the heatmap."""
+    search = knn_search()
+    results = search.cv_results_
+    grid = search_grid(results)
+    assert grid['names'] == ['model__n_neighbors', 'model__weights']
+    assert grid['mean_score'].shape == (3, 2)
+    for index, params in enumerate(results['params']):
+        assert (grid['mean_score'][cell_of(grid, params)]
+                == results['mean_test_score'][index])
+    assert grid['best'] == cell_of(grid, search.best_params_)
+    # Heatmaps are indexed [y value, x value]
+    values = heatmap(grid, 'model__weights', 'model__n_neighbors')
+    np.testing.assert_array_equal(values, grid['mean_score'])
+    np.testing.assert_array_equal(
+        heatmap(grid, 'model__n_neighbors', 'model__weights'), values.T)
+    data, x_values, y_values = _heatmap_data(
+        grid, 'model__n_neighbors', 'model__weights', 'Mean CV score')
+    assert x_values == ['1', '3', '5'] and y_values == ['uniform', 'distance']
+    assert (data['x'][1], data['y'][1]) == ('3', 'uniform')
+    assert data['value'][1] == grid['mean_score'][1, 0]
+    assert len(create_tuning_panel(grid, 600).children) == 3
+
+
+def test_unexplored_candidates():
+    """Test that candidates left unexplored are blank NaN cells."""
+    results = dict(knn_search().cv_results_)
+    results['mean_test_score'] = results['mean_test_score'].copy()
+    results['mean_test_score'][[0, 5]] = np.nan
+    grid = search_grid(results)
+    assert np.isnan(grid['mean_score']).sum() == 2
+    assert not np.isnan(grid['mean_score'][grid['best']])
+    data, _, _ = _heatmap_data(grid, 'model__n_neighbors', 'model__weights',
+                               'Mean CV score')
+    assert data['text'].count('') == 2
+
+
+def test_incremental_run_without_cv_results(tmp_path):
+    """Test that runs without cv_results_ get a note instead of plots."""
+    search = SimpleNamespace(best_estimator_=build_pipeline(
+        {'model': 'SGD Classifier'}),
+        best_params_={'model__alpha': 1e-4}, best_score_=0.9,
+        best_index_=0, val_scores_=np.array([0.9]))
+    save_run(search, {}, tmp_path)
+    metadata = load_search(run_directory(tmp_path))
+    assert 'cv_results_' not in metadata
+    np.testing.assert_array_equal(metadata['val_scores_'], [0.9])
+    assert isinstance(create_tuning_panel(None, 600), Div)